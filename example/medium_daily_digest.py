@@ -2,32 +2,24 @@
 Example Python script that retrieves email messages from Gmail's IMAP
 server using pragmail.
 """
-import re
+from pragmail import Client, TransportUtils
 
-from pragmail import Client, utils
 
-
-def extract_mime_url(_message: bytes) -> list:
+def extract_mime_url(_message: list) -> list:
     """Extract URLs from message."""
-    uri = []
-
-    # Omit escape characters before parsing.
-    _message = _message.replace(b"\r\n", b"")
+    msg = TransportUtils.read_message(_message)
 
-    # Parse message body.
-    body = utils.read_message(_message, as_string=True)
-
-    if not isinstance(body, str):
-        body = str(body)
+    if msg is None:
+        return []
 
     # Extract URLs. Only include link to articles written by Medium users.
     # Path to user profiles includes an "@" symbol and have greater than three
     # slashes.
-    for href in re.findall(r'href=3D[\'"]?([^\'">?]+)', body):
-        if href.count("/") > 3 and "@" in href:
-            uri.append(href.replace("=", ""))
-
-    return uri
+    return [
+        href.split("?")[0]
+        for href in TransportUtils.xtract_links(msg, ("text/html",))
+        if href.count("/") > 3 and "@" in href
+    ]
 
 
 def get_medium_daily_digest():
@@ -40,8 +32,7 @@ def get_medium_daily_digest():
         response, message = client.latest_message("Medium Daily Digest")
 
     if response == "OK":
-        message_body = message[0][1]
-        articles = extract_mime_url(message_body)
+        articles = extract_mime_url(message)
     else:
         articles = []
 
@@ -17,15 +17,89 @@ Example usage:
 ('OK', [b'Returned to authenticated state. (Success)'])
 >>> client.imap4.logout()
 ('BYE', [b'LOGOUT Requested'])
+
+Submodules and their public names are loaded on first attribute access, so
+`import pragmail` itself stays cheap.
 """
-from pragmail import utils as utils
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
+
 from pragmail.__version__ import __version__
-from pragmail.clients import Client as Client
-from pragmail.exceptions import CommandError as CommandError
-from pragmail.exceptions import IMAP4Error as IMAP4Error
-from pragmail.transports import TransportUtils as TransportUtils
-from pragmail.transports import save_to_disk as save_to_disk
+
+if TYPE_CHECKING:  # pragma: no cover
+    from pragmail import utils as utils
+    from pragmail.auth import OAuth2Token as OAuth2Token
+    from pragmail.clients import Client as Client
+    from pragmail.dedup import Deduplicator as Deduplicator
+    from pragmail.exceptions import CommandError as CommandError
+    from pragmail.exceptions import DeadlineExceeded as DeadlineExceeded
+    from pragmail.exceptions import IMAP4Error as IMAP4Error
+    from pragmail.exports import export_headers as export_headers
+    from pragmail.flags import FlagIndex as FlagIndex
+    from pragmail.pipeline import Pipeline as Pipeline
+    from pragmail.profiling import profile as profile
+    from pragmail.ratelimit import set_rate_limit as set_rate_limit
+    from pragmail.shared import SharedClient as SharedClient
+    from pragmail.stores import SQLiteStore as SQLiteStore
+    from pragmail.transports import TransportUtils as TransportUtils
+    from pragmail.transports import save_to_archive as save_to_archive
+    from pragmail.transports import save_to_disk as save_to_disk
 
 __url__ = "https://github.com/huenique/pragmail"
 __author__ = "Hju Kneyck (hjucode@gmail.com)"
 __license__ = "MIT"
+
+# Maps a public name to the module that defines it. A `None` attribute means
+# the name refers to the module itself.
+_LAZY_ATTRIBUTES: dict[str, tuple[str, Any]] = {
+    "utils": ("pragmail.utils", None),
+    "Client": ("pragmail.clients", "Client"),
+    "CommandError": ("pragmail.exceptions", "CommandError"),
+    "DeadlineExceeded": ("pragmail.exceptions", "DeadlineExceeded"),
+    "Deduplicator": ("pragmail.dedup", "Deduplicator"),
+    "IMAP4Error": ("pragmail.exceptions", "IMAP4Error"),
+    "OAuth2Token": ("pragmail.auth", "OAuth2Token"),
+    "export_headers": ("pragmail.exports", "export_headers"),
+    "FlagIndex": ("pragmail.flags", "FlagIndex"),
+    "Pipeline": ("pragmail.pipeline", "Pipeline"),
+    "SharedClient": ("pragmail.shared", "SharedClient"),
+    "SQLiteStore": ("pragmail.stores", "SQLiteStore"),
+    "profile": ("pragmail.profiling", "profile"),
+    "set_rate_limit": ("pragmail.ratelimit", "set_rate_limit"),
+    "TransportUtils": ("pragmail.transports", "TransportUtils"),
+    "save_to_archive": ("pragmail.transports", "save_to_archive"),
+    "save_to_disk": ("pragmail.transports", "save_to_disk"),
+}
+
+__all__ = ["__version__", *_LAZY_ATTRIBUTES]
+
+
+def __getattr__(name: str) -> Any:
+    """Import public names on first access (PEP 562).
+
+    Args:
+        name (str): The attribute name.
+
+    Raises:
+        AttributeError: If pragmail has no such public name.
+
+    Returns:
+        Any: The requested module or object.
+    """
+    try:
+        module_name, attribute = _LAZY_ATTRIBUTES[name]
+    except KeyError:
+        raise AttributeError(
+            f"module {__name__!r} has no attribute {name!r}"
+        ) from None
+
+    module = import_module(module_name)
+    value = module if attribute is None else getattr(module, attribute)
+
+    # Cache the value so that `__getattr__` is only hit once per name.
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
@@ -0,0 +1,254 @@
+"""
+This module authenticates IMAP connections with as few round trips as the
+server allows.
+
+When the server advertises SASL-IR (RFC 4959), the credentials are sent with
+the AUTHENTICATE command itself, so authenticating takes a single round trip
+instead of waiting for the server's empty challenge first. Capabilities are
+taken from the greeting, or the capability cache, so choosing a mechanism
+doesn't cost a CAPABILITY command either.
+
+OAuth2 access tokens (XOAUTH2) are kept in `OAuth2Token`, which refreshes
+them shortly before they expire and can be shared by every client:
+
+>>> token = OAuth2Token(refresh=fetch_access_token)
+>>> client.login_oauth2("user@gmail.com", token)
+"""
+import threading
+import time
+from base64 import b64encode
+from imaplib import IMAP4
+from typing import Any, Callable, Optional
+
+from pragmail.capabilities import SASL_IR, Capabilities
+
+PLAIN = "PLAIN"
+XOAUTH2 = "XOAUTH2"
+
+# Refresh OAuth2 tokens this many seconds before they expire, so that a token
+# doesn't expire between the time it's read and the time it's checked.
+TOKEN_REFRESH_MARGIN = 60.0
+
+
+class OAuth2Token:
+    """OAuth2 access token that refreshes itself.
+
+    The refresh callable is only called when the token is missing, about to
+    expire or was rejected, and by a single thread at a time.
+    """
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        refresh: Optional[Callable[[], tuple[str, Optional[float]]]] = None,
+        expires_in: Optional[float] = None,
+    ) -> None:
+        """
+        Args:
+            token (Optional[str], optional): Current access token. Defaults to
+                None.
+            refresh (Optional[Callable[[], tuple[str, Optional[float]]]],
+                optional): Returns a new access token and its lifetime in
+                seconds (None if unknown). Defaults to None (the token can't
+                be refreshed).
+            expires_in (Optional[float], optional): Lifetime of `token`, in
+                seconds. Defaults to None (unknown).
+
+        Raises:
+            ValueError: If neither token nor refresh is given.
+        """
+        if token is None and refresh is None:
+            raise ValueError("OAuth2Token needs a token or a refresh.")
+
+        self.refresh = refresh
+        self._token = token
+        self._expires = self._expiry(expires_in)
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"OAuth2Token(refreshable={self.refresh is not None})"
+
+    @staticmethod
+    def _expiry(expires_in: Optional[float]) -> Optional[float]:
+        if expires_in is None:
+            return None
+        return time.monotonic() + expires_in - TOKEN_REFRESH_MARGIN
+
+    def _valid(self) -> bool:
+        if self._token is None:
+            return False
+        return self._expires is None or time.monotonic() < self._expires
+
+    def get(self) -> str:
+        """Return the access token, refreshing it first if needed.
+
+        Raises:
+            ValueError: If the token expired and can't be refreshed.
+
+        Returns:
+            str: The access token.
+        """
+        with self._lock:
+            if self._valid():
+                return self._token  # type: ignore
+            if self.refresh is None:
+                raise ValueError("OAuth2 token expired and can't be renewed.")
+
+            token, expires_in = self.refresh()
+            self._token, self._expires = token, self._expiry(expires_in)
+            return token
+
+    def invalidate(self) -> None:
+        """Forget the access token, e.g. after the server rejected it, so
+        that the next `get` refreshes it."""
+        with self._lock:
+            if self.refresh is not None:
+                self._token = None
+
+
+class _Responder:  # pylint: disable=too-few-public-methods
+    """Answers server challenges that follow an initial response.
+
+    Only failures are expected there, such as the error details sent before
+    rejecting an XOAUTH2 token, and the client must answer with an empty
+    line. `imaplib` only calls bound methods back, hence the class.
+    """
+
+    def respond(self, _challenge: Any) -> bytes:
+        """Answer a challenge with an empty line."""
+        return b""
+
+
+def plain_response(username: str, password: str, authzid: str = "") -> bytes:
+    """Initial response of the PLAIN mechanism (RFC 4616).
+
+    Args:
+        username (str): The user's username.
+        password (str): The user's password.
+        authzid (str, optional): Identity to act as. Defaults to "" (the
+            user's own).
+
+    Returns:
+        bytes: The response, before base64 encoding.
+    """
+    return f"{authzid}\0{username}\0{password}".encode("utf-8")
+
+
+def xoauth2_response(username: str, token: str) -> bytes:
+    """Initial response of the XOAUTH2 mechanism.
+
+    Args:
+        username (str): The user's email address.
+        token (str): The OAuth2 access token.
+
+    Returns:
+        bytes: The response, before base64 encoding.
+    """
+    return f"user={username}\1auth=Bearer {token}\1\1".encode("utf-8")
+
+
+def authenticate(
+    imap4: IMAP4,
+    mechanism: str,
+    initial_response: bytes,
+) -> tuple[str, list[bytes]]:
+    """Run the AUTHENTICATE command of a single-step SASL mechanism.
+
+    With SASL-IR, the initial response is sent with the command. Otherwise
+    it's sent in answer to the server's first challenge, which costs another
+    round trip.
+
+    Args:
+        imap4 (IMAP4): A connection in the NONAUTH state.
+        mechanism (str): The SASL mechanism, e.g. "PLAIN".
+        initial_response (bytes): The client's response, before base64
+            encoding.
+
+    Raises:
+        IMAP4.error: The server rejected the credentials.
+
+    Returns:
+        tuple[str, list[bytes]]: The server's response.
+    """
+    mechanism = mechanism.upper()
+    if SASL_IR not in Capabilities(imap4.capabilities):
+        answers = iter([initial_response])
+        return imap4.authenticate(
+            mechanism, lambda challenge: next(answers, b"")
+        )
+
+    # RFC 4959: an empty initial response is sent as "=".
+    encoded = b64encode(initial_response) or b"="
+    # pylint: disable=protected-access
+    imap4.literal = _Responder().respond  # type: ignore
+    typ, data = imap4._simple_command(  # type: ignore
+        "AUTHENTICATE", mechanism, encoded
+    )
+    if typ != "OK":
+        raise imap4.error(data[-1].decode("utf-8", "replace"))
+    imap4.state = "AUTH"
+    return typ, data
+
+
+def login(imap4: IMAP4, username: str, password: str) -> tuple[str, list]:
+    """Authenticate with a password in a single round trip.
+
+    AUTHENTICATE PLAIN is used when the server advertises SASL-IR, since it
+    handles non-ASCII passwords, and LOGIN otherwise.
+
+    Args:
+        imap4 (IMAP4): A connection in the NONAUTH state.
+        username (str): The user's username.
+        password (str): The user's password.
+
+    Raises:
+        IMAP4.error: The server rejected the credentials.
+
+    Returns:
+        tuple[str, list]: The server's response.
+    """
+    capabilities = Capabilities(imap4.capabilities)
+    if SASL_IR in capabilities and PLAIN in capabilities.values("AUTH"):
+        return authenticate(imap4, PLAIN, plain_response(username, password))
+    return imap4.login(username, password)
+
+
+def login_oauth2(
+    imap4: IMAP4,
+    username: str,
+    token: OAuth2Token,
+) -> tuple[str, list[bytes]]:
+    """Authenticate with an OAuth2 access token (XOAUTH2).
+
+    When the server rejects the token and it can be refreshed, it's
+    refreshed and sent once more.
+
+    Args:
+        imap4 (IMAP4): A connection in the NONAUTH state.
+        username (str): The user's email address.
+        token (OAuth2Token): The access token.
+
+    Raises:
+        IMAP4.error: The server rejected the token.
+
+    Returns:
+        tuple[str, list[bytes]]: The server's response.
+    """
+    try:
+        return authenticate(
+            imap4, XOAUTH2, xoauth2_response(username, token.get())
+        )
+    except IMAP4.abort:
+        raise
+    except IMAP4.error:
+        if token.refresh is None:
+            raise
+        token.invalidate()
+
+    return authenticate(
+        imap4, XOAUTH2, xoauth2_response(username, token.get())
+    )
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,234 @@
+"""
+This module negotiates which IMAP extensions pragmail uses with a server.
+
+Capabilities are cached per host, in memory and optionally on disk, so that
+reconnecting to a known server doesn't cost a CAPABILITY round trip.
+`Capabilities` is the single place other operations ask whether they can use
+a faster command (ESEARCH, SORT, CONDSTORE, ...).
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+ESEARCH = "ESEARCH"
+SORT = "SORT"
+UIDPLUS = "UIDPLUS"
+CONDSTORE = "CONDSTORE"
+LITERAL_PLUS = "LITERAL+"
+IDLE = "IDLE"
+COMPRESS = "COMPRESS"
+SASL_IR = "SASL-IR"
+
+
+class Capabilities:
+    """Set of capabilities advertised by a server.
+
+    Usage:
+    >>> caps = Capabilities(("IMAP4REV1", "SORT", "AUTH=PLAIN"))
+    >>> caps.has("sort")
+    True
+    >>> caps.choose(ESEARCH, SORT)
+    'SORT'
+    """
+
+    def __init__(self, capabilities: Iterable[str] = ()) -> None:
+        """
+        Args:
+            capabilities (Iterable[str], optional): Capability names, as
+                found in `IMAP4.capabilities`. Defaults to ().
+        """
+        self.names = frozenset(name.upper() for name in capabilities)
+
+    def __repr__(self) -> str:
+        return f"Capabilities({tuple(sorted(self.names))!r})"
+
+    def __contains__(self, name: str) -> bool:
+        return self.has(name)
+
+    def has(self, name: str) -> bool:
+        """Check whether the server supports a capability.
+
+        Args:
+            name (str): The capability name. A name without a value, such as
+                "COMPRESS" or "AUTH", matches any of its values (e.g.
+                "COMPRESS=DEFLATE").
+
+        Returns:
+            bool: True if supported.
+        """
+        name = name.upper()
+        if name in self.names:
+            return True
+        return "=" not in name and any(
+            cap.startswith(f"{name}=") for cap in self.names
+        )
+
+    def choose(self, *names: str) -> Optional[str]:
+        """Pick the first supported capability.
+
+        Args:
+            *names (str): Capability names, in order of preference.
+
+        Returns:
+            Optional[str]: The first supported name, or None.
+        """
+        for name in names:
+            if self.has(name):
+                return name
+        return None
+
+    def values(self, name: str) -> frozenset[str]:
+        """Values advertised for a capability, e.g. the SASL mechanisms of
+        "AUTH" or the algorithms of "COMPRESS".
+
+        Args:
+            name (str): The capability name.
+
+        Returns:
+            frozenset[str]: The values.
+        """
+        prefix = f"{name.upper()}="
+        return frozenset(
+            cap[len(prefix):] for cap in self.names if cap.startswith(prefix)
+        )
+
+
+class CapabilityCache:
+    """Capabilities of known servers, with a time-to-live.
+
+    Entries are kept separately for the unauthenticated and authenticated
+    states, since servers often advertise more after login.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[Path, str]] = None,
+        ttl: float = 24 * 60 * 60,
+    ) -> None:
+        """
+        Args:
+            path (Optional[Union[Path, str]], optional): JSON file used to
+                share the cache between processes. Defaults to None (memory
+                only).
+            ttl (float, optional): Lifetime of an entry, in seconds. Defaults
+                to one day.
+        """
+        self.path = Path(path) if path is not None else None
+        self.ttl = ttl
+        self._entries: dict[str, tuple[float, tuple[str, ...]]] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"CapabilityCache(path={self.path}, ttl={self.ttl})"
+
+    @staticmethod
+    def _key(host: str, port: int, authenticated: bool) -> str:
+        state = "AUTH" if authenticated else "NONAUTH"
+        return f"{host}:{port}:{state}"
+
+    def get(
+        self,
+        host: str,
+        port: int,
+        authenticated: bool = False,
+    ) -> Optional[tuple[str, ...]]:
+        """Look up the capabilities of a server.
+
+        Args:
+            host (str): The server's host name.
+            port (int): The server's port.
+            authenticated (bool, optional): Whether the capabilities were
+                advertised after login. Defaults to False.
+
+        Returns:
+            Optional[tuple[str, ...]]: The capabilities, or None if they
+                aren't cached or expired.
+        """
+        with self._lock:
+            self._load()
+            entry = self._entries.get(self._key(host, port, authenticated))
+
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
+
+    def set(
+        self,
+        host: str,
+        port: int,
+        capabilities: Iterable[str],
+        authenticated: bool = False,
+    ) -> None:
+        """Store the capabilities of a server.
+
+        Args:
+            host (str): The server's host name.
+            port (int): The server's port.
+            capabilities (Iterable[str]): The capability names.
+            authenticated (bool, optional): Whether the capabilities were
+                advertised after login. Defaults to False.
+        """
+        entry = (time.time() + self.ttl, tuple(capabilities))
+        with self._lock:
+            self._load()
+            self._entries[self._key(host, port, authenticated)] = entry
+            self._save()
+
+    def clear(self) -> None:
+        """Remove every entry, including those on disk."""
+        with self._lock:
+            self._entries.clear()
+            self._loaded = True
+            self._save()
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+
+        if self.path is None or not self.path.is_file():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+
+        now = time.time()
+        for key, (expires, caps) in data.items():
+            if expires > now:
+                self._entries[key] = (expires, tuple(caps))
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+
+        data = {
+            key: [expires, list(caps)]
+            for key, (expires, caps) in self._entries.items()
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(data, file)
+            os.replace(tmp, self.path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+
+_default_cache = CapabilityCache()
+
+
+def default_capability_cache() -> CapabilityCache:
+    """Process-wide in-memory cache used by clients that aren't given one."""
+    return _default_cache
+
+
+if __name__ == "__main__":
+    pass
@@ -3,25 +3,203 @@ This module contains the abstraction that will allow the user to quickly get
 started with pragmail. For now, the base features that check for messages in a
 specified account on an IMAP mail server can be found here as well.
 """
-from imaplib import IMAP4, IMAP4_SSL
-from ssl import SSLContext, create_default_context
-from typing import Literal, Optional, Union
+import heapq
+import re
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from functools import wraps
+from imaplib import IMAP4
+from ssl import SSLContext
+from typing import Any, Callable, Iterable, Iterator, Literal, Optional, Union
 
-from pragmail.exceptions import catch_exception
-from pragmail.utils import (date_format, date_travel, imap_scheme, ping_host,
-                            server_settings)
+from pragmail import auth
+from pragmail.auth import OAuth2Token
+from pragmail.capabilities import (CONDSTORE, ESEARCH, SORT, Capabilities,
+                                   CapabilityCache, default_capability_cache)
+from pragmail.connections import (IMAP4Connection, IMAP4SSLConnection,
+                                  default_ssl_context, pipeline)
+from pragmail.deadlines import Deadline
+from pragmail.exceptions import DeadlineExceeded, IMAP4Error, catch_exception
+from pragmail.prefetch import readahead
+from pragmail.utils import (date_format, date_travel, decode_header_value,
+                            imap_scheme, iter_fetch, parse_sequence_set,
+                            parse_status, ping_host, quote_mailbox,
+                            sequence_set, server_settings, unquote_mailbox)
 
 TEXT_MESSSAGE = "(RFC822)"
+STATUS_ITEMS = ("MESSAGES", "UIDNEXT", "UIDVALIDITY")
+
+_ESEARCH_RESULT = re.compile(rb"\b(MAX|ALL) ([\d:,]+)")
+
+# Errors after which the connection can't be trusted anymore, but which are
+# likely to go away with a new connection.
+_CONNECTION_ERRORS = (IMAP4.abort, OSError)
 
 _NoResponseData = list[None]
 _ResponseData = list[Union[bytes, tuple[bytes, bytes]]]
 _AnyResponseData = Union[_NoResponseData, _ResponseData]
 
 
-class _Client:
+class FetchCheckpoint:
+    """Progress of a `Client.bulk_fetch` call.
+
+    Pass the same checkpoint to a later `bulk_fetch` call to resume where the
+    previous one stopped. `as_dict` and `from_dict` can be used to persist it
+    between runs; partially downloaded messages are only kept in memory.
+    """
+
+    def __init__(self, last_uid: int = 0) -> None:
+        """
+        Args:
+            last_uid (int, optional): UID of the last message that was
+                completely downloaded. Defaults to 0.
+        """
+        self.last_uid = last_uid
+        self.uid: Optional[int] = None
+        self.offset = 0
+        self.buffer = bytearray()
+
+    def __repr__(self) -> str:
+        return (
+            f"FetchCheckpoint(last_uid={self.last_uid}, uid={self.uid}, "
+            f"offset={self.offset})"
+        )
+
+    def as_dict(self) -> dict[str, int]:
+        """Return the resumable state of the checkpoint."""
+        return {"last_uid": self.last_uid}
+
+    @classmethod
+    def from_dict(cls, state: dict[str, int]) -> "FetchCheckpoint":
+        """Create a checkpoint from the output of `as_dict`."""
+        return cls(last_uid=state.get("last_uid", 0))
+
+
+def _bounded(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Run a client operation within `operation_timeout` and the enclosing
+    `deadline`, dropping the connection if the deadline passes.
+    """
+
+    @wraps(func)
+    def wrapper(self: "_Client", *args: Any, **kwargs: Any) -> Any:
+        with self.deadline(self.operation_timeout):
+            try:
+                return func(self, *args, **kwargs)
+            except DeadlineExceeded:
+                self.drop_connection()
+                raise
+
+    return wrapper
+
+
+class _Client(ABC):
     """Client base class."""
 
     imap4: IMAP4
+    capability_cache: Optional[CapabilityCache] = None
+    operation_timeout: Optional[float] = None
+    _credentials: Optional[tuple[str, Union[str, OAuth2Token]]] = None
+    _mailbox: Optional[str] = None
+    _deadline: Optional[Deadline] = None
+
+    @abstractmethod
+    def connect(self) -> None:
+        """Open a new connection to the mail server."""
+
+    @contextmanager
+    def deadline(self, timeout: Optional[float]) -> Iterator[Deadline]:
+        """Bound every operation run inside the block by a common deadline.
+
+        Deadlines nest: an inner block can't extend the deadline of an outer
+        one. When the deadline passes, the running operation raises
+        `DeadlineExceeded` and the connection is dropped; call `reconnect`
+        to use the client again.
+
+        Usage:
+        >>> with client.deadline(30):
+        ...     client.select("INBOX")
+        ...     uids = client.newest_uids(n=10)
+
+        Args:
+            timeout (Optional[float]): Seconds from now. None only applies the
+                enclosing deadline, if any.
+
+        Yields:
+            Iterator[Deadline]: The deadline in effect inside the block.
+        """
+        outer = self._deadline
+        deadline = Deadline(timeout).earliest(outer)
+        self._set_deadline(deadline)
+        try:
+            yield deadline
+        finally:
+            self._set_deadline(outer)
+
+    def _set_deadline(self, deadline: Optional[Deadline]) -> None:
+        if deadline is not None and deadline.expires is None:
+            deadline = None
+        self._deadline = deadline
+        if hasattr(self, "imap4"):
+            self.imap4.deadline = deadline  # type: ignore
+
+    def drop_connection(self) -> None:
+        """Close the connection without logging out, e.g. after a deadline
+        passed in the middle of a response."""
+        try:
+            self.imap4.shutdown()
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+    @property
+    def capabilities(self) -> Capabilities:
+        """Capabilities of the server, used to pick the fastest commands."""
+        return Capabilities(self.imap4.capabilities)
+
+    def _refresh_capabilities(self) -> None:
+        """Update the capabilities after login, since servers often
+        advertise more extensions to authenticated users. The CAPABILITY
+        command is only sent if the login response didn't include them and
+        they aren't cached.
+        """
+        cache = self.capability_cache or default_capability_cache()
+        host, port = self.imap4.host, self.imap4.port
+        cached = cache.get(host, port, authenticated=True)
+
+        announced = self.imap4.untagged_responses.pop("CAPABILITY", None)
+        if announced:
+            capabilities = tuple(announced[-1].decode().upper().split())
+        elif cached:
+            capabilities = cached
+        else:
+            typ, data = self.imap4.capability()
+            if typ != "OK" or not data or data[-1] is None:
+                return
+            capabilities = tuple(data[-1].decode().upper().split())
+
+        self.imap4.capabilities = capabilities
+        if capabilities != cached:
+            cache.set(host, port, capabilities, authenticated=True)
+
+    def reconnect(self) -> None:
+        """Replace the current connection with a new one and restore the
+        session: the user is logged in again and the previously selected
+        mailbox is selected again.
+        """
+        self.drop_connection()
+        self.connect()
+
+        if self._credentials is not None:
+            username, secret = self._credentials
+            if isinstance(secret, OAuth2Token):
+                auth.login_oauth2(self.imap4, username, secret)
+            else:
+                auth.login(self.imap4, username, secret)
+            self._refresh_capabilities()
+        if self._mailbox is not None:
+            self.imap4.select(
+                mailbox=quote_mailbox(self._mailbox), readonly=True
+            )
 
     @staticmethod
     def fetch_server_settings(user: str) -> str:
@@ -88,6 +266,7 @@ class _Client:
         return [str(uid.decode()) for uid in uids]
 
     @catch_exception
+    @_bounded
     def login(
         self,
         username: str,
@@ -106,9 +285,46 @@ class _Client:
         Returns:
             tuple[Literal['OK'], list[bytes]]: Non-specific response.
         """
-        return self.imap4.login(username, password)
+        response = auth.login(self.imap4, username, password)
+        # Kept so that `reconnect` can authenticate again.
+        self._credentials = (username, password)
+        self._refresh_capabilities()
+        return response
 
     @catch_exception
+    @_bounded
+    def login_oauth2(
+        self,
+        username: str,
+        token: Union[str, OAuth2Token],
+    ) -> tuple[str, list[bytes]]:
+        """Authenticate the user with an OAuth2 access token (XOAUTH2).
+
+        Usage:
+        >>> token = OAuth2Token(refresh=fetch_access_token)
+        >>> client.login_oauth2("user@gmail.com", token)
+
+        Args:
+            username (str): The user's email address.
+            token (Union[str, OAuth2Token]): The access token. Pass an
+                `OAuth2Token` with a refresh callable so that `reconnect` and
+                long-running clients get a fresh token when it expires.
+
+        Raises:
+            Exception: Raised if the token was rejected.
+
+        Returns:
+            tuple[str, list[bytes]]: Non-specific response.
+        """
+        if isinstance(token, str):
+            token = OAuth2Token(token)
+        response = auth.login_oauth2(self.imap4, username, token)
+        self._credentials = (username, token)
+        self._refresh_capabilities()
+        return response
+
+    @catch_exception
+    @_bounded
     def logout(self) -> bool:
         """Similar to `IMAP4.logout` but also calls `IMAP4.close`, which
             sends a `CLOSE` command to the server, and is guaranteed to
@@ -126,6 +342,7 @@ class _Client:
         return True
 
     @catch_exception
+    @_bounded
     def select(self, mailbox: str) -> tuple[str, list[Union[bytes, None]]]:
         """Select a mailbox so that messages in the mailbox can be accessed.
 
@@ -136,9 +353,109 @@ class _Client:
             tuple[str, list[Union[bytes, None]]]: The response type and count
                 of messages in the specified mailbox.
         """
-        return self.imap4.select(mailbox=mailbox, readonly=True)
+        response = self.imap4.select(mailbox=mailbox, readonly=True)
+        if response[0] == "OK":
+            self._mailbox = unquote_mailbox(mailbox)
+        return response
+
+    @catch_exception
+    @_bounded
+    def status(
+        self,
+        mailboxes: Union[str, Iterable[str]],
+    ) -> dict[str, dict[str, int]]:
+        """Request the status of one or many mailboxes without selecting them.
+
+        The STATUS commands for all mailboxes are sent in a single round
+        trip. `HIGHESTMODSEQ` is requested as well when the server supports
+        CONDSTORE.
+
+        Args:
+            mailboxes (Union[str, Iterable[str]]): Mailbox name(s).
+
+        Returns:
+            dict[str, dict[str, int]]: The status items of each mailbox, e.g.
+                `{"INBOX": {"MESSAGES": 3, "UIDNEXT": 5, "UIDVALIDITY": 1}}`.
+                Mailboxes the server refused are left out.
+        """
+        if isinstance(mailboxes, str):
+            mailboxes = [mailboxes]
+
+        items = STATUS_ITEMS
+        if self.capabilities.has(CONDSTORE):
+            items += ("HIGHESTMODSEQ",)
+
+        names = f"({' '.join(items)})"
+        _, data = pipeline(
+            self.imap4,
+            "STATUS",
+            ((quote_mailbox(mailbox), names) for mailbox in mailboxes),
+        )
+
+        return dict(
+            parse_status(dat) for dat in data if isinstance(dat, bytes)
+        )
+
+    def changed_mailboxes(
+        self,
+        known: dict[str, dict[str, int]],
+        mailboxes: Optional[Iterable[str]] = None,
+    ) -> list[str]:
+        """Find the mailboxes whose status changed since the last check.
+
+        A mailbox has changed if it gained or lost messages, received new
+        ones (UIDNEXT), was recreated (UIDVALIDITY) or had its flags modified
+        (HIGHESTMODSEQ, CONDSTORE servers only).
+
+        Args:
+            known (dict[str, dict[str, int]]): Status of each mailbox as of
+                the last check, as returned by `status`. It's updated in
+                place; start with an empty dictionary.
+            mailboxes (Optional[Iterable[str]], optional): Mailboxes to
+                check. Defaults to the mailboxes in `known`.
+
+        Returns:
+            list[str]: Names of the mailboxes that changed, including those
+                that weren't known yet.
+        """
+        if mailboxes is None:
+            mailboxes = list(known)
+
+        changed = []
+        for mailbox, current in self.status(mailboxes).items():
+            if known.get(mailbox) != current:
+                changed.append(mailbox)
+            known[mailbox] = current
+
+        return changed
+
+    def poll(
+        self,
+        known: dict[str, dict[str, int]],
+        mailboxes: Optional[Iterable[str]] = None,
+    ) -> Iterator[str]:
+        """Select the mailboxes that changed since the last poll, one at a
+        time.
+
+        Usage:
+        >>> state = {}
+        >>> for mailbox in client.poll(state, ["INBOX", "Work"]):
+        ...     client.latest_message("John Smith")
+
+        Args:
+            known (dict[str, dict[str, int]]): See `changed_mailboxes`.
+            mailboxes (Optional[Iterable[str]], optional): See
+                `changed_mailboxes`.
+
+        Yields:
+            Iterator[str]: The name of the mailbox that was just selected.
+        """
+        for mailbox in self.changed_mailboxes(known, mailboxes):
+            if self.select(quote_mailbox(mailbox))[0] == "OK":
+                yield mailbox
 
     @catch_exception
+    @_bounded
     def latest_message(
         self,
         sender: str,
@@ -198,6 +515,421 @@ class _Client:
 
         raise Exception(f"Message not found: {latest_uid}")
 
+    def bulk_fetch(
+        self,
+        uids: Iterable[Union[int, str, bytes]],
+        message_parts: str = TEXT_MESSSAGE,
+        checkpoint: Optional[FetchCheckpoint] = None,
+        batch_size: int = 100,
+        chunk_size: Optional[int] = None,
+        retries: int = 5,
+        backoff: float = 1.0,
+    ) -> Iterator[tuple[int, bytes]]:
+        """Download many messages by UID, surviving dropped connections.
+
+        Messages are fetched in ascending UID order. Progress is recorded in
+        `checkpoint`; when the connection drops, the client reconnects with
+        exponential backoff (see `reconnect`) and resumes after the last
+        completed UID.
+
+        Args:
+            uids (Iterable[Union[int, str, bytes]]): UIDs of the messages.
+            message_parts (str, optional): Message data item names. It should
+                name a single message section. Defaults to TEXT_MESSSAGE
+                (RFC822/BODY[]).
+            checkpoint (Optional[FetchCheckpoint], optional): Progress of a
+                previous call to resume from. Defaults to None.
+            batch_size (int, optional): Number of messages requested per
+                FETCH command. Defaults to 100.
+            chunk_size (Optional[int], optional): When set, each message is
+                downloaded on its own with `BODY.PEEK[]<offset.length>`
+                partial fetches of this many bytes, so that large messages
+                resume from the last received byte. `message_parts` is
+                ignored. Defaults to None.
+            retries (int, optional): Reconnection attempts allowed in a row.
+                Defaults to 5.
+            backoff (float, optional): Delay before the first reconnection
+                attempt, in seconds. It doubles with every failed attempt.
+                Defaults to 1.0.
+
+        Each FETCH command (and reconnection) is bounded by
+        `operation_timeout`, and the whole download by the enclosing
+        `deadline` block, if any.
+
+        Raises:
+            IMAP4Error: The server rejected a FETCH command or every
+                reconnection attempt failed.
+            DeadlineExceeded: The deadline passed. Its `partial` attribute is
+                the checkpoint to resume from.
+
+        Yields:
+            Iterator[tuple[int, bytes]]: The UID and data of each message.
+        """
+        if checkpoint is None:
+            checkpoint = FetchCheckpoint()
+
+        pending = sorted(
+            {int(uid) for uid in uids if int(uid) > checkpoint.last_uid}
+        )
+        attempt = 0
+
+        while pending:
+            batch = pending[:1] if chunk_size else pending[:batch_size]
+            try:
+                with self.deadline(self.operation_timeout):
+                    if attempt:
+                        self.reconnect()
+                    if chunk_size:
+                        data = self._fetch_chunked(
+                            batch[0], chunk_size, checkpoint
+                        )
+                        results = [] if data is None else [(batch[0], data)]
+                    else:
+                        results = self._fetch_batch(batch, message_parts)
+            except DeadlineExceeded as deadline_err:
+                self.drop_connection()
+                raise DeadlineExceeded(
+                    *deadline_err.args, partial=checkpoint
+                ) from deadline_err
+            except _CONNECTION_ERRORS as conn_err:
+                if attempt >= retries:
+                    raise IMAP4Error(conn_err) from conn_err
+                delay = backoff * 2**attempt
+                if self._deadline and self._deadline.remaining() < delay:
+                    self.drop_connection()
+                    raise DeadlineExceeded(
+                        "Deadline exceeded before reconnecting.",
+                        partial=checkpoint,
+                    ) from conn_err
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except IMAP4.error as imap_err:
+                raise IMAP4Error(imap_err) from imap_err
+
+            attempt = 0
+            for uid, data in results:
+                checkpoint.last_uid = uid
+                yield uid, data
+
+            # Messages that no longer exist are skipped as well.
+            checkpoint.last_uid = batch[-1]
+            pending = pending[len(batch):]
+
+    def iter_messages(
+        self,
+        uids: Iterable[Union[int, str, bytes]],
+        message_parts: str = TEXT_MESSSAGE,
+        prefetch: int = 8,
+        max_bytes: Optional[int] = 64 * 1024 * 1024,
+        checkpoint: Optional[FetchCheckpoint] = None,
+        batch_size: Optional[int] = None,
+        **kwargs: Any,
+    ) -> Iterator[tuple[int, bytes]]:
+        """Download messages by UID while the caller processes them.
+
+        The messages are downloaded by `bulk_fetch` in a background thread,
+        which stays up to `prefetch` messages, or `max_bytes` bytes, ahead
+        of the caller, so that the network isn't idle while a message is
+        parsed and the caller doesn't wait for the next one:
+
+        >>> uids = client.newest_uids(n=50)
+        >>> for uid, message in client.iter_messages(uids):
+        ...     process(message)
+
+        The background thread owns the connection until the iteration ends
+        or the iterator is closed: don't use the client inside the loop.
+
+        Args:
+            uids (Iterable[Union[int, str, bytes]]): UIDs of the messages.
+            message_parts (str, optional): Message data item names. Defaults
+                to TEXT_MESSSAGE (RFC822/BODY[]).
+            prefetch (int, optional): Maximum number of downloaded messages
+                waiting to be processed. Defaults to 8.
+            max_bytes (Optional[int], optional): Maximum size of the waiting
+                messages. Messages are then fetched one at a time, so at
+                most one more message is held while it's downloaded, and a
+                message larger than the budget is still downloaded once
+                nothing else is waiting. None disables the limit. Defaults
+                to 64 MiB.
+            checkpoint (Optional[FetchCheckpoint], optional): Progress to
+                resume from. It's updated as messages are handed to the
+                caller, not as they're downloaded. Defaults to None.
+            batch_size (Optional[int], optional): Number of messages
+                requested per FETCH command. A whole batch is held on top of
+                `max_bytes` while it's downloaded. Defaults to None (1, or
+                `prefetch` without `max_bytes`).
+            **kwargs (Any): Other keyword arguments of `bulk_fetch`.
+
+        Raises:
+            IMAP4Error: The download failed (see `bulk_fetch`).
+            DeadlineExceeded: The deadline passed. Its `partial` attribute is
+                the checkpoint to resume from.
+
+        Yields:
+            Iterator[tuple[int, bytes]]: The UID and data of each message.
+        """
+        if checkpoint is None:
+            checkpoint = FetchCheckpoint()
+
+        if batch_size is None:
+            # A batch arrives whole, outside the readahead's byte count.
+            batch_size = prefetch if max_bytes is None else 1
+
+        # The download runs ahead of the caller, so it keeps its own
+        # checkpoint.
+        messages = self.bulk_fetch(
+            uids,
+            message_parts,
+            FetchCheckpoint(checkpoint.last_uid),
+            batch_size=batch_size,
+            **kwargs,
+        )
+        items = readahead(
+            messages, prefetch, max_bytes, sizeof=lambda item: len(item[1])
+        )
+
+        try:
+            for uid, data in items:
+                checkpoint.last_uid = uid
+                yield uid, data
+        except DeadlineExceeded as deadline_err:
+            raise DeadlineExceeded(
+                *deadline_err.args, partial=checkpoint
+            ) from deadline_err
+        finally:
+            items.close()
+
+    def _fetch_batch(
+        self,
+        uids: list[int],
+        message_parts: str,
+    ) -> list[tuple[int, bytes]]:
+        typ, data = self.imap4.uid("FETCH", sequence_set(uids), message_parts)
+        if typ != "OK":
+            raise IMAP4Error(f"FETCH failed: {data}")
+
+        return sorted(
+            (uid, literal)
+            for uid, _, literal in iter_fetch(data)
+            if literal is not None
+        )
+
+    def _fetch_chunked(
+        self,
+        uid: int,
+        chunk_size: int,
+        checkpoint: FetchCheckpoint,
+    ) -> Optional[bytes]:
+        if checkpoint.uid != uid:
+            checkpoint.uid, checkpoint.offset = uid, 0
+            checkpoint.buffer = bytearray()
+
+        while True:
+            typ, data = self.imap4.uid(
+                "FETCH",
+                str(uid),
+                f"(BODY.PEEK[]<{checkpoint.offset}.{chunk_size}>)",
+            )
+            if typ != "OK":
+                raise IMAP4Error(f"FETCH failed: {data}")
+
+            literals = [
+                literal
+                for _, _, literal in iter_fetch(data)
+                if literal is not None
+            ]
+            if not literals and not checkpoint.offset:
+                # The message no longer exists, as in `_fetch_batch`.
+                checkpoint.uid = None
+                return None
+
+            chunk = b"".join(literals)
+            checkpoint.buffer += chunk
+            checkpoint.offset += len(chunk)
+
+            if len(chunk) < chunk_size:
+                break
+
+        message = bytes(checkpoint.buffer)
+        checkpoint.uid, checkpoint.offset = None, 0
+        checkpoint.buffer = bytearray()
+        return message
+
+    @catch_exception
+    @_bounded
+    def latest_messages(
+        self,
+        senders: Iterable[str],
+        date_range: int = -1,
+        message_parts: str = TEXT_MESSSAGE,
+    ) -> dict[str, Optional[tuple[int, bytes]]]:
+        """Batch version of `latest_message` for many senders.
+
+        Instead of two SEARCH commands and a FETCH per sender, this issues a
+        single SEARCH for the date window, fetches the FROM header of every
+        message in it once, picks the newest UID per sender locally and
+        downloads all the selected messages with one FETCH.
+
+        Args:
+            senders (Iterable[str]): Strings contained in the FROM field.
+                Like the IMAP FROM search key, matching is a case-insensitive
+                substring match.
+            date_range (int, optional): Time frame or days in which messages
+                are expected to be present. Defaults to -1.
+            message_parts (str, optional): Message data item names. Defaults
+                to TEXT_MESSSAGE (RFC822/BODY[]).
+
+        Raises:
+            Exception: Raised when date_range is greater than -1.
+            IMAP4Error: A FETCH command failed.
+
+        Returns:
+            dict[str, Optional[tuple[int, bytes]]]: The UID and data of the
+                latest message of each sender, or None if none was found.
+        """
+        if date_range > -1:
+            raise Exception(
+                f"date_range can't be greater than -1: \
+                {date_range}"
+            )
+
+        latest: dict[str, Optional[int]] = dict.fromkeys(senders)
+        sentsince = date_format(date_travel(date_range))
+        typ, data = self.imap4.uid("SEARCH", f"(SENTSINCE {sentsince})")
+
+        if typ == "OK" and data and data[0]:
+            uids = sequence_set(map(int, data[0].split()))
+            typ, data = self.imap4.uid(
+                "FETCH", uids, "(BODY.PEEK[HEADER.FIELDS (FROM)])"
+            )
+            if typ != "OK":
+                raise IMAP4Error(f"FETCH failed: {data}")
+            headers = sorted(
+                (
+                    (uid, literal)
+                    for uid, _, literal in iter_fetch(data)
+                    if literal is not None
+                ),
+                reverse=True,
+            )
+            needles = {sender: sender.lower() for sender in latest}
+
+            for uid, literal in headers:
+                from_field = self._decode_from(literal).lower()
+                for sender, needle in list(needles.items()):
+                    if needle in from_field:
+                        latest[sender] = uid
+                        del needles[sender]
+                if not needles:
+                    break
+
+        found = sorted({uid for uid in latest.values() if uid is not None})
+        messages = {}
+        if found:
+            messages = dict(self._fetch_batch(found, message_parts))
+
+        return {
+            sender: (uid, messages[uid])
+            if uid is not None and uid in messages
+            else None
+            for sender, uid in latest.items()
+        }
+
+    @staticmethod
+    def _decode_from(header: bytes) -> str:
+        value = header.decode("utf-8", "replace").partition(":")[2]
+        return decode_header_value(re.sub(r"\r?\n", "", value).strip())
+
+    @catch_exception
+    @_bounded
+    def newest(
+        self,
+        criteria: str = "ALL",
+        n: int = 1,
+        message_parts: str = TEXT_MESSSAGE,
+    ) -> list[tuple[int, bytes]]:
+        """Retrieve the N most recent messages matching search criteria.
+
+        The UIDs are selected by `newest_uids` and the messages are then
+        downloaded with a single FETCH command.
+
+        Args:
+            criteria (str, optional): IMAP search criteria, e.g.
+                `(FROM "John Smith")`. Defaults to "ALL".
+            n (int, optional): Number of messages. Defaults to 1.
+            message_parts (str, optional): Message data item names. Defaults
+                to TEXT_MESSSAGE (RFC822/BODY[]).
+
+        Returns:
+            list[tuple[int, bytes]]: The UID and data of each message, most
+                recent first.
+        """
+        uids = self.newest_uids(criteria, n)
+        if not uids:
+            return []
+
+        messages = dict(self._fetch_batch(uids, message_parts))
+        return [(uid, messages[uid]) for uid in uids if uid in messages]
+
+    @catch_exception
+    @_bounded
+    def newest_uids(self, criteria: str = "ALL", n: int = 1) -> list[int]:
+        """Find the UIDs of the N most recent messages matching search
+        criteria.
+
+        The fastest method the server supports is used: `SORT (REVERSE
+        ARRIVAL)`, then `ESEARCH` (`RETURN (MAX)` or `RETURN (ALL)`), and
+        finally a plain `UID SEARCH`. Without SORT, recency is judged by UID,
+        which grows as messages arrive.
+
+        Args:
+            criteria (str, optional): IMAP search criteria. Defaults to
+                "ALL".
+            n (int, optional): Number of UIDs. Defaults to 1.
+
+        Returns:
+            list[int]: The UIDs, most recent first.
+        """
+        if n < 1:
+            return []
+
+        capabilities = self.capabilities
+        if capabilities.has(SORT):
+            typ, data = self.imap4.uid(
+                "SORT", "(REVERSE ARRIVAL)", "UTF-8", criteria
+            )
+            if typ == "OK" and data and data[0]:
+                return [int(uid) for uid in data[0].split()[:n]]
+            return []
+
+        if capabilities.has(ESEARCH):
+            result = "MAX" if n == 1 else "ALL"
+            self.imap4.uid("SEARCH", f"RETURN ({result})", criteria)
+            ranges: list[tuple[int, int]] = []
+            for dat in self.imap4.untagged_responses.pop("ESEARCH", []):
+                match = _ESEARCH_RESULT.search(dat or b"")
+                if match:
+                    ranges.extend(parse_sequence_set(match.group(2)))
+            return self._largest(ranges, n)
+
+        typ, data = self.imap4.uid("SEARCH", criteria)
+        if typ != "OK" or not data or not data[0]:
+            return []
+        return heapq.nlargest(n, map(int, data[0].split()))
+
+    @staticmethod
+    def _largest(ranges: list[tuple[int, int]], n: int) -> list[int]:
+        # Walk the ranges from the top without expanding the whole set.
+        uids: list[int] = []
+        for start, end in sorted(ranges, key=lambda rng: rng[1], reverse=True):
+            for uid in range(end, start - 1, -1):
+                if len(uids) == n:
+                    return uids
+                if not uids or uid < uids[-1]:
+                    uids.append(uid)
+        return uids
+
     @catch_exception
     def __enter__(self):
         return self
@@ -228,6 +960,8 @@ class Client(_Client):
         port: int = 993,
         ssl_context: Optional[SSLContext] = None,
         timeout: float = 5.0,
+        capability_cache: Optional[CapabilityCache] = None,
+        operation_timeout: Optional[float] = None,
     ) -> None:
         """
         Args:
@@ -235,8 +969,16 @@ class Client(_Client):
                 email.
             port (int, optional): IMAP port (e.g. 143). Defaults to 993.
             ssl_context (Optional[SSLContext], optional): Client SSL Context.
-                If `None`, pragmail uses `ssl.create_default_context`
+                If `None` and port is 993, pragmail uses a process-wide
+                context created by `ssl.create_default_context`.
             timeout (float, optional): Connection timeout. Defaults to 5.0.
+            capability_cache (Optional[CapabilityCache], optional): Where the
+                server's capabilities are cached. Defaults to a process-wide
+                in-memory cache.
+            operation_timeout (Optional[float], optional): Deadline of each
+                client operation (login, select, each FETCH of a bulk
+                download, ...), in seconds. See `deadline`. Defaults to None
+                (no deadline).
         """
         if "@" in host:
             host = self.fetch_server_settings(host).replace("imap://", "")
@@ -245,28 +987,49 @@ class Client(_Client):
             if not self.check_connectivity(host):
                 raise Exception("Name or service not known.")
 
-        if port == 993:
-            ssl_context = create_default_context()
+        if ssl_context is None and port == 993:
+            ssl_context = default_ssl_context()
 
         self.host = host
         self.port = port
         self.ssl_context = ssl_context
         self.timeout = timeout
+        self.capability_cache = capability_cache or default_capability_cache()
+        self.operation_timeout = operation_timeout
+        with self.deadline(operation_timeout):
+            self.connect()
+
+    def connect(self) -> None:
+        """Open a new connection to the mail server.
+
+        Raises:
+            DeadlineExceeded: If the current deadline has passed.
+        """
+        # The connection timeout can't outlast the current deadline.
+        timeout: Optional[float] = self.timeout
+        if self._deadline is not None:
+            timeout = self._deadline.timeout(self.timeout)
 
         if self.ssl_context is not None:
-            self.imap4 = IMAP4_SSL(
-                host=host,
-                port=port,
-                ssl_context=ssl_context,
+            self.imap4 = IMAP4SSLConnection(
+                host=self.host,
+                port=self.port,
+                ssl_context=self.ssl_context,
                 timeout=timeout,
+                capability_cache=self.capability_cache,
             )
         else:
-            self.imap4 = IMAP4(
-                host=host,
-                port=port,
+            self.imap4 = IMAP4Connection(
+                host=self.host,
+                port=self.port,
                 timeout=timeout,
+                capability_cache=self.capability_cache,
             )
 
+        if timeout != self.timeout:
+            self.imap4.sock.settimeout(self.timeout)
+        self._set_deadline(self._deadline)
+
     def __repr__(self) -> str:
         class_repr = (
             "Client(host={host}, port={port}, "
@@ -0,0 +1,459 @@
+"""
+This module provides the connection layer used by `pragmail.Client`. It keeps
+state that is worth sharing between client instances, such as the default SSL
+context, the TLS sessions negotiated with each server and their capabilities.
+Connections to the same host also share its rate limit (see
+`pragmail.ratelimit`).
+
+Connections are opened by `connect`, which resolves host names through a
+small cache and races the resolved IPv6 and IPv4 addresses ("Happy Eyeballs",
+RFC 8305), so a broken address family costs a fraction of a second instead of
+a full timeout.
+"""
+import errno
+import selectors
+import sys
+import threading
+import time
+from functools import lru_cache
+from imaplib import IMAP4, IMAP4_SSL
+from socket import SO_ERROR, SOCK_STREAM, SOL_SOCKET, getaddrinfo, socket
+from socket import timeout as socket_timeout
+from ssl import SSLContext, SSLSession, create_default_context
+from typing import Any, Iterable, Optional
+
+from pragmail.capabilities import CapabilityCache, default_capability_cache
+from pragmail.deadlines import Deadline
+from pragmail.exceptions import DeadlineExceeded
+from pragmail.ratelimit import TokenBucket, get_rate_limit
+
+_SessionKey = tuple[str, int]
+
+_sessions: dict[_SessionKey, tuple[SSLContext, SSLSession]] = {}
+_sessions_lock = threading.Lock()
+
+# Marks a socket timeout that wasn't overridden by a deadline.
+_UNSET = object()
+
+# Delay before racing the next address, as recommended by RFC 8305.
+CONNECTION_ATTEMPT_DELAY = 0.25
+RESOLVER_TTL = 300.0
+
+_AddrInfo = tuple[Any, Any, int, str, tuple]
+_addresses: dict[tuple[Optional[str], int], tuple[float, list[_AddrInfo]]] = {}
+_addresses_lock = threading.Lock()
+_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY)
+
+
+@lru_cache(maxsize=None)
+def default_ssl_context() -> SSLContext:
+    """Process-wide SSL context used when the caller doesn't provide one.
+
+    Creating a context loads the system's CA bundle, so it is built once and
+    shared by every client. `SSLContext` objects are safe to share between
+    threads.
+
+    Returns:
+        SSLContext: The result of `ssl.create_default_context`.
+    """
+    return create_default_context()
+
+
+def get_tls_session(
+    host: str,
+    port: int,
+    ssl_context: SSLContext,
+) -> Optional[SSLSession]:
+    """Look up a TLS session previously negotiated with a server.
+
+    Args:
+        host (str): The server's host name.
+        port (int): The server's port.
+        ssl_context (SSLContext): The context the new connection will use.
+            Sessions can only be resumed by the context that created them.
+
+    Returns:
+        Optional[SSLSession]: The stored session, or None if there isn't a
+            usable one.
+    """
+    with _sessions_lock:
+        entry = _sessions.get((host, port))
+
+    if entry is not None and entry[0] is ssl_context:
+        return entry[1]
+    return None
+
+
+def store_tls_session(
+    host: str,
+    port: int,
+    ssl_context: SSLContext,
+    session: SSLSession,
+) -> None:
+    """Remember a TLS session so that later connections can resume it.
+
+    Args:
+        host (str): The server's host name.
+        port (int): The server's port.
+        ssl_context (SSLContext): The context that negotiated the session.
+        session (SSLSession): The negotiated session.
+    """
+    with _sessions_lock:
+        _sessions[(host, port)] = (ssl_context, session)
+
+
+def clear_tls_sessions() -> None:
+    """Forget every stored TLS session."""
+    with _sessions_lock:
+        _sessions.clear()
+
+
+def resolve(
+    host: Optional[str],
+    port: int,
+    ttl: float = RESOLVER_TTL,
+) -> list[_AddrInfo]:
+    """Resolve a host name, reusing results younger than `ttl` seconds.
+
+    The addresses are ordered for connection racing: address families
+    alternate, starting with the first family returned by the system (IPv6
+    on most dual-stack hosts).
+
+    Args:
+        host (Optional[str]): The host name or address.
+        port (int): The port.
+        ttl (float, optional): How long results are reused, in seconds.
+            Defaults to RESOLVER_TTL.
+
+    Returns:
+        list[_AddrInfo]: `socket.getaddrinfo` results.
+    """
+    key = (host, port)
+    now = time.monotonic()
+    with _addresses_lock:
+        entry = _addresses.get(key)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    infos = getaddrinfo(host, port, 0, SOCK_STREAM)
+    families: dict[Any, list[_AddrInfo]] = {}
+    for info in infos:
+        families.setdefault(info[0], []).append(info)
+
+    ordered: list[_AddrInfo] = []
+    queues = list(families.values())
+    while any(queues):
+        for queue in queues:
+            if queue:
+                ordered.append(queue.pop(0))
+
+    with _addresses_lock:
+        _addresses[key] = (now + ttl, ordered)
+    return ordered
+
+
+def clear_resolver_cache() -> None:
+    """Forget every cached host name resolution."""
+    with _addresses_lock:
+        _addresses.clear()
+
+
+def connect(
+    host: Optional[str],
+    port: int,
+    timeout: Optional[float] = None,
+    delay: float = CONNECTION_ATTEMPT_DELAY,
+) -> socket:
+    """Open a TCP connection, racing the addresses of the host.
+
+    A connection attempt is started for the first address; if it hasn't
+    succeeded after `delay` seconds, or as soon as it fails, the next address
+    is tried while the earlier attempts keep going. The first connection to
+    complete is returned and the others are closed.
+
+    Args:
+        host (Optional[str]): The host name or address.
+        port (int): The port.
+        timeout (Optional[float], optional): Limit for the whole connection
+            process, also set as the socket's timeout. Defaults to None.
+        delay (float, optional): Delay between connection attempts, in
+            seconds. Defaults to CONNECTION_ATTEMPT_DELAY.
+
+    Raises:
+        socket.timeout: If no connection completed within the timeout.
+        OSError: If every connection attempt failed.
+
+    Returns:
+        socket: The connected socket.
+    """
+    addresses = list(resolve(host, port))
+    expires = None if timeout is None else time.monotonic() + timeout
+    error: Optional[OSError] = None
+    attempts: dict[socket, tuple] = {}
+
+    with selectors.DefaultSelector() as selector:
+        try:
+            while addresses or attempts:
+                if addresses:
+                    family, type_, proto, _, sockaddr = addresses.pop(0)
+                    sock = socket(family, type_, proto)
+                    sock.setblocking(False)
+                    code = sock.connect_ex(sockaddr)
+                    if code == 0:
+                        attempts[sock] = sockaddr
+                        return _won(sock, attempts, timeout)
+                    if code not in _IN_PROGRESS:
+                        sock.close()
+                        error = OSError(code, f"Cannot connect to {sockaddr}")
+                        continue
+                    attempts[sock] = sockaddr
+                    selector.register(sock, selectors.EVENT_WRITE)
+
+                wait = delay if addresses else None
+                if expires is not None:
+                    left = expires - time.monotonic()
+                    if left <= 0:
+                        raise socket_timeout("Connection timed out.")
+                    wait = left if wait is None else min(wait, left)
+
+                for key, _ in selector.select(wait):
+                    sock = key.fileobj  # type: ignore
+                    selector.unregister(sock)
+                    code = sock.getsockopt(SOL_SOCKET, SO_ERROR)
+                    if code == 0:
+                        return _won(sock, attempts, timeout)
+                    error = OSError(
+                        code, f"Cannot connect to {attempts.pop(sock)}"
+                    )
+                    sock.close()
+        finally:
+            for sock in attempts:
+                sock.close()
+
+    # Let a later call pick up changed DNS records.
+    with _addresses_lock:
+        _addresses.pop((host, port), None)
+    raise error or OSError(f"No addresses found for {host}")
+
+
+def _won(
+    sock: socket,
+    attempts: dict[socket, tuple],
+    timeout: Optional[float],
+) -> socket:
+    del attempts[sock]
+    sock.settimeout(timeout)
+    return sock
+
+
+def pipeline(
+    imap4: IMAP4,
+    name: str,
+    arguments: Iterable[tuple[str, ...]],
+) -> tuple[list[str], list[Any]]:
+    """Send the same command several times without waiting for each response.
+
+    All commands are written before the first response is read, which costs a
+    single round trip instead of one per command. Only use this for commands
+    that are independent from each other (e.g. STATUS).
+
+    Args:
+        imap4 (IMAP4): The connection.
+        name (str): The command name, e.g. `STATUS`.
+        arguments (Iterable[tuple[str, ...]]): Arguments of each command.
+
+    Raises:
+        IMAP4.error: A command was rejected with BAD. Raised once every
+            response was read, so the connection can still be used.
+
+    Returns:
+        tuple[list[str], list[Any]]: The response type of each command and the
+            untagged responses named after the command.
+    """
+    # pylint: disable=protected-access
+    tags = [imap4._command(name, *args) for args in arguments]
+    types = []
+    error: Optional[IMAP4.error] = None
+
+    for tag in tags:
+        try:
+            types.append(imap4._command_complete(name, tag)[0])
+        except IMAP4.abort:
+            raise
+        except IMAP4.error as err:
+            types.append("BAD")
+            error = error or err
+
+    data = imap4.untagged_responses.pop(name, [])
+    if error is not None:
+        raise error
+    return types, data
+
+
+class IMAP4Connection(IMAP4):
+    """`imaplib.IMAP4` that caches the server's capabilities.
+
+    Capabilities announced in the server greeting are used as is, otherwise
+    they're looked up in the capability cache; the CAPABILITY command is only
+    sent when neither has them.
+
+    While `deadline` is set, every socket read and write times out when the
+    deadline passes and raises `DeadlineExceeded`. The connection can't be
+    used after that, since a response may have been cut in half.
+
+    Commands and bytes are paced by the host's rate limit, if one was set
+    with `pragmail.ratelimit.set_rate_limit`.
+    """
+
+    deadline: Optional[Deadline] = None
+    _saved_timeout: Any = _UNSET
+
+    def _create_socket(self, timeout: Optional[float]) -> socket:
+        if timeout is not None and not timeout:
+            raise ValueError(
+                "Non-blocking socket (timeout=0) is not supported"
+            )
+        sys.audit("imaplib.open", self, self.host, self.port)
+        return connect(self.host or None, self.port, timeout)
+
+    def __init__(
+        self,
+        *args: Any,
+        capability_cache: Optional[CapabilityCache] = None,
+        **kwargs: Any,
+    ) -> None:
+        if capability_cache is None:
+            capability_cache = default_capability_cache()
+        self.capability_cache = capability_cache
+        # Filled in by `_get_capabilities`, while `imaplib` connects.
+        self.capabilities: tuple[str, ...] = ()
+        super().__init__(*args, **kwargs)
+
+    def _get_capabilities(self) -> None:
+        greeting = self.untagged_responses.pop("CAPABILITY", None)
+        cached = self.capability_cache.get(self.host, self.port)
+
+        if greeting:
+            capabilities = str(greeting[-1], self._encoding).upper().split()
+            self.capabilities = tuple(capabilities)
+        elif cached:
+            self.capabilities = cached
+        else:
+            super()._get_capabilities()
+
+        if self.capabilities != cached:
+            self.capability_cache.set(self.host, self.port, self.capabilities)
+
+    def _apply_deadline(self) -> None:
+        if self.deadline is None:
+            if self._saved_timeout is not _UNSET:
+                self.sock.settimeout(self._saved_timeout)
+                self._saved_timeout = _UNSET
+            return
+
+        if self._saved_timeout is _UNSET:
+            self._saved_timeout = self.sock.gettimeout()
+        self.sock.settimeout(self.deadline.timeout(self._saved_timeout))
+
+    def _check_timeout(self, err: socket_timeout) -> None:
+        if self.deadline is not None and self.deadline.expired():
+            raise DeadlineExceeded("Deadline exceeded.") from err
+
+    def _bandwidth(self) -> Optional[TokenBucket]:
+        limit = get_rate_limit(self.host)
+        return limit.bandwidth if limit is not None else None
+
+    def _command(self, name: str, *args: Any) -> Any:
+        limit = get_rate_limit(self.host)
+        if limit is not None and limit.commands is not None:
+            limit.commands.acquire(1, self.deadline)
+        return super()._command(name, *args)
+
+    def read(self, size: int) -> bytes:
+        bucket = self._bandwidth()
+        if bucket is None:
+            return self._read(size)
+
+        # Large literals are read one burst at a time, so that they're
+        # spread over time instead of followed by a long pause.
+        chunks = []
+        while size > 0:
+            chunk_size = min(size, max(1, int(bucket.burst)))
+            bucket.acquire(chunk_size, self.deadline)
+            chunk = self._read(chunk_size)
+            chunks.append(chunk)
+            size -= len(chunk)
+            if len(chunk) < chunk_size:
+                break
+        return b"".join(chunks)
+
+    def _read(self, size: int) -> bytes:
+        self._apply_deadline()
+        try:
+            return super().read(size)
+        except socket_timeout as err:
+            self._check_timeout(err)
+            raise
+
+    def readline(self) -> bytes:
+        self._apply_deadline()
+        try:
+            line = super().readline()
+        except socket_timeout as err:
+            self._check_timeout(err)
+            raise
+
+        bucket = self._bandwidth()
+        if bucket is not None:
+            bucket.acquire(len(line), self.deadline)
+        return line
+
+    def send(self, data: bytes) -> None:
+        bucket = self._bandwidth()
+        if bucket is not None:
+            bucket.acquire(len(data), self.deadline)
+
+        self._apply_deadline()
+        try:
+            super().send(data)
+        except socket_timeout as err:
+            self._check_timeout(err)
+            raise
+
+
+class IMAP4SSLConnection(IMAP4Connection, IMAP4_SSL):
+    """`imaplib.IMAP4_SSL` that caches capabilities and resumes TLS
+    sessions.
+
+    When a session negotiated with the same host, port and SSL context is
+    available, the handshake offers it to the server, which skips the full
+    key exchange if it still accepts it.
+    """
+
+    def _create_socket(self, timeout: Optional[float]) -> socket:
+        sock = IMAP4Connection._create_socket(self, timeout)
+        return self.ssl_context.wrap_socket(
+            sock,
+            server_hostname=self.host,
+            session=get_tls_session(self.host, self.port, self.ssl_context),
+        )
+
+    def _connect(self) -> None:
+        super()._connect()
+        self.save_tls_session()
+
+    def shutdown(self) -> None:
+        # TLS 1.3 servers may send their session tickets after the greeting,
+        # so take another look before the socket goes away.
+        self.save_tls_session()
+        super().shutdown()
+
+    def save_tls_session(self) -> None:
+        """Store the connection's current TLS session, if any."""
+        session = getattr(self.sock, "session", None)
+        if session is not None:
+            store_tls_session(self.host, self.port, self.ssl_context, session)
+
+
+if __name__ == "__main__":
+    pass
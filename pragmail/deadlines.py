@@ -0,0 +1,79 @@
+"""
+This module provides `Deadline`, the point in time by which an operation must
+complete. Deadlines are shared by everything an operation does (connecting,
+sending commands, reading responses, backing off between retries) so that
+the operation as a whole is bounded, not each socket call.
+"""
+import math
+import time
+from typing import Optional
+
+from pragmail.exceptions import DeadlineExceeded
+
+
+class Deadline:
+    """Point in time, on the monotonic clock, by which work must complete.
+
+    Usage:
+    >>> deadline = Deadline(5.0)
+    >>> sock.settimeout(deadline.timeout(default=30.0))
+    """
+
+    def __init__(self, timeout: Optional[float] = None) -> None:
+        """
+        Args:
+            timeout (Optional[float], optional): Seconds from now. Defaults to
+                None (no deadline).
+        """
+        self.expires = None if timeout is None else time.monotonic() + timeout
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.3f})"
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline, `math.inf` if there is none. It
+        is negative once the deadline has passed."""
+        if self.expires is None:
+            return math.inf
+        return self.expires - time.monotonic()
+
+    def expired(self) -> bool:
+        """Check whether the deadline has passed."""
+        return self.remaining() <= 0
+
+    def earliest(self, other: Optional["Deadline"]) -> "Deadline":
+        """Return whichever of two deadlines comes first.
+
+        Args:
+            other (Optional[Deadline]): The other deadline.
+
+        Returns:
+            Deadline: The earliest deadline.
+        """
+        if other is None or other.remaining() >= self.remaining():
+            return self
+        return other
+
+    def timeout(self, default: Optional[float] = None) -> Optional[float]:
+        """Socket timeout to use for the next blocking call.
+
+        Args:
+            default (Optional[float], optional): The timeout used without a
+                deadline. Defaults to None (blocking).
+
+        Raises:
+            DeadlineExceeded: If the deadline has passed.
+
+        Returns:
+            Optional[float]: The smallest of the default and the time left.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("Deadline exceeded.")
+        if remaining == math.inf:
+            return default
+        return remaining if default is None else min(default, remaining)
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,284 @@
+"""
+This module skips downloading messages that were already stored.
+
+Servers such as Gmail expose the same message in several mailboxes (INBOX,
+labels, All Mail). `Deduplicator` first fetches the Message-ID and size of
+each message, which costs a few dozen bytes per message, and only downloads
+the bodies it hasn't seen before. Seen messages are remembered in a
+`BloomFilter` that can be saved to disk and shared between runs:
+
+>>> dedup = Deduplicator(BloomFilter(path="seen.bloom"))
+>>> for mailbox in ("INBOX", "[Gmail]/All Mail"):
+...     client.select(mailbox)
+...     for uid, message in dedup.fetch(client):
+...         store.add(uid, message, mailbox)
+>>> dedup.save()
+"""
+import math
+import os
+import struct
+import tempfile
+from hashlib import blake2b
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional, Union
+
+from pragmail.exports import iter_headers
+
+_MAGIC = b"PMBF"
+_HEADER = struct.Struct("<4sQdQQI")
+
+
+def message_key(
+    message_id: Optional[str],
+    size: Optional[int],
+) -> Optional[str]:
+    """Key identifying a message across mailboxes.
+
+    The size is part of the key because Message-IDs are set by senders and
+    aren't always unique.
+
+    Args:
+        message_id (Optional[str]): The Message-ID header.
+        size (Optional[int]): The RFC822.SIZE of the message.
+
+    Returns:
+        Optional[str]: The key, or None if the message has no Message-ID.
+    """
+    if not message_id or not message_id.strip():
+        return None
+    return f"{message_id.strip()} {size}"
+
+
+class BloomFilter:
+    """Probabilistic set of strings.
+
+    Membership tests may return false positives, at the configured rate, but
+    never false negatives. Memory use is about 1.8 bytes per item at a 0.1%
+    error rate. `len` is an estimate: an item whose bits were all set by
+    other items isn't counted.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1_000_000,
+        error_rate: float = 0.001,
+        path: Optional[Union[Path, str]] = None,
+    ) -> None:
+        """
+        Args:
+            capacity (int, optional): Number of items the filter is sized
+                for. The error rate grows once it's exceeded. Defaults to
+                1,000,000.
+            error_rate (float, optional): Expected false positive rate at
+                capacity. Defaults to 0.001.
+            path (Optional[Union[Path, str]], optional): File the filter is
+                loaded from, if it exists, and saved to by `save`. A loaded
+                filter keeps its own capacity and error rate. Defaults to
+                None.
+        """
+        self.path = Path(path) if path is not None else None
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.count = 0
+
+        self.size = max(
+            8,
+            math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2),
+        )
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+        if self.path is not None and self.path.is_file():
+            self._load(self.path)
+
+    def __repr__(self) -> str:
+        return (
+            f"BloomFilter(capacity={self.capacity}, "
+            f"error_rate={self.error_rate}, count={self.count})"
+        )
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _positions(self, key: str) -> Iterator[int]:
+        digest = blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        return all(
+            bits[pos >> 3] >> (pos & 7) & 1 for pos in self._positions(key)
+        )
+
+    def add(self, key: str) -> None:
+        """Add an item.
+
+        Args:
+            key (str): The item.
+        """
+        added = False
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not self.bits[pos >> 3] & mask:
+                self.bits[pos >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+
+    def save(self, path: Optional[Union[Path, str]] = None) -> None:
+        """Write the filter to disk, atomically.
+
+        Args:
+            path (Optional[Union[Path, str]], optional): The file. Defaults to
+                None (the filter's `path`).
+
+        Raises:
+            ValueError: If no path is given and the filter has none.
+        """
+        target = Path(path) if path is not None else self.path
+        if target is None:
+            raise ValueError("BloomFilter has no path to save to.")
+
+        header = _HEADER.pack(
+            _MAGIC,
+            self.capacity,
+            self.error_rate,
+            self.count,
+            self.size,
+            self.hashes,
+        )
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(header)
+                file.write(self.bits)
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def _load(self, path: Path) -> None:
+        with open(path, "rb") as file:
+            header = file.read(_HEADER.size)
+            bits = file.read()
+
+        if len(header) != _HEADER.size:
+            raise ValueError(f"{path} is not a pragmail Bloom filter.")
+        magic, capacity, error_rate, count, size, hashes = _HEADER.unpack(
+            header
+        )
+        if magic != _MAGIC or len(bits) != (size + 7) // 8:
+            raise ValueError(f"{path} is not a pragmail Bloom filter.")
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.count = count
+        self.size = size
+        self.hashes = hashes
+        self.bits = bytearray(bits)
+
+
+class Deduplicator:
+    """Download only the messages whose Message-ID and size weren't seen.
+
+    Messages without a Message-ID can't be recognized and are always
+    downloaded. With a `BloomFilter`, a new message is skipped with the
+    probability of the filter's error rate; pass a `set` to never skip new
+    messages, at the cost of memory.
+    """
+
+    def __init__(self, seen: Optional[Any] = None) -> None:
+        """
+        Args:
+            seen (Optional[Any], optional): Keys of the stored messages (see
+                `message_key`): any object supporting `in` and `add`, such as
+                a `BloomFilter` or a `set`. Defaults to None (a new
+                `BloomFilter`).
+        """
+        self.seen = seen if seen is not None else BloomFilter()
+        self.skipped = 0
+
+    def __repr__(self) -> str:
+        return f"Deduplicator(seen={self.seen!r}, skipped={self.skipped})"
+
+    def new_uids(
+        self,
+        client: Any,
+        uids: Optional[Iterable[int]] = None,
+        batch_size: int = 1000,
+    ) -> dict[int, Optional[str]]:
+        """Find the messages of the selected mailbox that weren't seen.
+
+        Args:
+            client (Any): A `pragmail.Client` with a selected mailbox.
+            uids (Optional[Iterable[int]], optional): UIDs to consider.
+                Defaults to None (every message).
+            batch_size (int, optional): Number of messages per header FETCH
+                command. Defaults to 1000.
+
+        Returns:
+            dict[int, Optional[str]]: The key of each new message, by UID.
+        """
+        new: dict[int, Optional[str]] = {}
+        pending: set[str] = set()
+
+        for row in iter_headers(client, ("Message-ID",), uids, batch_size):
+            key = message_key(row["message_id"], row["size"])
+            if key is not None and (key in pending or key in self.seen):
+                self.skipped += 1
+                continue
+            new[row["uid"]] = key
+            if key is not None:
+                pending.add(key)
+
+        return new
+
+    def fetch(
+        self,
+        client: Any,
+        uids: Optional[Iterable[int]] = None,
+        batch_size: int = 1000,
+        **kwargs: Any,
+    ) -> Iterator[tuple[int, bytes]]:
+        """Download the messages of the selected mailbox that weren't seen.
+
+        Each message is marked as seen when the caller asks for the next one,
+        i.e. after it processed the message, so an interrupted run downloads
+        the unprocessed messages again next time.
+
+        Args:
+            client (Any): A `pragmail.Client` with a selected mailbox.
+            uids (Optional[Iterable[int]], optional): UIDs to consider.
+                Defaults to None (every message).
+            batch_size (int, optional): Number of messages per header FETCH
+                command. Defaults to 1000.
+            **kwargs (Any): Keyword arguments of `Client.bulk_fetch`.
+
+        Yields:
+            Iterator[tuple[int, bytes]]: The UID and content of each new
+                message.
+        """
+        new = self.new_uids(client, uids, batch_size)
+        if not new:
+            return
+
+        for uid, message in client.bulk_fetch(new, **kwargs):
+            yield uid, message
+            key = new.get(uid)
+            if key is not None:
+                self.seen.add(key)
+
+    def save(self) -> None:
+        """Save the seen keys, if they're kept in a `BloomFilter` with a
+        path."""
+        if isinstance(self.seen, BloomFilter) and self.seen.path is not None:
+            self.seen.save()
+
+
+if __name__ == "__main__":
+    pass
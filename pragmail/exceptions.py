@@ -2,13 +2,30 @@
 Implementation of custom exceptions for pragmail.
 """
 from functools import wraps
-from typing import Any, Callable
+from typing import Any, Callable, Optional
 
 
 class IMAP4Error(Exception):
     """Generic pragmail exception."""
 
 
+class DeadlineExceeded(IMAP4Error):
+    """Exception raised when an operation runs past its deadline. The
+    connection it was using has been dropped.
+    """
+
+    def __init__(self, *args: Any, partial: Optional[Any] = None) -> None:
+        """
+        Args:
+            *args (Any): The exception message.
+            partial (Optional[Any], optional): What the operation completed
+                before the deadline, e.g. the `FetchCheckpoint` of a
+                `bulk_fetch` call. Defaults to None.
+        """
+        super().__init__(*args)
+        self.partial = partial
+
+
 class CommandError(AttributeError, ValueError):
     """Exception raised when command usage is invalid."""
 
@@ -22,6 +39,8 @@ def catch_exception(func: Callable[..., Any]):
     def wrapper(*args: Any, **kwargs: Any):
         try:
             return func(*args, **kwargs)
+        except IMAP4Error:
+            raise
         except (AttributeError, ValueError) as common_err:
             raise CommandError(common_err) from common_err
         except Exception as generic_err:
@@ -0,0 +1,288 @@
+"""
+This module exports message headers of whole mailboxes for analysis.
+
+Only the selected header fields and the message size are downloaded, with
+`BODY.PEEK[HEADER.FIELDS (...)]` in batches of UIDs, and rows are streamed to
+CSV, JSON Lines or a SQLite table as they arrive:
+
+>>> client.select("INBOX")
+>>> export_headers(client, "inbox.sqlite")
+1357
+"""
+import csv
+import json
+import re
+import sqlite3
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional, TextIO, Union
+
+from pragmail.utils import (decode_header_value, iter_fetch, sequence_set,
+                            unfold, unquote_mailbox)
+
+DEFAULT_FIELDS = ("From", "To", "Date", "Subject", "Message-ID")
+EXPORT_FORMATS = ("csv", "jsonl", "sqlite")
+
+_SUFFIX_FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl",
+    ".db": "sqlite",
+    ".sqlite": "sqlite",
+    ".sqlite3": "sqlite",
+}
+_RFC822_SIZE = re.compile(rb"\bRFC822\.SIZE (\d+)")
+
+
+def column_name(field: str) -> str:
+    """Name of the column holding a header field, e.g. "message_id" for
+    "Message-ID".
+
+    Args:
+        field (str): The header field name.
+
+    Returns:
+        str: The column name.
+    """
+    return field.lower().replace("-", "_")
+
+
+def parse_header_fields(block: bytes) -> dict[str, str]:
+    """Parse a header block returned by `BODY[HEADER.FIELDS (...)]`.
+
+    Folded lines are unfolded and RFC 2047 encoded words are decoded. When a
+    field occurs more than once, the first occurrence is kept.
+
+    Args:
+        block (bytes): The header block.
+
+    Returns:
+        dict[str, str]: The field values, keyed by lowercase field name.
+    """
+    text = unfold(block.decode("utf-8", "replace"))
+    fields: dict[str, str] = {}
+
+    for line in text.splitlines():
+        name, sep, value = line.partition(":")
+        if not sep or not name or name[0] in " \t":
+            continue
+        name = name.strip().lower()
+        if name in fields:
+            continue
+
+        fields[name] = decode_header_value(value.strip())
+
+    return fields
+
+
+def iter_headers(
+    client: Any,
+    fields: Iterable[str] = DEFAULT_FIELDS,
+    uids: Optional[Iterable[int]] = None,
+    batch_size: int = 1000,
+    mailbox: Optional[str] = None,
+) -> Iterator[dict[str, Any]]:
+    """Fetch header fields of the messages in the selected mailbox.
+
+    Args:
+        client (Any): A `pragmail.Client` with a selected mailbox.
+        fields (Iterable[str], optional): Header fields to fetch. Defaults to
+            DEFAULT_FIELDS.
+        uids (Optional[Iterable[int]], optional): UIDs of the messages.
+            Defaults to None (every message).
+        batch_size (int, optional): Number of messages requested per FETCH
+            command. Defaults to 1000.
+        mailbox (Optional[str], optional): Value of the "mailbox" column.
+            Defaults to None (the name of the mailbox selected with
+            `Client.select`, or "" if unknown).
+
+    Yields:
+        Iterator[dict[str, Any]]: One row per message, with the "mailbox",
+            "uid" and "size" columns followed by one column per field (see
+            `column_name`). Missing fields are None.
+    """
+    fields = tuple(fields)
+    columns = [(field.lower(), column_name(field)) for field in fields]
+    items = (
+        f"(RFC822.SIZE BODY.PEEK[HEADER.FIELDS "
+        f"({' '.join(field.upper() for field in fields)})])"
+    )
+    if mailbox is None:
+        mailbox = getattr(client, "_mailbox", None) or ""
+    # The name is part of the SQLite primary key, so it must not vary.
+    mailbox = unquote_mailbox(mailbox)
+
+    if uids is None:
+        typ, data = client.imap4.uid("SEARCH", "ALL")
+        uids = map(int, data[0].split()) if typ == "OK" and data[0] else ()
+    uids = sorted(set(uids))
+
+    for start in range(0, len(uids), batch_size):
+        batch = uids[start:start + batch_size]
+        typ, data = client.imap4.uid("FETCH", sequence_set(batch), items)
+        if typ != "OK":
+            continue
+
+        for uid, meta, literal in iter_fetch(data):
+            size = _RFC822_SIZE.search(meta)
+            values = parse_header_fields(literal or b"")
+            row: dict[str, Any] = {
+                "mailbox": mailbox,
+                "uid": uid,
+                "size": int(size.group(1)) if size else None,
+            }
+            for field, column in columns:
+                row[column] = values.get(field)
+            yield row
+
+
+def guess_format(output: Union[Path, str, TextIO]) -> str:
+    """Guess the export format from the output's file suffix.
+
+    Args:
+        output (Union[Path, str, TextIO]): The output path or stream.
+
+    Raises:
+        ValueError: If the format can't be guessed.
+
+    Returns:
+        str: One of `EXPORT_FORMATS`.
+    """
+    if isinstance(output, (Path, str)):
+        fmt = _SUFFIX_FORMATS.get(Path(output).suffix.lower())
+        if fmt is not None:
+            return fmt
+    raise ValueError(f"Cannot guess the export format of {output!r}")
+
+
+def export_headers(
+    client: Any,
+    output: Union[Path, str, TextIO],
+    fmt: Optional[str] = None,
+    fields: Iterable[str] = DEFAULT_FIELDS,
+    uids: Optional[Iterable[int]] = None,
+    batch_size: int = 1000,
+    table: str = "headers",
+    mailbox: Optional[str] = None,
+) -> int:
+    """Export header fields of the messages in the selected mailbox.
+
+    Args:
+        client (Any): A `pragmail.Client` with a selected mailbox.
+        output (Union[Path, str, TextIO]): The output path, or a text
+            stream for the "csv" and "jsonl" formats. Existing CSV and JSON
+            Lines files are overwritten; SQLite rows are upserted.
+        fmt (Optional[str], optional): One of `EXPORT_FORMATS`. Guessed from
+            the output's suffix if None. Defaults to None.
+        fields (Iterable[str], optional): Header fields to export. Defaults
+            to DEFAULT_FIELDS.
+        uids (Optional[Iterable[int]], optional): UIDs of the messages.
+            Defaults to None (every message).
+        batch_size (int, optional): Number of messages fetched, and rows
+            inserted, at a time. Defaults to 1000.
+        table (str, optional): Name of the SQLite table. Defaults to
+            "headers".
+        mailbox (Optional[str], optional): Value of the "mailbox" column.
+            See `iter_headers`. Defaults to None.
+
+    Raises:
+        ValueError: If the format is unknown or can't be guessed.
+
+    Returns:
+        int: The number of exported messages.
+    """
+    if fmt is None:
+        fmt = guess_format(output)
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    fields = tuple(fields)
+    rows = iter_headers(client, fields, uids, batch_size, mailbox)
+    columns = ["mailbox", "uid", "size", *map(column_name, fields)]
+
+    if fmt == "sqlite":
+        if not isinstance(output, (Path, str)):
+            raise ValueError("SQLite exports need a file path.")
+        return _export_sqlite(rows, output, columns, table, batch_size)
+
+    if isinstance(output, (Path, str)):
+        with open(output, "w", encoding="utf-8", newline="") as file:
+            return _export_text(rows, file, fmt, columns)
+    return _export_text(rows, output, fmt, columns)
+
+
+def _export_text(
+    rows: Iterator[dict[str, Any]],
+    file: TextIO,
+    fmt: str,
+    columns: list[str],
+) -> int:
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(file, columns)
+        writer.writeheader()
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+    else:
+        for count, row in enumerate(rows, 1):
+            file.write(json.dumps(row, ensure_ascii=False))
+            file.write("\n")
+    return count
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _export_sqlite(
+    rows: Iterator[dict[str, Any]],
+    path: Union[Path, str],
+    columns: list[str],
+    table: str,
+    batch_size: int,
+) -> int:
+    types = {
+        "mailbox": "TEXT NOT NULL",
+        "uid": "INTEGER NOT NULL",
+        "size": "INTEGER",
+    }
+    definitions = ", ".join(
+        f"{_quote(column)} {types.get(column, 'TEXT')}" for column in columns
+    )
+    statement = (
+        f"INSERT OR REPLACE INTO {_quote(table)} "
+        f"({', '.join(map(_quote, columns))}) "
+        f"VALUES ({', '.join('?' * len(columns))})"
+    )
+
+    connection = sqlite3.connect(path)
+    count = 0
+    try:
+        # WAL lets readers query the table while the export is running.
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with connection:
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {_quote(table)} "
+                f"({definitions}, PRIMARY KEY (mailbox, uid))"
+            )
+
+        batch: list[tuple[Any, ...]] = []
+        for row in rows:
+            batch.append(tuple(row[column] for column in columns))
+            if len(batch) >= batch_size:
+                with connection:
+                    connection.executemany(statement, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            with connection:
+                connection.executemany(statement, batch)
+            count += len(batch)
+    finally:
+        connection.close()
+
+    return count
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,362 @@
+"""
+This module provides a local index of message flags for a whole mailbox.
+
+`FlagIndex` stores one UID column, one INTERNALDATE column and one bitset per
+flag, all indexed by the message's position in the mailbox. Queries such as
+"unread since last week" combine bitsets with integer operations instead of
+asking the server, and the index is kept current by incremental syncs.
+"""
+import re
+from array import array
+from bisect import bisect_left
+from datetime import date, datetime
+from typing import Any, Iterable, Optional, Union
+
+from pragmail.capabilities import CONDSTORE, Capabilities
+from pragmail.utils import iter_fetch, quote_mailbox
+
+SEEN = "\\SEEN"
+FLAGGED = "\\FLAGGED"
+ANSWERED = "\\ANSWERED"
+DELETED = "\\DELETED"
+DRAFT = "\\DRAFT"
+
+_FLAGS = re.compile(rb"\bFLAGS \(([^)]*)\)")
+_INTERNALDATE = re.compile(rb'\bINTERNALDATE "([^"]+)"')
+_MODSEQ = re.compile(rb"\bMODSEQ \((\d+)\)")
+
+_Moment = Union[datetime, date, float, int]
+
+
+def _timestamp(moment: _Moment) -> float:
+    if isinstance(moment, datetime):
+        if moment.tzinfo is None:
+            moment = moment.astimezone()
+        return moment.timestamp()
+    if isinstance(moment, date):
+        return datetime(moment.year, moment.month, moment.day).timestamp()
+    return float(moment)
+
+
+def _parse_internaldate(value: bytes) -> float:
+    moment = datetime.strptime(value.decode().strip(), "%d-%b-%Y %H:%M:%S %z")
+    return moment.timestamp()
+
+
+class FlagIndex:
+    """Flags and arrival dates of every message in a mailbox.
+
+    Usage:
+    >>> index = FlagIndex("INBOX")
+    >>> index.sync(client)
+    >>> index.query(without_flags=[SEEN], since=date.today() - week)
+    [4021, 4022, 4030]
+    """
+
+    def __init__(self, mailbox: str = "INBOX") -> None:
+        """
+        Args:
+            mailbox (str, optional): The indexed mailbox. Defaults to
+                "INBOX".
+        """
+        self.mailbox = mailbox
+        self.uidvalidity: Optional[int] = None
+        self.highestmodseq = 0
+        self.uids = array("I")
+        self.dates = array("d")
+        self.bits: dict[str, bytearray] = {}
+        self._dates_sorted = True
+
+    def __repr__(self) -> str:
+        return f"FlagIndex(mailbox={self.mailbox!r}, messages={len(self)})"
+
+    def __len__(self) -> int:
+        return len(self.uids)
+
+    def __contains__(self, uid: int) -> bool:
+        return self._position(uid) is not None
+
+    def _position(self, uid: int) -> Optional[int]:
+        pos = bisect_left(self.uids, uid)
+        if pos < len(self.uids) and self.uids[pos] == uid:
+            return pos
+        return None
+
+    def clear(self) -> None:
+        """Remove every message from the index."""
+        self.uidvalidity = None
+        self.highestmodseq = 0
+        self.uids = array("I")
+        self.dates = array("d")
+        self.bits = {}
+        self._dates_sorted = True
+
+    def update(
+        self,
+        uid: int,
+        flags: Iterable[str],
+        internaldate: Optional[float] = None,
+    ) -> None:
+        """Add a message or replace its flags.
+
+        Args:
+            uid (int): The message's UID.
+            flags (Iterable[str]): All the flags of the message.
+            internaldate (Optional[float], optional): The message's
+                INTERNALDATE as a POSIX timestamp. Defaults to None (keep
+                the known value, or 0 for a new message).
+        """
+        pos = self._position(uid)
+        if pos is None:
+            pos = self._insert(uid, internaldate or 0.0)
+        elif internaldate is not None:
+            self.dates[pos] = internaldate
+            if (pos and internaldate < self.dates[pos - 1]) or (
+                pos + 1 < len(self.dates)
+                and internaldate > self.dates[pos + 1]
+            ):
+                self._dates_sorted = False
+
+        byte, mask = pos >> 3, 1 << (pos & 7)
+        flags = {flag.upper() for flag in flags}
+
+        for flag in flags:
+            if flag not in self.bits:
+                self.bits[flag] = bytearray(len(self.uids) + 7 >> 3)
+        for flag, bits in self.bits.items():
+            if flag in flags:
+                bits[byte] |= mask
+            else:
+                bits[byte] &= ~mask & 0xFF
+
+    def _insert(self, uid: int, internaldate: float) -> int:
+        if not self.uids or uid > self.uids[-1]:
+            pos = len(self.uids)
+            self.uids.append(uid)
+            self.dates.append(internaldate)
+            if pos and internaldate < self.dates[pos - 1]:
+                self._dates_sorted = False
+            size = len(self.uids) + 7 >> 3
+            for bits in self.bits.values():
+                if len(bits) < size:
+                    bits.append(0)
+            return pos
+
+        # UIDs normally only grow; inserting in the middle shifts the bits.
+        pos = bisect_left(self.uids, uid)
+        shifted = {flag: self._bitset(flag) for flag in self.bits}
+        self.uids.insert(pos, uid)
+        self.dates.insert(pos, internaldate)
+        self._dates_sorted = all(
+            a <= b for a, b in zip(self.dates, self.dates[1:])
+        )
+        low = (1 << pos) - 1
+        size = len(self.uids) + 7 >> 3
+        for flag, value in shifted.items():
+            value = (value & low) | ((value & ~low) << 1)
+            self.bits[flag] = bytearray(value.to_bytes(size, "little"))
+        return pos
+
+    def remove(self, uids: Iterable[int]) -> None:
+        """Remove expunged messages from the index.
+
+        Args:
+            uids (Iterable[int]): UIDs of the removed messages.
+        """
+        removed = {pos for pos in map(self._position, uids) if pos is not None}
+        if not removed:
+            return
+
+        keep = [pos for pos in range(len(self.uids)) if pos not in removed]
+        flags = {
+            flag: [pos for pos in keep if bits[pos >> 3] >> (pos & 7) & 1]
+            for flag, bits in self.bits.items()
+        }
+        self.uids = array("I", (self.uids[pos] for pos in keep))
+        self.dates = array("d", (self.dates[pos] for pos in keep))
+
+        size = len(self.uids) + 7 >> 3
+        index = {old: new for new, old in enumerate(keep)}
+        for flag, positions in flags.items():
+            bits = bytearray(size)
+            for old in positions:
+                new = index[old]
+                bits[new >> 3] |= 1 << (new & 7)
+            self.bits[flag] = bits
+
+    def _bitset(self, flag: str) -> int:
+        bits = self.bits.get(flag.upper())
+        return int.from_bytes(bits, "little") if bits else 0
+
+    def _date_mask(
+        self,
+        since: Optional[_Moment],
+        before: Optional[_Moment],
+    ) -> int:
+        start = _timestamp(since) if since is not None else None
+        end = _timestamp(before) if before is not None else None
+
+        if self._dates_sorted:
+            # Dates follow UIDs, so the window is a contiguous range.
+            first = 0 if start is None else bisect_left(self.dates, start)
+            last = len(self.dates) if end is None else bisect_left(
+                self.dates, end
+            )
+            if last <= first:
+                return 0
+            return ((1 << (last - first)) - 1) << first
+
+        mask = 0
+        for pos, moment in enumerate(self.dates):
+            if (start is None or moment >= start) and (
+                end is None or moment < end
+            ):
+                mask |= 1 << pos
+        return mask
+
+    def mask(
+        self,
+        with_flags: Iterable[str] = (),
+        without_flags: Iterable[str] = (),
+        since: Optional[_Moment] = None,
+        before: Optional[_Moment] = None,
+    ) -> int:
+        """Compute the bitset of the messages matching a query.
+
+        Args:
+            with_flags (Iterable[str], optional): Flags the messages must
+                have. Defaults to ().
+            without_flags (Iterable[str], optional): Flags the messages must
+                not have. Defaults to ().
+            since (Optional[_Moment], optional): Earliest INTERNALDATE, as a
+                datetime, date or POSIX timestamp. Defaults to None.
+            before (Optional[_Moment], optional): INTERNALDATE upper bound
+                (exclusive). Defaults to None.
+
+        Returns:
+            int: Bit N is set if the message at position N matches.
+        """
+        mask = (1 << len(self.uids)) - 1
+        for flag in with_flags:
+            mask &= self._bitset(flag)
+        for flag in without_flags:
+            mask &= ~self._bitset(flag)
+        if since is not None or before is not None:
+            mask &= self._date_mask(since, before)
+        return mask
+
+    def count(self, *args: Any, **kwargs: Any) -> int:
+        """Count the messages matching a query. See `mask`."""
+        return bin(self.mask(*args, **kwargs)).count("1")
+
+    def query(self, *args: Any, **kwargs: Any) -> list[int]:
+        """Find the UIDs of the messages matching a query. See `mask`.
+
+        Returns:
+            list[int]: The UIDs, in ascending order.
+        """
+        mask = self.mask(*args, **kwargs)
+        size = len(self.uids) + 7 >> 3
+        uids = []
+        for byte_pos, byte in enumerate(mask.to_bytes(size, "little")):
+            if not byte:
+                continue
+            base = byte_pos << 3
+            for bit in range(8):
+                if byte >> bit & 1:
+                    uids.append(self.uids[base + bit])
+        return uids
+
+    def load(self, data: list[Any], min_uid: int = 0) -> None:
+        """Update the index from `UID FETCH` response data containing FLAGS
+        and, optionally, INTERNALDATE and MODSEQ.
+
+        Args:
+            data (list[Any]): Response data returned by `IMAP4.uid`.
+            min_uid (int, optional): Ignore messages whose UID is lower.
+                Defaults to 0.
+        """
+        for uid, meta, _ in iter_fetch(data):
+            flags = _FLAGS.search(meta)
+            if flags is None or uid < min_uid:
+                continue
+
+            internaldate = None
+            match = _INTERNALDATE.search(meta)
+            if match:
+                internaldate = _parse_internaldate(match.group(1))
+
+            modseq = _MODSEQ.search(meta)
+            if modseq:
+                self.highestmodseq = max(
+                    self.highestmodseq, int(modseq.group(1))
+                )
+
+            self.update(uid, flags.group(1).decode().split(), internaldate)
+
+    def sync(self, client: Any) -> None:
+        """Bring the index up to date with the server.
+
+        The first sync fetches the flags and dates of every message. Later
+        syncs only fetch new messages and changed flags (with CONDSTORE's
+        CHANGEDSINCE when available), and look for expunged messages when
+        the message count shows some were removed. The whole index is
+        rebuilt if the mailbox's UIDVALIDITY changed.
+
+        Args:
+            client (Any): A logged-in `pragmail.Client`. The indexed mailbox
+                is selected (read-only).
+        """
+        imap4 = client.imap4
+        typ, data = client.select(quote_mailbox(self.mailbox))
+        if typ != "OK":
+            return
+        exists = int(data[0]) if data and data[0] else 0
+
+        _, validity = imap4.response("UIDVALIDITY")
+        uidvalidity = int(validity[-1]) if validity and validity[-1] else None
+        if uidvalidity != self.uidvalidity:
+            self.clear()
+            self.uidvalidity = uidvalidity
+
+        condstore = Capabilities(imap4.capabilities).has(CONDSTORE)
+        items = "FLAGS INTERNALDATE MODSEQ" if condstore else (
+            "FLAGS INTERNALDATE"
+        )
+
+        if exists == 0:
+            self.remove(list(self.uids))
+            return
+
+        if not self.uids:
+            _, data = imap4.uid("FETCH", "1:*", f"({items})")
+            self.load(data)
+            return
+
+        last_uid = self.uids[-1]
+        known = len(self.uids)
+
+        if condstore and self.highestmodseq:
+            _, data = imap4.uid(
+                "FETCH",
+                f"1:{last_uid}",
+                "(FLAGS MODSEQ)",
+                f"(CHANGEDSINCE {self.highestmodseq})",
+            )
+        else:
+            _, data = imap4.uid("FETCH", f"1:{last_uid}", "(FLAGS)")
+        self.load(data)
+
+        # `n:*` always matches the last message, even if its UID is lower.
+        _, data = imap4.uid("FETCH", f"{last_uid + 1}:*", f"({items})")
+        self.load(data, min_uid=last_uid + 1)
+
+        new = len(self.uids) - known
+        if exists < known + new:
+            _, data = imap4.uid("SEARCH", "ALL")
+            present = {int(uid) for uid in (data[0] or b"").split()}
+            self.remove([uid for uid in self.uids if uid not in present])
+
+
+if __name__ == "__main__":
+    pass
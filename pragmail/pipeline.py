@@ -0,0 +1,245 @@
+"""
+This module connects fetching, parsing and writing messages into a pipeline.
+
+Each stage runs in its own workers (threads, or processes for CPU-bound
+work) and hands its results to the next stage through a bounded queue. A slow
+stage fills its input queue, which blocks the stages before it, so memory
+stays bounded while network I/O, parsing and disk writes overlap:
+
+>>> pipeline = Pipeline(client.bulk_fetch(uids))
+>>> pipeline.stage(parse, workers=4, processes=True)
+>>> pipeline.stage(write, workers=2)
+>>> pipeline.run()
+1357
+"""
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from queue import Empty, Full, Queue
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+# Marks the end of a stage's input.
+_DONE = object()
+
+# How often blocked workers check whether the pipeline was stopped, in
+# seconds.
+_POLL_INTERVAL = 0.1
+
+
+class _Stage:
+    def __init__(
+        self,
+        func: Callable[[Any], Any],
+        workers: int,
+        processes: bool,
+        maxsize: int,
+    ) -> None:
+        self.func = func
+        self.workers = workers
+        self.processes = processes
+        self.output: Queue = Queue(maxsize)
+        self.remaining = workers
+        self.executor: Optional[Executor] = None
+
+
+class Pipeline:
+    """Chain of stages connected by bounded queues.
+
+    Items are taken from the source in a dedicated thread; every stage calls
+    its function on each item it receives and passes the result on. With
+    more than one worker, a stage may reorder items.
+
+    The first exception raised by the source or a stage stops the pipeline
+    and is re-raised to the consumer.
+    """
+
+    def __init__(self, source: Iterable[Any], maxsize: int = 16) -> None:
+        """
+        Args:
+            source (Iterable[Any]): The items to process, e.g. the generator
+                returned by `Client.bulk_fetch`. It is consumed in a single
+                thread, so it may use a client connection.
+            maxsize (int, optional): Default capacity of the queues between
+                stages. Defaults to 16.
+        """
+        self.source = source
+        self.maxsize = maxsize
+        self._input: Queue = Queue(maxsize)
+        self._stages: list[_Stage] = []
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._started = False
+
+    def __repr__(self) -> str:
+        return f"Pipeline(stages={len(self._stages)}, maxsize={self.maxsize})"
+
+    def stage(
+        self,
+        func: Callable[[Any], Any],
+        workers: int = 1,
+        processes: bool = False,
+        maxsize: Optional[int] = None,
+    ) -> "Pipeline":
+        """Append a stage.
+
+        Args:
+            func (Callable[[Any], Any]): Called with each item of the
+                previous stage; its result is passed to the next stage.
+            workers (int, optional): Number of items processed at the same
+                time. Defaults to 1.
+            processes (bool, optional): Run `func` in a process pool instead
+                of threads, for CPU-bound work. `func`, its arguments and its
+                results must be picklable. Defaults to False.
+            maxsize (Optional[int], optional): Capacity of the stage's output
+                queue. Defaults to None (the pipeline's `maxsize`).
+
+        Raises:
+            ValueError: If workers is less than 1.
+            RuntimeError: If the pipeline was already started.
+
+        Returns:
+            Pipeline: The pipeline itself, so that calls can be chained.
+        """
+        if workers < 1:
+            raise ValueError("A stage needs at least one worker.")
+        if self._started:
+            raise RuntimeError("Cannot add a stage to a started pipeline.")
+
+        if maxsize is None:
+            maxsize = self.maxsize
+        self._stages.append(_Stage(func, workers, processes, maxsize))
+        return self
+
+    def __iter__(self) -> Iterator[Any]:
+        """Run the pipeline.
+
+        Raises:
+            RuntimeError: If the pipeline was already started.
+
+        Yields:
+            Iterator[Any]: The results of the last stage.
+        """
+        if self._started:
+            raise RuntimeError("A pipeline can only run once.")
+        self._started = True
+        self._start()
+
+        output = self._stages[-1].output if self._stages else self._input
+        try:
+            while self._error is None:
+                item = self._get(output)
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            self.close()
+
+        if self._error is not None:
+            raise self._error
+
+    def run(self) -> int:
+        """Run the pipeline, discarding the results of the last stage.
+
+        Returns:
+            int: The number of items that went through the pipeline.
+        """
+        return sum(1 for _ in self)
+
+    def close(self) -> None:
+        """Stop every worker and wait for them to exit."""
+        self._stop.set()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+        for stage in self._stages:
+            if stage.executor is not None:
+                stage.executor.shutdown(cancel_futures=True)
+
+    def _start(self) -> None:
+        inbox = self._input
+        for number, stage in enumerate(self._stages):
+            if stage.processes:
+                stage.executor = ProcessPoolExecutor(stage.workers)
+            for worker in range(stage.workers):
+                self._threads.append(
+                    threading.Thread(
+                        target=self._work,
+                        args=(stage, inbox),
+                        name=f"pragmail-stage-{number}-{worker}",
+                        daemon=True,
+                    )
+                )
+            inbox = stage.output
+
+        self._threads.append(
+            threading.Thread(
+                target=self._feed,
+                name="pragmail-source",
+                daemon=True,
+            )
+        )
+        for thread in self._threads:
+            thread.start()
+
+    def _fail(self, err: BaseException) -> None:
+        with self._lock:
+            if self._error is None:
+                self._error = err
+        self._stop.set()
+
+    def _put(self, queue: Queue, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                queue.put(item, timeout=_POLL_INTERVAL)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _get(self, queue: Queue) -> Any:
+        while not self._stop.is_set():
+            try:
+                return queue.get(timeout=_POLL_INTERVAL)
+            except Empty:
+                continue
+        return _DONE
+
+    def _feed(self) -> None:
+        try:
+            for item in self.source:
+                if not self._put(self._input, item):
+                    return
+        except BaseException as err:  # pylint: disable=broad-except
+            self._fail(err)
+            return
+        self._put(self._input, _DONE)
+
+    def _work(self, stage: _Stage, inbox: Queue) -> None:
+        while True:
+            item = self._get(inbox)
+            if item is _DONE:
+                break
+            try:
+                if stage.executor is not None:
+                    result = stage.executor.submit(stage.func, item).result()
+                else:
+                    result = stage.func(item)
+            except BaseException as err:  # pylint: disable=broad-except
+                self._fail(err)
+                return
+            if not self._put(stage.output, result):
+                return
+
+        # Let the other workers of this stage see the end of the input; the
+        # last one to finish tells the next stage.
+        self._put(inbox, _DONE)
+        with self._lock:
+            stage.remaining -= 1
+            last = stage.remaining == 0
+        if last:
+            self._put(stage.output, _DONE)
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,109 @@
+"""
+This module provides `readahead`, which consumes an iterator in a background
+thread so that the next items are already downloaded while the caller is
+still processing the current one.
+"""
+import threading
+from collections import deque
+from typing import Any, Callable, Generator, Iterable, Optional
+
+
+def readahead(
+    iterable: Iterable[Any],
+    depth: int = 8,
+    max_bytes: Optional[int] = None,
+    sizeof: Optional[Callable[[Any], int]] = None,
+) -> Generator[Any, None, None]:
+    """Iterate over items produced ahead of time by a background thread.
+
+    The background thread stops producing when `depth` items are waiting,
+    or when the waiting items add up to `max_bytes`. A single item larger
+    than the budget is still let through, one at a time.
+
+    The iterable is only ever advanced by the background thread, so it may
+    use a connection, as long as the caller doesn't use that connection
+    before the iteration ends. Closing the returned generator stops the
+    thread and waits for it to exit.
+
+    Args:
+        iterable (Iterable[Any]): The items, e.g. `Client.bulk_fetch(...)`.
+        depth (int, optional): Maximum number of waiting items. Defaults to
+            8.
+        max_bytes (Optional[int], optional): Maximum total size of the
+            waiting items. Defaults to None (no limit).
+        sizeof (Optional[Callable[[Any], int]], optional): Size of an item.
+            Defaults to None (`len`).
+
+    Raises:
+        ValueError: If depth is less than 1.
+
+    Yields:
+        Generator[Any, None, None]: The items, in order. An exception
+            raised by the iterable is raised once the items before it were
+            yielded.
+    """
+    if depth < 1:
+        raise ValueError("depth must be at least 1.")
+    if sizeof is None:
+        sizeof = len
+
+    buffer: deque = deque()
+    condition = threading.Condition()
+    state: dict[str, Any] = {"used": 0, "done": False, "stop": False}
+    error: list[BaseException] = []
+
+    def is_full(size: int) -> bool:
+        if len(buffer) >= depth:
+            return True
+        return (
+            max_bytes is not None
+            and bool(buffer)
+            and state["used"] + size > max_bytes
+        )
+
+    def produce() -> None:
+        try:
+            for item in iterable:
+                size = sizeof(item) if max_bytes is not None else 0
+                with condition:
+                    while not state["stop"] and is_full(size):
+                        condition.wait()
+                    if state["stop"]:
+                        break
+                    buffer.append((item, size))
+                    state["used"] += size
+                    condition.notify_all()
+        except BaseException as err:  # pylint: disable=broad-except
+            error.append(err)
+        finally:
+            with condition:
+                state["done"] = True
+                condition.notify_all()
+
+    thread = threading.Thread(target=produce, name="pragmail-readahead")
+    thread.daemon = True
+    thread.start()
+
+    try:
+        while True:
+            with condition:
+                while not buffer and not state["done"]:
+                    condition.wait()
+                if not buffer:
+                    break
+                item, size = buffer.popleft()
+                state["used"] -= size
+                condition.notify_all()
+            yield item
+    finally:
+        with condition:
+            state["stop"] = True
+            condition.notify_all()
+        thread.join()
+
+    if error:
+        raise error[0]
+
+
+if __name__ == "__main__":
+    pass
@@ -0,0 +1,278 @@
+"""
+This module provides `profile`, a context manager that shows where time and
+memory go inside a pragmail session.
+
+While it's active, IMAP commands and the functions of `pragmail.transports`
+are instrumented, cProfile records every call and tracemalloc tracks
+allocations. When it's disabled it does nothing, so it can be left in
+production code behind a flag:
+
+>>> with pragmail.profile(enabled=DEBUG, output="pragmail.prof.txt"):
+...     run_mail_job()
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from imaplib import IMAP4
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional, TextIO, TypeVar, Union
+
+PROFILE_ENV = "PRAGMAIL_PROFILE"
+
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+_active_lock = threading.Lock()
+# The report of the active profile block. Functions decorated with `measured`
+# look it up on every call, so there is nothing to patch or restore, however
+# they were imported.
+_active_report: Optional["ProfileReport"] = None  # pylint: disable=C0103
+_depth = threading.local()
+
+
+class ProfileReport:
+    """Measurements collected by `profile`."""
+
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.commands: dict[str, list[float]] = {}
+        self.functions: dict[str, list[float]] = {}
+        self.allocations: dict[str, list[int]] = {}
+        self.stats: Optional[pstats.Stats] = None
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return (
+            f"ProfileReport(enabled={self.enabled}, "
+            f"commands={len(self.commands)}, "
+            f"functions={len(self.functions)})"
+        )
+
+    def add_command(self, name: str, elapsed: float) -> None:
+        """Record the wall time of an IMAP command."""
+        with self._lock:
+            self.commands.setdefault(name, []).append(elapsed)
+
+    def add_function(self, name: str, elapsed: float) -> None:
+        """Record the wall time of a transports function."""
+        with self._lock:
+            self.functions.setdefault(name, []).append(elapsed)
+
+    def add_allocation(self, name: str, peak: int) -> None:
+        """Record the peak allocation of a per-message function call."""
+        with self._lock:
+            self.allocations.setdefault(name, []).append(peak)
+
+    def format(self, top: int = 20) -> str:
+        """Render the report as text.
+
+        Args:
+            top (int, optional): Number of functions listed from the cProfile
+                statistics. Defaults to 20.
+
+        Returns:
+            str: The report.
+        """
+        if not self.enabled:
+            return "Profiling was disabled.\n"
+
+        lines = []
+        for title, timings in (
+            ("IMAP commands", self.commands),
+            ("Transport functions", self.functions),
+        ):
+            lines.append(f"{title} (calls, total s, mean ms, max ms):")
+            for name, values in sorted(
+                timings.items(), key=lambda item: sum(item[1]), reverse=True
+            ):
+                lines.append(
+                    f"  {name:<24} {len(values):>6} {sum(values):>10.4f} "
+                    f"{sum(values) / len(values) * 1e3:>9.3f} "
+                    f"{max(values) * 1e3:>9.3f}"
+                )
+            lines.append("")
+
+        lines.append(
+            "Peak allocations per message (calls, mean KiB, max KiB):"
+        )
+        for name, peaks in sorted(self.allocations.items()):
+            lines.append(
+                f"  {name:<24} {len(peaks):>6} "
+                f"{sum(peaks) / len(peaks) / 1024:>10.1f} "
+                f"{max(peaks) / 1024:>9.1f}"
+            )
+        lines.append("")
+
+        if self.stats is not None:
+            stream = io.StringIO()
+            self.stats.stream = stream  # type: ignore
+            self.stats.sort_stats("cumulative").print_stats(top)
+            lines.append(stream.getvalue())
+
+        return "\n".join(lines)
+
+    def write(self, output: Union[Path, str, TextIO], top: int = 20) -> None:
+        """Write the report to a file.
+
+        Args:
+            output (Union[Path, str, TextIO]): Path or text stream.
+            top (int, optional): See `format`. Defaults to 20.
+        """
+        if isinstance(output, (Path, str)):
+            with open(output, "w", encoding="utf-8") as file:
+                file.write(self.format(top))
+        else:
+            output.write(self.format(top))
+
+
+def measured(per_message: bool = False) -> Callable[[_F], _F]:
+    """Time the decorated function while a profile block is active.
+
+    Args:
+        per_message (bool, optional): Whether the function handles one
+            message per call, in which case its peak allocation is tracked
+            as well. Defaults to False.
+
+    Returns:
+        Callable[[_F], _F]: The decorator.
+    """
+
+    def decorator(func: _F) -> _F:
+        name = func.__name__
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            report = _active_report
+            if report is None:
+                return func(*args, **kwargs)
+
+            # Only the outermost per-message call is measured; nested calls
+            # (e.g. read_message inside save_to_disk) would reset its peak.
+            outermost = per_message and not getattr(_depth, "value", 0)
+            _depth.value = getattr(_depth, "value", 0) + 1
+            if outermost:
+                baseline = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                report.add_function(name, time.perf_counter() - start)
+                _depth.value -= 1
+                if outermost:
+                    peak = tracemalloc.get_traced_memory()[1] - baseline
+                    report.add_allocation(name, max(peak, 0))
+
+        return wrapper  # type: ignore
+
+    return decorator
+
+
+def _env_enabled() -> bool:
+    return os.environ.get(PROFILE_ENV, "").lower() in ("1", "true", "yes")
+
+
+@contextmanager
+def profile(
+    enabled: Optional[bool] = None,
+    output: Optional[Union[Path, str, TextIO]] = None,
+    top: int = 20,
+) -> Iterator[ProfileReport]:
+    """Profile the pragmail calls made inside the block.
+
+    Args:
+        enabled (Optional[bool], optional): Whether to profile. If None, the
+            `PRAGMAIL_PROFILE` environment variable decides. Defaults to
+            None.
+        output (Optional[Union[Path, str, TextIO]], optional): Where to write
+            the report when the block exits. Defaults to None.
+        top (int, optional): See `ProfileReport.format`. Defaults to 20.
+
+    Raises:
+        RuntimeError: If another profile block is already active.
+
+    Yields:
+        Iterator[ProfileReport]: The report, filled in when the block exits.
+    """
+    if enabled is None:
+        enabled = _env_enabled()
+
+    if not enabled:
+        yield ProfileReport(enabled=False)
+        return
+
+    if not _active_lock.acquire(blocking=False):
+        raise RuntimeError("Another pragmail profile is already active.")
+
+    report = ProfileReport()
+    profiler = cProfile.Profile()
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+
+    global _active_report  # pylint: disable=global-statement
+    restore = _instrument(report)
+    _active_report = report
+    try:
+        profiler.enable()
+        yield report
+    finally:
+        profiler.disable()
+        _active_report = None
+        restore()
+        if started_tracemalloc:
+            tracemalloc.stop()
+        report.stats = pstats.Stats(profiler)
+        _active_lock.release()
+
+        if output is not None:
+            report.write(output, top)
+
+
+def _instrument(report: ProfileReport) -> Callable[[], None]:
+    """Patch imaplib, returning the undo function."""
+    patches: list[tuple[Any, str, Any]] = []
+
+    def patch(owner: Any, name: str, value: Any) -> None:
+        patches.append((owner, name, owner.__dict__[name]))
+        setattr(owner, name, value)
+
+    # Commands are timed from the moment they're sent until their tagged
+    # response arrives, which also works for pipelined commands.
+    started: dict[bytes, tuple[str, float]] = {}
+    command = IMAP4._command  # pylint: disable=protected-access
+    command_complete = IMAP4._command_complete  # pylint: disable=W0212
+
+    @wraps(command)
+    def timed_command(imap4: IMAP4, name: str, *args: Any) -> Any:
+        label = f"UID {args[0]}" if name == "UID" and args else name
+        start = time.perf_counter()
+        tag = command(imap4, name, *args)
+        started[tag] = (label, start)
+        return tag
+
+    @wraps(command_complete)
+    def timed_command_complete(imap4: IMAP4, name: str, tag: bytes) -> Any:
+        try:
+            return command_complete(imap4, name, tag)
+        finally:
+            label, start = started.pop(tag, (name, time.perf_counter()))
+            report.add_command(label, time.perf_counter() - start)
+
+    patch(IMAP4, "_command", timed_command)
+    patch(IMAP4, "_command_complete", timed_command_complete)
+
+    def restore() -> None:
+        for owner, name, original in reversed(patches):
+            setattr(owner, name, original)
+
+    return restore
+
+
+if __name__ == "__main__":
+    pass
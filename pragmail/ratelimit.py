@@ -0,0 +1,212 @@
+"""
+This module limits the rate at which pragmail talks to each mail server.
+
+Limits are set per host for the whole process, and shared by every connection
+to that host, whichever thread or `Client` it belongs to:
+
+>>> set_rate_limit("imap.gmail.com", commands=10, bandwidth=2 * 1024**2)
+
+Each limit is a token bucket: short bursts up to `burst` go through at full
+speed, after which callers are paced to the configured rate, so throughput
+stays steady near the provider's limit instead of alternating between full
+speed and throttling.
+"""
+import threading
+import time
+from typing import Optional
+
+from pragmail.deadlines import Deadline
+from pragmail.exceptions import DeadlineExceeded
+
+_limits: dict[str, "RateLimit"] = {}
+_limits_lock = threading.Lock()
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    Tokens are reserved in the order callers ask for them. A request larger
+    than the bucket is allowed and puts the bucket in debt, which delays the
+    next callers, so the average rate is kept whatever the request sizes.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        """
+        Args:
+            rate (float): Tokens added per second.
+            burst (Optional[float], optional): Capacity of the bucket, which
+                starts full. Defaults to None (one second worth of tokens,
+                and at least one).
+
+        Raises:
+            ValueError: If rate or burst isn't positive.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive.")
+        if burst is None:
+            burst = max(rate, 1.0)
+        if burst <= 0:
+            raise ValueError("burst must be positive.")
+
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"TokenBucket(rate={self.rate}, burst={self.burst})"
+
+    def reserve(
+        self,
+        amount: float = 1,
+        max_wait: Optional[float] = None,
+    ) -> Optional[float]:
+        """Take tokens, without waiting for them.
+
+        Args:
+            amount (float, optional): Number of tokens. Defaults to 1.
+            max_wait (Optional[float], optional): Don't take the tokens if
+                they wouldn't be available within this many seconds. Defaults
+                to None (no limit).
+
+        Returns:
+            Optional[float]: Seconds to wait before using the tokens, or None
+                if nothing was taken.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+
+            delay = max(0.0, (amount - self._tokens) / self.rate)
+            if max_wait is not None and delay > max_wait:
+                return None
+            self._tokens -= amount
+
+        return delay
+
+    def acquire(
+        self,
+        amount: float = 1,
+        deadline: Optional[Deadline] = None,
+    ) -> float:
+        """Take tokens, waiting until they're available.
+
+        Args:
+            amount (float, optional): Number of tokens. Defaults to 1.
+            deadline (Optional[Deadline], optional): Give up if the tokens
+                wouldn't be available before it. Defaults to None.
+
+        Raises:
+            DeadlineExceeded: The deadline would pass first.
+
+        Returns:
+            float: Seconds spent waiting.
+        """
+        max_wait = None if deadline is None else deadline.remaining()
+        delay = self.reserve(amount, max_wait)
+        if delay is None:
+            raise DeadlineExceeded("Deadline exceeded while rate limited.")
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+class RateLimit:
+    """Command and bandwidth limits of a host."""
+
+    def __init__(
+        self,
+        commands: Optional[float] = None,
+        bandwidth: Optional[float] = None,
+        command_burst: Optional[float] = None,
+        bandwidth_burst: Optional[float] = None,
+    ) -> None:
+        """
+        Args:
+            commands (Optional[float], optional): Commands per second.
+                Defaults to None (unlimited).
+            bandwidth (Optional[float], optional): Bytes per second, sent and
+                received. Defaults to None (unlimited).
+            command_burst (Optional[float], optional): Commands allowed in a
+                burst. Defaults to None (one second worth).
+            bandwidth_burst (Optional[float], optional): Bytes allowed in a
+                burst. It's also the largest read done at once. Defaults to
+                None (one second worth).
+        """
+        self.commands = (
+            TokenBucket(commands, command_burst) if commands else None
+        )
+        self.bandwidth = (
+            TokenBucket(bandwidth, bandwidth_burst) if bandwidth else None
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"RateLimit(commands={self.commands}, "
+            f"bandwidth={self.bandwidth})"
+        )
+
+
+def set_rate_limit(
+    host: str,
+    commands: Optional[float] = None,
+    bandwidth: Optional[float] = None,
+    command_burst: Optional[float] = None,
+    bandwidth_burst: Optional[float] = None,
+) -> Optional[RateLimit]:
+    """Limit the rate of every connection to a host in this process.
+
+    The limit applies to open connections too. Setting neither `commands`
+    nor `bandwidth` removes the host's limit.
+
+    Args:
+        host (str): The server's host name, as given to `Client`.
+        commands (Optional[float], optional): Commands per second. Defaults
+            to None (unlimited).
+        bandwidth (Optional[float], optional): Bytes per second, sent and
+            received. Defaults to None (unlimited).
+        command_burst (Optional[float], optional): Commands allowed in a
+            burst. Defaults to None (one second worth).
+        bandwidth_burst (Optional[float], optional): Bytes allowed in a
+            burst. Defaults to None (one second worth).
+
+    Returns:
+        Optional[RateLimit]: The new limit, or None if it was removed.
+    """
+    key = host.lower()
+    with _limits_lock:
+        if not commands and not bandwidth:
+            _limits.pop(key, None)
+            return None
+
+        limit = RateLimit(commands, bandwidth, command_burst, bandwidth_burst)
+        _limits[key] = limit
+        return limit
+
+
+def get_rate_limit(host: Optional[str]) -> Optional[RateLimit]:
+    """Look up the limit of a host.
+
+    Args:
+        host (Optional[str]): The server's host name.
+
+    Returns:
+        Optional[RateLimit]: The limit, or None if the host has none.
+    """
+    if not host or not _limits:
+        return None
+    return _limits.get(host.lower())
+
+
+def clear_rate_limits() -> None:
+    """Remove the limits of every host."""
+    with _limits_lock:
+        _limits.clear()
+
+
+if __name__ == "__main__":
+    pass
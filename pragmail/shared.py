@@ -0,0 +1,169 @@
+"""
+This module makes a single `pragmail.Client` session usable from many threads.
+
+`imaplib.IMAP4` objects are not thread-safe, so `SharedClient` owns a
+dedicated I/O thread that runs every command, in order, on behalf of the
+calling threads. Callers get `concurrent.futures.Future` objects back and can
+keep doing CPU work (e.g. parsing) while the command is in flight.
+"""
+import threading
+from concurrent.futures import Future
+from functools import partial
+from inspect import isgenerator
+from queue import Queue
+from typing import Any, Callable, Optional, Union
+
+from pragmail.exceptions import IMAP4Error
+
+_Command = tuple[Future, Union[str, Callable[..., Any]], tuple, dict]
+
+
+class SharedClient:
+    """Thread-safe wrapper around a logged-in client.
+
+    Usage:
+    >>> client = pragmail.Client("imap.domain.com")
+    >>> client.login("username", "password")
+    >>> shared = SharedClient(client)
+    >>> future = shared.select("INBOX")
+    >>> future.result()
+    ('OK', [b'1357'])
+    >>> shared.close()
+
+    Any `Client` method can be called on the wrapper; it returns a future
+    instead of the method's result. Methods that return generators (e.g.
+    `bulk_fetch`) are consumed in the I/O thread and resolve to a list.
+    """
+
+    def __init__(self, client: Any, maxsize: int = 0) -> None:
+        """
+        Args:
+            client (Any): The client to share, usually a `pragmail.Client`.
+            maxsize (int, optional): Maximum number of queued commands.
+                Callers block once it's reached. Defaults to 0 (unbounded).
+        """
+        self.client = client
+        self._queue: "Queue[Optional[_Command]]" = Queue(maxsize)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run,
+            name="pragmail-io",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def __repr__(self) -> str:
+        return f"SharedClient(client={self.client!r})"
+
+    def __getattr__(self, name: str) -> Callable[..., Future]:
+        if name.startswith("_") or not callable(getattr(self.client, name)):
+            raise AttributeError(
+                f"{type(self).__name__!r} object has no attribute {name!r}"
+            )
+        return partial(self.submit, name)
+
+    def submit(
+        self,
+        method: Union[str, Callable[..., Any]],
+        *args: Any,
+        **kwargs: Any,
+    ) -> Future:
+        """Queue a command for the I/O thread.
+
+        Args:
+            method (Union[str, Callable[..., Any]]): Name of a client method,
+                or a callable that takes the client as its first argument
+                (e.g. `lambda client: client.imap4.noop()`).
+            *args (Any): Positional arguments of the command.
+            **kwargs (Any): Keyword arguments of the command.
+
+        Raises:
+            IMAP4Error: If the shared client was closed.
+
+        Returns:
+            Future: Resolves to the command's result or exception.
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise IMAP4Error("SharedClient is closed.")
+            self._queue.put((future, method, args, kwargs))
+        return future
+
+    def call(
+        self,
+        method: Union[str, Callable[..., Any]],
+        *args: Any,
+        **kwargs: Any,
+    ) -> Any:
+        """Run a command in the I/O thread and wait for its result.
+
+        Args:
+            method (Union[str, Callable[..., Any]]): See `submit`.
+            *args (Any): Positional arguments of the command.
+            **kwargs (Any): Keyword arguments of the command.
+
+        Returns:
+            Any: The command's result.
+        """
+        return self.submit(method, *args, **kwargs).result()
+
+    def close(self, logout: bool = True) -> None:
+        """Run the remaining commands and stop the I/O thread.
+
+        Args:
+            logout (bool, optional): Log out of the shared session once the
+                queue is drained. Defaults to True.
+
+        Raises:
+            Exception: The error raised by the logout, if it failed.
+        """
+        logout_future: Optional[Future] = None
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if logout:
+                logout_future = Future()
+                self._queue.put((logout_future, "logout", (), {}))
+            self._queue.put(None)
+
+        self._thread.join()
+
+        if logout_future is not None:
+            error = logout_future.exception()
+            if error is not None:
+                raise error
+
+    def _run(self) -> None:
+        while True:
+            command = self._queue.get()
+            if command is None:
+                break
+
+            future, method, args, kwargs = command
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                if isinstance(method, str):
+                    result = getattr(self.client, method)(*args, **kwargs)
+                else:
+                    result = method(self.client, *args, **kwargs)
+                if isgenerator(result):
+                    result = list(result)
+            except Exception as err:  # pylint: disable=broad-except
+                future.set_exception(err)
+            else:
+                future.set_result(result)
+
+    def __enter__(self) -> "SharedClient":
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, trace: Any) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    pass
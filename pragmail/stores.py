@@ -0,0 +1,312 @@
+"""
+This module provides `SQLiteStore`, a message archive kept in a single SQLite
+database instead of one text file and directory per message.
+
+Raw messages, their main header fields and their attachments are written in
+batched transactions to a WAL-mode database, optionally zlib-compressed, and
+can be looked up by UID or Message-ID:
+
+>>> with SQLiteStore("archive.sqlite") as store:
+...     for uid, message in client.bulk_fetch(uids):
+...         store.add(uid, message)
+>>> store.get_by_message_id("<3@example.com>")
+[StoredMessage(mailbox='INBOX', uid=3, ...)]
+"""
+import sqlite3
+import zlib
+from collections import namedtuple
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from pragmail.transports import TransportUtils
+
+StoredMessage = namedtuple(
+    "StoredMessage",
+    [
+        "mailbox",
+        "uid",
+        "message_id",
+        "sender",
+        "recipients",
+        "subject",
+        "date",
+        "size",
+        "raw",
+    ],
+)
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        mailbox TEXT NOT NULL,
+        uid INTEGER NOT NULL,
+        message_id TEXT,
+        sender TEXT,
+        recipients TEXT,
+        subject TEXT,
+        date TEXT,
+        size INTEGER NOT NULL,
+        compressed INTEGER NOT NULL,
+        raw BLOB NOT NULL,
+        PRIMARY KEY (mailbox, uid)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS messages_message_id
+        ON messages (message_id)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS attachments (
+        mailbox TEXT NOT NULL,
+        uid INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        filename TEXT,
+        ctype TEXT,
+        size INTEGER NOT NULL,
+        compressed INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        PRIMARY KEY (mailbox, uid, position)
+    )
+    """,
+)
+_INSERT_MESSAGE = (
+    "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_INSERT_ATTACHMENT = (
+    "INSERT OR REPLACE INTO attachments VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+_SELECT_MESSAGE = (
+    "SELECT mailbox, uid, message_id, sender, recipients, subject, date, "
+    "size, compressed, raw FROM messages"
+)
+
+# Blobs smaller than this are stored as is; compressing them saves little.
+_MIN_COMPRESSED_SIZE = 256
+
+
+class SQLiteStore:
+    """Archive of raw messages, metadata and attachments in SQLite.
+
+    Messages are buffered and written `batch_size` at a time in a single
+    transaction. Lookups flush the buffer first, so they always see every
+    added message.
+    """
+
+    def __init__(
+        self,
+        path: Union[Path, str],
+        batch_size: int = 100,
+        compress: bool = True,
+        attachments: bool = True,
+    ) -> None:
+        """
+        Args:
+            path (Union[Path, str]): The database file. It's created if
+                missing.
+            batch_size (int, optional): Number of messages written per
+                transaction. Defaults to 100.
+            compress (bool, optional): zlib-compress raw messages and
+                attachments. Defaults to True.
+            attachments (bool, optional): Also store the decoded attachments
+                of each message. Defaults to True.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.compress = compress
+        self.attachments = attachments
+        self._messages: list[tuple[Any, ...]] = []
+        self._attachments: list[tuple[Any, ...]] = []
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            for statement in _SCHEMA:
+                self.connection.execute(statement)
+
+    def __repr__(self) -> str:
+        return f"SQLiteStore(path={self.path!r})"
+
+    def __len__(self) -> int:
+        self.flush()
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM messages"
+        ).fetchone()[0]
+
+    def _pack(self, data: bytes) -> tuple[int, bytes]:
+        if self.compress and len(data) >= _MIN_COMPRESSED_SIZE:
+            packed = zlib.compress(data)
+            if len(packed) < len(data):
+                return 1, packed
+        return 0, data
+
+    @staticmethod
+    def _unpack(compressed: int, data: bytes) -> bytes:
+        return zlib.decompress(data) if compressed else bytes(data)
+
+    def add(
+        self,
+        uid: int,
+        message: Union[bytes, str, list[Union[bytes, tuple[bytes, bytes]]]],
+        mailbox: str = "INBOX",
+    ) -> None:
+        """Add a message, replacing any message stored with the same UID.
+
+        Args:
+            uid (int): The message's UID.
+            message (Union[bytes, str, list[...]]): The raw message, or the
+                response data of a FETCH command.
+            mailbox (str, optional): The mailbox the UID belongs to.
+                Defaults to "INBOX".
+        """
+        if isinstance(message, str):
+            raw = message.encode("utf-8", "surrogateescape")
+        elif isinstance(message, (bytes, bytearray)):
+            raw = bytes(message)
+        else:
+            raw = TransportUtils.data_as_bytes(message)
+
+        msg = TransportUtils.read_message(raw)
+        fields: list[Optional[str]] = [None] * 5
+        if isinstance(msg, EmailMessage):
+            for idx, name in enumerate(
+                ("Message-ID", "From", "To", "Subject", "Date")
+            ):
+                value = msg.get(name)
+                fields[idx] = str(value).strip() if value is not None else None
+
+        # A message added again before the batch is written replaces the
+        # buffered one.
+        key = (mailbox, uid)
+        if any(row[:2] == key for row in self._messages):
+            self._messages = [r for r in self._messages if r[:2] != key]
+            self._attachments = [
+                r for r in self._attachments if r[:2] != key
+            ]
+
+        compressed, blob = self._pack(raw)
+        self._messages.append(
+            (mailbox, uid, *fields, len(raw), compressed, blob)
+        )
+
+        if self.attachments and isinstance(msg, EmailMessage):
+            attm = TransportUtils.xtract_attachments(msg, decode=True)
+            for position, item in enumerate(attm.values()):
+                data = item["buffer"] or b""
+                compressed, blob = self._pack(data)
+                self._attachments.append(
+                    (
+                        mailbox,
+                        uid,
+                        position,
+                        item["filename"],
+                        item["ctype"],
+                        len(data),
+                        compressed,
+                        blob,
+                    )
+                )
+
+        if len(self._messages) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered messages in a single transaction."""
+        if not self._messages:
+            return
+
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM attachments WHERE mailbox = ? AND uid = ?",
+                [row[:2] for row in self._messages],
+            )
+            self.connection.executemany(_INSERT_MESSAGE, self._messages)
+            self.connection.executemany(
+                _INSERT_ATTACHMENT, self._attachments
+            )
+        self._messages = []
+        self._attachments = []
+
+    def _stored(self, row: tuple[Any, ...]) -> StoredMessage:
+        return StoredMessage(*row[:8], self._unpack(row[8], row[9]))
+
+    def get(self, uid: int, mailbox: str = "INBOX") -> Optional[StoredMessage]:
+        """Look up a message by UID.
+
+        Args:
+            uid (int): The message's UID.
+            mailbox (str, optional): The mailbox the UID belongs to.
+                Defaults to "INBOX".
+
+        Returns:
+            Optional[StoredMessage]: The message, or None if it isn't
+                stored.
+        """
+        self.flush()
+        row = self.connection.execute(
+            f"{_SELECT_MESSAGE} WHERE mailbox = ? AND uid = ?",
+            (mailbox, uid),
+        ).fetchone()
+        return self._stored(row) if row else None
+
+    def get_by_message_id(self, message_id: str) -> list[StoredMessage]:
+        """Look up messages by Message-ID.
+
+        Args:
+            message_id (str): The Message-ID, including the angle brackets.
+
+        Returns:
+            list[StoredMessage]: Every stored copy of the message, e.g. one
+                per mailbox.
+        """
+        self.flush()
+        rows = self.connection.execute(
+            f"{_SELECT_MESSAGE} WHERE message_id = ? ORDER BY mailbox, uid",
+            (message_id.strip(),),
+        ).fetchall()
+        return [self._stored(row) for row in rows]
+
+    def get_attachments(
+        self,
+        uid: int,
+        mailbox: str = "INBOX",
+    ) -> list[tuple[Optional[str], str, bytes]]:
+        """Look up the attachments of a message.
+
+        Args:
+            uid (int): The message's UID.
+            mailbox (str, optional): The mailbox the UID belongs to.
+                Defaults to "INBOX".
+
+        Returns:
+            list[tuple[Optional[str], str, bytes]]: The file name,
+                content-type and decoded data of each attachment.
+        """
+        self.flush()
+        rows = self.connection.execute(
+            "SELECT filename, ctype, compressed, data FROM attachments "
+            "WHERE mailbox = ? AND uid = ? ORDER BY position",
+            (mailbox, uid),
+        ).fetchall()
+        return [
+            (filename, ctype, self._unpack(compressed, data))
+            for filename, ctype, compressed, data in rows
+        ]
+
+    def close(self) -> None:
+        """Write the buffered messages and close the database."""
+        try:
+            self.flush()
+        finally:
+            self.connection.close()
+
+    def __enter__(self) -> "SQLiteStore":
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, trace: Any) -> None:
+        self.close()
+
+
+if __name__ == "__main__":
+    pass
@@ -2,25 +2,333 @@
 This module provides utilities for representing and restructuring RFC 2822 and
 MIME email messages for storage and transport.
 """
+import io
 import os
+import re
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from collections import OrderedDict, namedtuple
+from contextlib import nullcontext
 from email.message import EmailMessage, Message, MIMEPart
-from email.parser import BytesParser, Parser
-from email.policy import EmailPolicy
+from email.parser import BytesHeaderParser, BytesParser, Parser
+from email.policy import Policy, compat32
 from email.policy import default as _default
+from fnmatch import fnmatch
+from hashlib import blake2b
+from html import unescape
 from pathlib import Path
-from typing import Any, Optional, Sequence, Union
+from typing import (TYPE_CHECKING, Any, BinaryIO, Iterable, Iterator, Optional,
+                    Sequence, Union)
 
-from pragmail.clients import ResponseData
-from pragmail.utils import sanitize
+from pragmail.profiling import measured
+from pragmail.utils import decode_header_value, sanitize
+
+if TYPE_CHECKING:  # pragma: no cover
+    # `pragmail.clients` pulls in `imaplib` and `ssl`, which transports do not
+    # need at runtime.
+    from pragmail.clients import ResponseData
 
 FILE_EXTENTION = ".txt"
+# Keeps header values as plain strings instead of parsing them into header
+# objects, which is much cheaper when only a few headers are looked at. See
+# `TransportUtils.read_headers`.
+TRIAGE_POLICY = compat32
+ARCHIVE_FORMATS = ("zip", "tar", "gz", "bz2", "xz")
+LINK_CONTENT_TYPES = ("text/html", "text/plain")
+
+# Links are matched against the decoded payload bytes so that the text of the
+# part never has to be copied into a string. This only works for charsets that
+# encode ASCII as ASCII; other charsets are decoded first.
+_ASCII_CHARSETS = frozenset(
+    ("us-ascii", "ascii", "utf-8", "utf8")
+    + tuple(f"iso-8859-{num}" for num in range(1, 17))
+    + tuple(f"windows-{num}" for num in range(1250, 1259))
+)
+_HREF_PATTERN = (
+    rb"""\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))"""
+)
+_URL_PATTERN = rb"""\bhttps?://[^\s<>"']+"""
+_LINK_MATCHERS = {
+    ("text/html", bytes): re.compile(_HREF_PATTERN, re.IGNORECASE),
+    ("text/html", str): re.compile(_HREF_PATTERN.decode(), re.IGNORECASE),
+    ("text/plain", bytes): re.compile(_URL_PATTERN, re.IGNORECASE),
+    ("text/plain", str): re.compile(_URL_PATTERN.decode(), re.IGNORECASE),
+}
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "entries", "size"])
+
+
+class ParseCache:
+    """LRU cache of parsed messages for `TransportUtils.read_message`.
+
+    Entries are keyed by a digest of the raw message and the parser options,
+    so parsing the same message twice returns the same object. The cache is
+    bounded by the total size of the raw messages it holds; the least
+    recently used entries are evicted first.
+
+    Cached messages are shared between callers and must not be modified.
+    """
+
+    def __init__(self, maxsize: int = 64 * 1024 * 1024) -> None:
+        """
+        Args:
+            maxsize (int, optional): Maximum total size of the cached raw
+                messages, in bytes. Defaults to 64 MiB.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._size = 0
+        self._entries: OrderedDict[tuple, tuple[Any, int]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"ParseCache(maxsize={self.maxsize})"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(message: Union[bytes, str], *options: Any) -> tuple:
+        """Build the cache key of a raw message.
+
+        Args:
+            message (Union[bytes, str]): The raw message.
+            *options (Any): Parser options that affect the result.
+
+        Returns:
+            tuple: The cache key.
+        """
+        if isinstance(message, str):
+            data = message.encode("utf-8", "surrogateescape")
+        else:
+            data = message
+        digest = blake2b(data, digest_size=16).digest()
+        return (type(message), digest, *options)
+
+    def get(self, key: tuple) -> Any:
+        """Return the cached message for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: tuple, message: Any, size: int) -> None:
+        """Cache a parsed message.
+
+        Args:
+            key (tuple): The key returned by `make_key`.
+            message (Any): The parsed message.
+            size (int): Size of the raw message, in bytes.
+        """
+        if size > self.maxsize:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (message, size)
+            self._size += size
+
+            while self._size > self.maxsize:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+
+    def info(self) -> CacheInfo:
+        """Report cache statistics.
+
+        Returns:
+            CacheInfo: Hits, misses, number of entries and total size.
+        """
+        with self._lock:
+            return CacheInfo(
+                self.hits, self.misses, len(self._entries), self._size
+            )
+
+    def clear(self) -> None:
+        """Remove every entry and reset the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._size = self.hits = self.misses = 0
+
+
+class FileWriter:
+    """Write files atomically, syncing them to disk in batches.
+
+    Each file is written to a temporary file in its target directory and
+    renamed into place when the batch is flushed, so a crash never leaves a
+    partially written file behind, only stray `.tmp` files. With `fsync`,
+    the files of a batch are synced together, followed by a single sync of
+    each directory they were renamed into. Created directories are
+    remembered, so saving many messages into the same tree doesn't repeat
+    `mkdir` calls.
+
+    Usage:
+    >>> with FileWriter() as writer:
+    ...     for uid, message in client.bulk_fetch(uids):
+    ...         save_to_disk(message, f"{uid}.txt", writer=writer)
+    """
+
+    def __init__(self, batch_size: int = 64, fsync: bool = True) -> None:
+        """
+        Args:
+            batch_size (int, optional): Number of files written before the
+                batch is flushed. Defaults to 64.
+            fsync (bool, optional): Sync files and directories to disk when
+                a batch is flushed. Defaults to True.
+        """
+        self.batch_size = batch_size
+        self.fsync = fsync
+        # `mkstemp` creates files readable by their owner only; give them
+        # the mode `open` would.
+        umask = os.umask(0)
+        os.umask(umask)
+        self._mode = 0o666 & ~umask
+        self._directories: set[str] = set()
+        self._pending: list[tuple[int, str, str]] = []
+
+    def __repr__(self) -> str:
+        return (
+            f"FileWriter(batch_size={self.batch_size}, fsync={self.fsync}, "
+            f"pending={len(self._pending)})"
+        )
+
+    def makedirs(self, dirname: Union[Path, str]) -> None:
+        """Create a directory and its parents, unless this writer already
+        did.
+
+        Args:
+            dirname (Union[Path, str]): The directory.
+        """
+        dirname = os.path.abspath(dirname)
+        if dirname not in self._directories:
+            os.makedirs(dirname, exist_ok=True)
+            self._directories.add(dirname)
+
+    def write(
+        self,
+        filename: Union[Path, str],
+        data: Union[bytes, str],
+    ) -> None:
+        """Write a file. It appears under its name when the batch is
+        flushed.
+
+        Args:
+            filename (Union[Path, str]): The file name. Missing parent
+                directories are created.
+            data (Union[bytes, str]): The file content; text is encoded as
+                UTF-8.
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        filename = os.path.abspath(filename)
+        dirname, basename = os.path.split(filename)
+        self.makedirs(dirname)
+        try:
+            fd, tmp = tempfile.mkstemp(
+                prefix=f".{basename}.", suffix=".tmp", dir=dirname
+            )
+        except FileNotFoundError:
+            # The directory was removed since it was cached.
+            self._directories.discard(dirname)
+            self.makedirs(dirname)
+            fd, tmp = tempfile.mkstemp(
+                prefix=f".{basename}.", suffix=".tmp", dir=dirname
+            )
+
+        try:
+            if hasattr(os, "fchmod"):
+                os.fchmod(fd, self._mode)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        except BaseException:
+            # The other pending files were written successfully; keep them.
+            self._remove([(fd, tmp, filename)])
+            raise
+
+        self._pending.append((fd, tmp, filename))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Sync and rename the files written since the last flush."""
+        pending, self._pending = self._pending, []
+        closed = renamed = 0
+        try:
+            for fd, _, _ in pending:
+                if self.fsync:
+                    os.fsync(fd)
+                # The descriptor is released even if `close` fails.
+                closed += 1
+                os.close(fd)
+            for _, tmp, filename in pending:
+                os.replace(tmp, filename)
+                renamed += 1
+        except BaseException:
+            # Closed descriptors may already belong to other files, and
+            # renamed files are in place.
+            self._remove(pending[closed:])
+            self._remove(pending[renamed:closed], closed=True)
+            raise
+
+        if self.fsync:
+            for dirname in {os.path.dirname(item[2]) for item in pending}:
+                self._sync_directory(dirname)
+
+    def discard(self) -> None:
+        """Delete the files written since the last flush."""
+        pending, self._pending = self._pending, []
+        self._remove(pending)
+
+    @staticmethod
+    def _remove(
+        entries: list[tuple[int, str, str]], closed: bool = False
+    ) -> None:
+        for fd, tmp, _ in entries:
+            if not closed:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    @staticmethod
+    def _sync_directory(dirname: str) -> None:
+        # Directories can't be opened on Windows, where renames are durable
+        # without it.
+        if os.name != "posix":  # pragma: no cover
+            return
+        fd = os.open(dirname, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def __enter__(self) -> "FileWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, trace: Any) -> None:
+        if exc_type is None:
+            self.flush()
+        else:
+            self.discard()
 
 
 class TransportUtils:
     """Class containing methods for handling message objects."""
 
     @staticmethod
-    def data_as_bytes(message: ResponseData) -> bytes:
+    def data_as_bytes(message: "ResponseData") -> bytes:
         """Bring out bytes-like object from response data.
 
         Args:
@@ -47,11 +355,13 @@ class TransportUtils:
         raise TypeError("message must be of type ResponseData.")
 
     @staticmethod
+    @measured(per_message=True)
     def read_message(
-        message: Union[bytes, str, ResponseData],
+        message: Union[bytes, str, "ResponseData"],
         headersonly: bool = False,
         _class: type[Union[EmailMessage, MIMEPart]] = EmailMessage,
-        policy: EmailPolicy = _default,
+        policy: Policy = _default,
+        cache: Optional[ParseCache] = None,
     ) -> Union[EmailMessage, Message, MIMEPart, None]:
         """Parse message object. This is identical to
         `pragmail.utils.read_message()` except that it supports sequence of
@@ -65,8 +375,12 @@ class TransportUtils:
                 Defaults to False.
             _class (type[Union[EmailMessage, MIMEPart]], optional):
                 No-argument callable. Defaults to EmailMessage.
-            policy (EmailPolicy, optional): Policy class with the approrate
-                policy methods. Defaults to `email.policy.default`.
+            policy (Policy, optional): Policy class with the approrate
+                policy methods, e.g. `TRIAGE_POLICY` to skip header object
+                creation. Defaults to `email.policy.default`.
+            cache (Optional[ParseCache], optional): Return the previously
+                parsed object when the same message is read again. Defaults
+                to None.
 
         Raises:
             TypeError: If message instance is not either a string or a
@@ -82,6 +396,13 @@ class TransportUtils:
         if isinstance(message, list):
             message = tutil.data_as_bytes(message)
 
+        key = None
+        if cache is not None and isinstance(message, (bytes, str)):
+            key = cache.make_key(message, headersonly, _class, policy)
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
         if isinstance(message, bytes):
             parser = BytesParser(_class=_class, policy=policy)
             msg = parser.parsebytes(text=message, headersonly=headersonly)
@@ -90,20 +411,79 @@ class TransportUtils:
             msg = parser.parsestr(text=message, headersonly=headersonly)
 
         if isinstance(msg, (EmailMessage, Message, MIMEPart)):
+            if cache is not None and key is not None:
+                cache.put(key, msg, len(message))
             return msg
         return None  # pragma: no cover
 
     @staticmethod
+    @measured()
+    def read_headers(
+        message: Union[bytes, "ResponseData"],
+        fields: Optional[Iterable[str]] = None,
+    ) -> dict[str, str]:
+        """Parse and decode the headers of a message, for triage.
+
+        The body is not parsed, headers are read with `TRIAGE_POLICY` and
+        values are decoded by the memoized `utils.decode_header_value`, so
+        the same encoded words are only decoded once per process.
+
+        Args:
+            message (Union[bytes, ResponseData]): The message, or its header
+                block.
+            fields (Optional[Iterable[str]], optional): Header fields to
+                keep. Defaults to None (all of them).
+
+        Returns:
+            dict[str, str]: The decoded value of the first occurrence of
+                each field, keyed by lowercase field name.
+        """
+        if isinstance(message, list):
+            message = TransportUtils.data_as_bytes(message)
+
+        wanted = None
+        if fields is not None:
+            wanted = {field.lower() for field in fields}
+
+        parser = BytesHeaderParser(policy=TRIAGE_POLICY)
+        headers: dict[str, str] = {}
+        for name, value in parser.parsebytes(message).raw_items():
+            name = name.lower()
+            if name in headers or (wanted is not None and name not in wanted):
+                continue
+            # 8-bit bytes are kept as surrogates by the parser; most senders
+            # that don't encode their headers use UTF-8.
+            value = value.encode("utf-8", "surrogateescape")
+            headers[name] = decode_header_value(
+                value.decode("utf-8", "replace").strip()
+            )
+        return headers
+
+    @staticmethod
+    @measured()
     def xtract_attachments(
         message: Union[EmailMessage, MIMEPart],
         decode: bool = False,
+        ctypes: Optional[Sequence[str]] = None,
+        filename_pattern: Optional[str] = None,
+        max_size: Optional[int] = None,
     ) -> dict[str, dict[str, Any]]:
         """Extract message attachment.
 
+        The filters only look at the attachment's headers and encoded size,
+        so attachments that are filtered out are never decoded.
+
         Args:
             message (Union[EmailMessage, MIMEPart]): The message instance.
             decode (bool, optional): Whether the message should be decoded or
                 not. Defaults to False.
+            ctypes (Optional[Sequence[str]], optional): Content-types to keep.
+                Shell-style wildcards such as "image/*" are supported.
+                Defaults to None (all content-types).
+            filename_pattern (Optional[str], optional): Shell-style pattern
+                the file name must match, e.g. "*.pdf". Defaults to None.
+            max_size (Optional[int], optional): Largest decoded size to keep,
+                in bytes. Defaults to None (no limit).
 
         Returns:
             dict[str, dict]: A dictionary containing the content-type, file
@@ -112,6 +492,11 @@ class TransportUtils:
         msg_attm: dict[str, dict[str, Any]] = {}
 
         for idx, attachment in enumerate(message.iter_attachments()):
+            if not TransportUtils.accepts_attachment(
+                attachment, ctypes, filename_pattern, max_size
+            ):
+                continue
+
             attm_title = f"attachment_{idx}"
             ctype = attachment.get_content_type()
             filename = sanitize(attachment.get_filename())
@@ -125,6 +510,75 @@ class TransportUtils:
 
         return msg_attm
 
+    @staticmethod
+    def accepts_attachment(
+        attachment: Message,
+        ctypes: Optional[Sequence[str]] = None,
+        filename_pattern: Optional[str] = None,
+        max_size: Optional[int] = None,
+    ) -> bool:
+        """Check an attachment against filters without decoding it.
+
+        Args:
+            attachment (Message): The attachment part.
+            ctypes (Optional[Sequence[str]], optional): See
+                `xtract_attachments`. Defaults to None.
+            filename_pattern (Optional[str], optional): See
+                `xtract_attachments`. Defaults to None.
+            max_size (Optional[int], optional): See `xtract_attachments`.
+                Defaults to None.
+
+        Returns:
+            bool: True if the attachment passes every filter.
+        """
+        if ctypes is not None:
+            ctype = attachment.get_content_type()
+            if not any(fnmatch(ctype, pattern.lower()) for pattern in ctypes):
+                return False
+
+        if filename_pattern is not None:
+            filename = attachment.get_filename()
+            if not filename or not fnmatch(
+                filename.lower(), filename_pattern.lower()
+            ):
+                return False
+
+        if max_size is not None:
+            # The sender-supplied size can only rule an attachment out; the
+            # payload is measured either way.
+            size = attachment.get_param("size", header="content-disposition")
+            if isinstance(size, str) and size.isdigit():
+                if int(size) > max_size:
+                    return False
+            return TransportUtils.attachment_size(attachment) <= max_size
+
+        return True
+
+    @staticmethod
+    def attachment_size(attachment: Message) -> int:
+        """Estimate the decoded size of an attachment from its encoded
+        payload.
+
+        The `size` parameter of Content-Disposition is ignored, since it's
+        set by the sender and may be wrong.
+
+        Args:
+            attachment (Message): The attachment part.
+
+        Returns:
+            int: The approximate size in bytes.
+        """
+        payload = attachment.get_payload()
+        if not isinstance(payload, str):
+            return 0
+
+        cte = attachment.get("content-transfer-encoding", "").lower()
+        if cte == "base64":
+            # Every 4 characters encode 3 bytes; line breaks carry no data.
+            breaks = payload.count("\n") + payload.count("\r")
+            return (len(payload) - breaks) * 3 // 4
+        return len(payload)
+
     @staticmethod
     def xtract_headers(message: Message) -> list[tuple[str, Any]]:
         """Retrieve the message's header fields and values.
@@ -140,6 +594,7 @@ class TransportUtils:
         return message.items()
 
     @staticmethod
+    @measured()
     def xtract_payload(
         message: Union[EmailMessage, MIMEPart],
         preferencelist: Sequence[str] = ("related", "html", "plain"),
@@ -157,10 +612,63 @@ class TransportUtils:
         """
         return message.get_body(preferencelist=preferencelist)
 
+    @staticmethod
+    @measured()
+    def xtract_links(
+        message: Message,
+        ctypes: Sequence[str] = LINK_CONTENT_TYPES,
+    ) -> Iterator[str]:
+        """Extract links from the message's text parts.
+
+        Parts are visited one at a time and their payloads are decoded from
+        quoted-printable or base64 before matching. HTML parts yield the
+        targets of `href` attributes, plain text parts yield http(s) URLs.
+
+        Args:
+            message (Message): The message instance.
+            ctypes (Sequence[str], optional): The content-types to search,
+                among "text/html" and "text/plain". Defaults to both.
+
+        Yields:
+            Iterator[str]: The links, in the order they appear.
+        """
+        for part in message.walk():
+            ctype = part.get_content_type()
+            if ctype not in ctypes or ctype not in LINK_CONTENT_TYPES:
+                continue
+            if part.get_content_disposition() == "attachment":
+                continue
+
+            payload = part.get_payload(decode=True)
+            if not payload:
+                continue
+
+            charset = (part.get_content_charset() or "utf-8").lower()
+            if charset in _ASCII_CHARSETS:
+                matcher = _LINK_MATCHERS[(ctype, bytes)]
+                matches = matcher.finditer(payload)
+            else:
+                try:
+                    text = payload.decode(charset, "replace")
+                except LookupError:
+                    text = payload.decode("utf-8", "replace")
+                matches = _LINK_MATCHERS[(ctype, str)].finditer(text)
+
+            for match in matches:
+                link = match.group(match.lastindex or 0)
+                if isinstance(link, bytes):
+                    link = link.decode(charset, "replace")
+
+                if ctype == "text/html":
+                    yield unescape(link.strip())
+                else:
+                    yield link.rstrip(".,;:!?)]}")
+
     @staticmethod
     def create_file(
         filename: Union[Path, str],
         content: Optional[Union[str, bytes]] = None,
+        writer: Optional[FileWriter] = None,
     ) -> None:
         """Create a file with the specified name and write its content.
 
@@ -168,6 +676,8 @@ class TransportUtils:
             filename (Union[Path, str]): The file name.
             content (Optional[Union[str, bytes]], optional): The file content.
                 Defaults to None.
+            writer (Optional[FileWriter], optional): Writer used to write the
+                file atomically. Defaults to None (write it directly).
         """
         if isinstance(filename, Path):
             fpath = filename
@@ -177,12 +687,9 @@ class TransportUtils:
         if not fpath.suffixes:
             fpath = fpath.with_suffix(FILE_EXTENTION)
 
-        fpath.touch()
-        if content is not None:
-            if isinstance(content, str):
-                fpath.write_text(content, encoding="utf-8")
-            else:
-                fpath.write_bytes(content)
+        TransportUtils.write_to_file(
+            fpath, b"" if content is None else content, writer=writer
+        )
 
     @staticmethod
     def create_directory(
@@ -207,22 +714,42 @@ class TransportUtils:
         directory.mkdir(parents=parents, exist_ok=exist_ok)
 
     @staticmethod
-    def write_to_file(filname: str, data: Any, mode: str = "w"):
+    def write_to_file(
+        filname: Union[Path, str],
+        data: Union[bytes, str],
+        mode: Optional[str] = None,
+        writer: Optional[FileWriter] = None,
+    ) -> None:
         """Write binary or text.
 
         Args:
-            filname (str): The file name. May be path segements.
-            data (Any): The file data to write.
-            mode (str, optional): The mode in which the file is opened.
-                Defaults to "w".
+            filname (Union[Path, str]): The file name. May be path segements.
+            data (Union[bytes, str]): The file data to write.
+            mode (Optional[str], optional): The mode in which the file is
+                opened. Defaults to None ("w" for text, "wb" for bytes).
+            writer (Optional[FileWriter], optional): Writer used to write the
+                file atomically; `mode` is ignored. Defaults to None.
         """
-        with open(filname, mode=mode, encoding="utf-8") as file:
-            file.write(data)
+        if writer is not None:
+            writer.write(filname, data)
+            return
+
+        if mode is None:
+            mode = "w" if isinstance(data, str) else "wb"
+
+        if "b" in mode:
+            with open(filname, mode=mode) as file:
+                file.write(data)
+        else:
+            with open(filname, mode=mode, encoding="utf-8") as file:
+                file.write(data)
 
     @staticmethod
+    @measured()
     def save_attachments(
         attachments: dict[str, dict[str, Any]],
         dirpath: Union[Path, str] = ".",
+        writer: Optional[FileWriter] = None,
     ) -> None:
         """Extract and save files attached to the email message. The files
         will be stored inside a subdirectory on the same path as the message
@@ -234,6 +761,8 @@ class TransportUtils:
                 `transports.MessageStructure.xtract_attachments()`.
             dirpath (Union[Path, str]): Path where the file will be saved.
                 Defaults to ".".
+            writer (Optional[FileWriter], optional): Writer used to write the
+                files atomically. Defaults to None.
         """
         for item in attachments.items():
             ctype = item[1].get("ctype")
@@ -242,18 +771,19 @@ class TransportUtils:
 
             if ctype and filename and buffer:
                 fpath = os.path.join(dirpath, filename)
-                tpt = TransportUtils
-
-                try:
-                    tpt.write_to_file(fpath, buffer)
-                except TypeError:  # pragma: no cover
-                    tpt.write_to_file(fpath, buffer, "wb")
+                TransportUtils.write_to_file(fpath, buffer, writer=writer)
 
 
+@measured(per_message=True)
 def save_to_disk(
     message: Union[bytes, str, list[Union[bytes, tuple[bytes, bytes]]]],
     filename: str,
     _class: type[Union[EmailMessage, MIMEPart]] = EmailMessage,
+    ctypes: Optional[Sequence[str]] = None,
+    filename_pattern: Optional[str] = None,
+    max_size: Optional[int] = None,
+    cache: Optional[ParseCache] = None,
+    writer: Optional[FileWriter] = None,
 ) -> None:
     """Disassemble and restructure message instance as a txt file. Attachments
     are saved on the same path —in a subdirectory. The message file and its
@@ -267,13 +797,30 @@ def save_to_disk(
         _class (type[Union[EmailMessage, MIMEPart]], optional):
             No-argument class from `email.message`. Defaults to
             EmailMessage.
+        ctypes (Optional[Sequence[str]], optional): Content-types of the
+            attachments to save. See `TransportUtils.xtract_attachments`.
+        filename_pattern (Optional[str], optional): File name pattern of the
+            attachments to save. See `TransportUtils.xtract_attachments`.
+        max_size (Optional[int], optional): Size limit of the attachments to
+            save. See `TransportUtils.xtract_attachments`.
+        cache (Optional[ParseCache], optional): Parse cache passed to
+            `TransportUtils.read_message`. Defaults to None.
+        writer (Optional[FileWriter], optional): Writer shared by many calls
+            to batch their disk syncs. The files only appear once the
+            writer is flushed. Defaults to None (a writer without fsync,
+            flushed before returning).
     """
     tpt = TransportUtils
-    msg = tpt.read_message(message, _class=_class)
+    msg = tpt.read_message(message, _class=_class, cache=cache)
 
     if isinstance(msg, (EmailMessage, MIMEPart)):
         load = tpt.xtract_payload(msg)
-        attm = tpt.xtract_attachments(msg)
+        attm = tpt.xtract_attachments(
+            msg,
+            ctypes=ctypes,
+            filename_pattern=filename_pattern,
+            max_size=max_size,
+        )
     else:
         load, attm = None, None
 
@@ -283,12 +830,207 @@ def save_to_disk(
     dpath = fpath.with_suffix("")
     attm_dpath = os.path.join(dpath, dpath)
 
-    if isinstance(attm, dict):
-        tpt.create_directory(dpath)
-        tpt.save_attachments(attm, attm_dpath)
+    # A writer owned by this call is flushed before it returns.
+    if writer is None:
+        writer_context: Any = FileWriter(fsync=False)
+    else:
+        writer_context = nullcontext(writer)
+
+    with writer_context as file_writer:
+        if isinstance(attm, dict):
+            file_writer.makedirs(dpath)
+            tpt.save_attachments(attm, attm_dpath, file_writer)
+
+        if isinstance(load, Message):
+            tpt.create_file(
+                filename, content=load.as_string(), writer=file_writer
+            )
+
+
+class ArchiveSink:
+    """Write messages into a single ZIP or tar archive.
 
-    if isinstance(load, Message):
-        tpt.create_file(filename, content=load.as_string())
+    Each message is stored like `save_to_disk` would store it: the body as
+    `<name>.txt` and the attachments under `<name>/`. Members are written
+    sequentially as messages are added, so memory use is bounded by the size
+    of one message, and tar archives can be written to non-seekable streams.
+
+    Usage:
+    >>> with ArchiveSink("inbox.tar.gz") as sink:
+    ...     for uid, message in client.bulk_fetch(uids):
+    ...         sink.add(message, f"{uid}.txt")
+    """
+
+    def __init__(
+        self,
+        archive: Union[Path, str, BinaryIO],
+        fmt: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+            archive (Union[Path, str, BinaryIO]): The archive's path or a
+                binary file object opened for writing.
+            fmt (Optional[str], optional): One of `ARCHIVE_FORMATS`: "zip",
+                "tar", or a compressed tar ("gz", "bz2", "xz"). Guessed from
+                the archive's suffix if None. Defaults to None.
+
+        Raises:
+            ValueError: If the format is unknown or can't be guessed.
+        """
+        if fmt is None:
+            fmt = self.guess_format(archive)
+        if fmt not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format: {fmt}")
+
+        self.fmt = fmt
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._tar: Optional[tarfile.TarFile] = None
+
+        if fmt == "zip":
+            self._zip = zipfile.ZipFile(
+                archive, mode="w", compression=zipfile.ZIP_DEFLATED
+            )
+        else:
+            mode = "w|" if fmt == "tar" else f"w|{fmt}"
+            if isinstance(archive, (Path, str)):
+                self._tar = tarfile.open(os.fspath(archive), mode=mode)
+            else:
+                self._tar = tarfile.open(fileobj=archive, mode=mode)
+
+    @staticmethod
+    def guess_format(archive: Union[Path, str, BinaryIO]) -> str:
+        """Guess the archive format from the file name.
+
+        Args:
+            archive (Union[Path, str, BinaryIO]): The archive's path or file
+                object.
+
+        Raises:
+            ValueError: If the format can't be guessed.
+
+        Returns:
+            str: One of `ARCHIVE_FORMATS`.
+        """
+        name = str(getattr(archive, "name", archive)).lower()
+        suffixes = {
+            ".zip": "zip",
+            ".tar": "tar",
+            ".tar.gz": "gz",
+            ".tgz": "gz",
+            ".tar.bz2": "bz2",
+            ".tbz2": "bz2",
+            ".tar.xz": "xz",
+            ".txz": "xz",
+        }
+        for suffix, fmt in suffixes.items():
+            if name.endswith(suffix):
+                return fmt
+        raise ValueError(f"Cannot guess the archive format of {name}")
+
+    def add(
+        self,
+        message: Union[bytes, str, list[Union[bytes, tuple[bytes, bytes]]]],
+        filename: str,
+        _class: type[Union[EmailMessage, MIMEPart]] = EmailMessage,
+        ctypes: Optional[Sequence[str]] = None,
+        filename_pattern: Optional[str] = None,
+        max_size: Optional[int] = None,
+        cache: Optional[ParseCache] = None,
+    ) -> None:
+        """Add a message's body and attachments to the archive.
+
+        Args:
+            message (Union[bytes, str, list]): The message object to be
+                saved.
+            filename (str): Name of the body file inside the archive.
+            _class (type[Union[EmailMessage, MIMEPart]], optional):
+                No-argument class from `email.message`. Defaults to
+                EmailMessage.
+            ctypes (Optional[Sequence[str]], optional): See `save_to_disk`.
+            filename_pattern (Optional[str], optional): See `save_to_disk`.
+            max_size (Optional[int], optional): See `save_to_disk`.
+            cache (Optional[ParseCache], optional): See `save_to_disk`.
+        """
+        tpt = TransportUtils
+        msg = tpt.read_message(message, _class=_class, cache=cache)
+        if not isinstance(msg, (EmailMessage, MIMEPart)):
+            return
+
+        fpath = Path(filename)
+        if not fpath.suffixes:
+            fpath = fpath.with_suffix(FILE_EXTENTION)
+
+        load = tpt.xtract_payload(msg)
+        if isinstance(load, Message):
+            self.write(fpath.as_posix(), load.as_string())
+
+        attm = tpt.xtract_attachments(
+            msg,
+            decode=True,
+            ctypes=ctypes,
+            filename_pattern=filename_pattern,
+            max_size=max_size,
+        )
+        dpath = fpath.with_suffix("")
+        for item in attm.values():
+            if item["filename"] and item["buffer"]:
+                member = dpath / item["filename"]
+                self.write(member.as_posix(), item["buffer"])
+
+    def write(self, name: str, data: Union[bytes, str]) -> None:
+        """Write a single member to the archive.
+
+        Args:
+            name (str): The member's path inside the archive.
+            data (Union[bytes, str]): The member's content. Strings are
+                encoded as UTF-8.
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+
+        if self._zip is not None:
+            self._zip.writestr(name, data)
+        elif self._tar is not None:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self._tar.addfile(info, io.BytesIO(data))
+
+    def close(self) -> None:
+        """Finish the archive."""
+        if self._zip is not None:
+            self._zip.close()
+        if self._tar is not None:
+            self._tar.close()
+
+    def __enter__(self) -> "ArchiveSink":
+        return self
+
+    def __exit__(self, exc_type: Any, exc_value: Any, trace: Any) -> None:
+        self.close()
+
+
+@measured()
+def save_to_archive(
+    messages: Iterable[tuple[str, Any]],
+    archive: Union[Path, str, BinaryIO],
+    fmt: Optional[str] = None,
+    **kwargs: Any,
+) -> None:
+    """Save many messages into a single ZIP or tar archive.
+
+    Args:
+        messages (Iterable[tuple[str, Any]]): Pairs of file name and message
+            object, as accepted by `save_to_disk`.
+        archive (Union[Path, str, BinaryIO]): The archive's path or a binary
+            file object opened for writing.
+        fmt (Optional[str], optional): See `ArchiveSink`. Defaults to None.
+        **kwargs (Any): Passed to `ArchiveSink.add`.
+    """
+    with ArchiveSink(archive, fmt) as sink:
+        for filename, message in messages:
+            sink.add(message, filename, **kwargs)
 
 
 if __name__ == "__main__":
@@ -1,20 +1,20 @@
 """
 This module provides useful functions that facilitate pragmail's routine
 operations.
+
+Modules that are only needed by a single function (`subprocess`,
+`urllib.request`, `email`, ...) are imported inside that function to keep
+`import pragmail` cheap.
 """
-import calendar
-import datetime
-import json
-import platform
+# pylint: disable=import-outside-toplevel
 import re
-import unicodedata
-from email import (message_from_binary_file, message_from_bytes,
-                   message_from_file, message_from_string)
-from email.message import Message
-from subprocess import DEVNULL as _DEVNULL
-from subprocess import call
-from typing import Any, BinaryIO, Optional, TextIO, Union
-from urllib.request import urlopen
+from functools import lru_cache
+from typing import Any, BinaryIO, Iterable, Iterator, Optional, TextIO, Union
+
+_FETCH_UID = re.compile(rb"\bUID (\d+)")
+_FOLDING = re.compile(r"\r?\n(?=[ \t])")
+_ENCODED_WORD = re.compile(r"=\?[^?\s]+\?[bBqQ]\?[^?\s]*\?=")
+_STATUS = re.compile(rb'^\s*("(?:[^"\\]|\\.)*"|\S+)\s+\((.*)\)\s*$')
 
 
 def date_format(date_ymd: str) -> str:
@@ -27,6 +27,8 @@ def date_format(date_ymd: str) -> str:
         str: The date in `DD-MM-YYYY` format and the month replaced with its
             abbreviated form.
     """
+    import calendar
+
     date = date_ymd.split("-")[::-1]
     return f"{date[0]}-{calendar.month_abbr[int(date[1])]}-{date[2]}"
 
@@ -40,6 +42,8 @@ def date_travel(days: int) -> str:
     Returns:
         str: The date in `YYYY-MM-DD` format.
     """
+    import datetime
+
     date = datetime.date.today() + datetime.timedelta(days=days)
     return str(date)
 
@@ -66,6 +70,10 @@ def ping_host(host: str) -> bool:
     Returns:
         bool: True if host is reachable, False otherwise.
     """
+    import platform
+    from subprocess import DEVNULL as _DEVNULL
+    from subprocess import call
+
     plat = platform.system().lower()
     c_param = "-n" if plat == "windows" else "-c"
     c_limit = "1"
@@ -97,6 +105,10 @@ def read_message(
     Returns:
         Union[str, bytes]: Parsed email message.
     """
+    from email import (message_from_binary_file, message_from_bytes,
+                       message_from_file, message_from_string)
+    from email.message import Message
+
     msg: Message = Message()
 
     if isinstance(message, bytes):
@@ -122,6 +134,8 @@ def sanitize(fname: str) -> str:
     Returns:
         str: Fairly safe version of the filename.
     """
+    import unicodedata
+
     blacklist = ["\\", "/", ":", "*", "?", '"', "<", ">", "|", "\0"]
     win_file = [
         "CON",
@@ -187,6 +201,9 @@ def server_settings(email: str, provider: str) -> dict[str, Any]:
     Returns:
         dict[str, Any]: Dictionary containing the requested specifications.
     """
+    import json
+    from urllib.request import urlopen
+
     providers = {
         "ES": "https://emailsettings.firetrust.com/settings?q={email}",
     }
@@ -209,5 +226,224 @@ def imap_scheme(domain: str) -> tuple[str, str]:
     return "imap://" + url, port
 
 
+def sequence_set(uids: Iterable[int]) -> str:
+    """Compress message numbers or UIDs into an IMAP sequence set.
+
+    Args:
+        uids (Iterable[int]): Message numbers or UIDs, in any order.
+
+    Returns:
+        str: The sequence set, e.g. `1:3,7,9:10`.
+    """
+    ranges: list[str] = []
+    start = end = None
+
+    for uid in sorted(set(uids)):
+        if end is not None and uid == end + 1:
+            end = uid
+            continue
+        if start is not None:
+            ranges.append(str(start) if start == end else f"{start}:{end}")
+        start = end = uid
+
+    if start is not None:
+        ranges.append(str(start) if start == end else f"{start}:{end}")
+    return ",".join(ranges)
+
+
+def parse_sequence_set(seqset: Union[bytes, str]) -> list[tuple[int, int]]:
+    """Parse an IMAP sequence set into ranges.
+
+    Args:
+        seqset (Union[bytes, str]): The sequence set, e.g. `1:3,7,10:9`.
+
+    Returns:
+        list[tuple[int, int]]: The `(start, end)` ranges, with start <= end.
+    """
+    if isinstance(seqset, bytes):
+        seqset = seqset.decode()
+
+    ranges = []
+    for part in seqset.split(","):
+        if not part.strip():
+            continue
+        start, _, end = part.partition(":")
+        first, last = int(start), int(end or start)
+        ranges.append((min(first, last), max(first, last)))
+    return ranges
+
+
+def iter_fetch(
+    data: list[Any],
+) -> Iterator[tuple[int, bytes, Optional[bytes]]]:
+    """Walk the response data of a `UID FETCH` command.
+
+    `imaplib` returns a message's fetch attributes as a bytes object, or as a
+    `(attributes, literal)` tuple when the response carries a literal. The UID
+    may also come after the literal, in the bytes object that follows it.
+
+    Args:
+        data (list[Any]): Response data returned by `IMAP4.uid("FETCH", ...)`.
+
+    Yields:
+        Iterator[tuple[int, bytes, Optional[bytes]]]: The UID, the fetch
+            attributes and the literal (or None) of each message.
+    """
+    pending: Optional[tuple[bytes, bytes]] = None
+
+    for item in data:
+        if isinstance(item, tuple):
+            meta, literal = item[0], item[1]
+            match = _FETCH_UID.search(meta)
+            if match:
+                yield int(match.group(1)), meta, literal
+            else:
+                pending = (meta, literal)
+        elif isinstance(item, bytes):
+            match = _FETCH_UID.search(item)
+            if match is None:
+                continue
+            if pending is not None:
+                yield int(match.group(1)), pending[0] + item, pending[1]
+                pending = None
+            else:
+                yield int(match.group(1)), item, None
+
+
+def quote_mailbox(mailbox: str) -> str:
+    """Quote a mailbox name for use as an IMAP command argument.
+
+    Args:
+        mailbox (str): The mailbox name.
+
+    Returns:
+        str: The mailbox name as an IMAP quoted string.
+    """
+    return '"' + mailbox.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def unquote_mailbox(mailbox: str) -> str:
+    """Undo `quote_mailbox`. Names that aren't quoted are returned as is.
+
+    Args:
+        mailbox (str): The mailbox name, possibly an IMAP quoted string.
+
+    Returns:
+        str: The mailbox name.
+    """
+    if len(mailbox) < 2 or mailbox[0] != '"' or mailbox[-1] != '"':
+        return mailbox
+    return re.sub(r"\\(.)", r"\1", mailbox[1:-1])
+
+
+def parse_status(data: bytes) -> tuple[str, dict[str, int]]:
+    """Parse an untagged STATUS response.
+
+    Args:
+        data (bytes): The response, e.g.
+            `b'INBOX (MESSAGES 3 UIDNEXT 5 UIDVALIDITY 1)'`.
+
+    Raises:
+        ValueError: If data is not a STATUS response.
+
+    Returns:
+        tuple[str, dict[str, int]]: The mailbox name and its status items.
+    """
+    match = _STATUS.match(data)
+    if match is None:
+        raise ValueError(f"Invalid STATUS response: {data!r}")
+
+    name = match.group(1).decode()
+    if name.startswith('"'):
+        name = re.sub(r"\\(.)", r"\1", name[1:-1])
+
+    values = match.group(2).decode().split()
+    items = zip(values[::2], values[1::2])
+    return name, {key.upper(): int(value) for key, value in items}
+
+
+@lru_cache(maxsize=256)
+def codec_name(charset: Optional[str]) -> str:
+    """Resolve a MIME charset to the name of a Python codec.
+
+    Args:
+        charset (Optional[str]): The charset, e.g. "UTF-8" or "latin_1",
+            optionally followed by an RFC 2231 language ("utf-8*en"). None
+            stands for text that declares no charset.
+
+    Returns:
+        str: The codec name. Text without a charset resolves to "utf-8" and
+            unknown charsets to "latin-1", which can decode any byte.
+    """
+    import codecs
+
+    if charset is None:
+        return "utf-8"
+    try:
+        return codecs.lookup(charset.split("*")[0].strip().lower()).name
+    except LookupError:
+        return "latin-1"
+
+
+def _decode_word(word: str) -> str:
+    from email.errors import HeaderParseError
+    from email.header import decode_header
+
+    try:
+        ((data, charset),) = decode_header(word)
+    except (HeaderParseError, ValueError):
+        return word
+    if isinstance(data, str):
+        return data
+    return data.decode(codec_name(charset), "replace")
+
+
+def unfold(value: str) -> str:
+    """Unfold header lines (RFC 5322, section 2.2.3).
+
+    Args:
+        value (str): A header value, or a whole header block.
+
+    Returns:
+        str: The text with each line break before whitespace removed.
+    """
+    return _FOLDING.sub("", value)
+
+
+@lru_cache(maxsize=8192)
+def decode_header_value(value: str) -> str:
+    """Unfold a header value and decode its RFC 2047 encoded words.
+
+    Only the encoded words are decoded; the text around them is kept as is.
+    Whitespace between two encoded words is dropped, as RFC 2047 requires.
+
+    Results are memoized: mailing lists repeat the same encoded subjects and
+    senders over and over, and decoding them is a measurable share of the
+    time spent reading headers.
+
+    Args:
+        value (str): The raw header value, e.g. `=?utf-8?q?Caf=C3=A9?=`.
+
+    Returns:
+        str: The decoded value. Malformed encoded words are left as they
+            are.
+    """
+    value = unfold(value)
+    if "=?" not in value:
+        return value
+
+    pieces = []
+    pos = 0
+    for match in _ENCODED_WORD.finditer(value):
+        between = value[pos:match.start()]
+        if not pieces or between.strip():
+            pieces.append(between)
+        pieces.append(_decode_word(match.group()))
+        pos = match.end()
+    pieces.append(value[pos:])
+
+    return "".join(pieces)
+
+
 if __name__ == "__main__":
     pass
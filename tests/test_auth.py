@@ -0,0 +1,206 @@
+import base64
+import socket
+import threading
+
+import pytest
+
+from pragmail.auth import (OAuth2Token, authenticate, login, login_oauth2,
+                           plain_response, xoauth2_response)
+from pragmail.capabilities import CapabilityCache
+from pragmail.clients import Client
+from pragmail.connections import IMAP4Connection
+
+
+class AuthServer:
+    """Accepts the credentials in `valid`, received with or without SASL-IR.
+
+    Every line the client sends is recorded in `lines`.
+    """
+
+    def __init__(self, capabilities, valid=()):
+        self.capabilities = capabilities
+        self.valid = set(valid)
+        self.lines = []
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        conn, _ = self.listener.accept()
+        with conn:
+            conn.sendall(
+                b"* OK [CAPABILITY %s] ready\r\n" % self.capabilities
+            )
+            lines = conn.makefile("rb")
+            for line in lines:
+                self.lines.append(line.strip())
+                tag, command, *args = line.split()
+                if command.upper() == b"LOGIN":
+                    credentials = b"\0%s\0%s" % (args[0], args[1].strip(b'"'))
+                elif command.upper() == b"AUTHENTICATE":
+                    if len(args) > 1:
+                        response = args[1]
+                    else:
+                        conn.sendall(b"+ \r\n")
+                        response = next(lines).strip()
+                        self.lines.append(response)
+                    credentials = base64.b64decode(response)
+                else:
+                    conn.sendall(tag + b" OK done\r\n")
+                    continue
+
+                if credentials in self.valid:
+                    conn.sendall(
+                        tag + b" OK [CAPABILITY IMAP4rev1 IDLE] welcome\r\n"
+                    )
+                    continue
+                if command.upper() == b"AUTHENTICATE" and b"\1" in credentials:
+                    # XOAUTH2 sends error details before failing.
+                    conn.sendall(b"+ eyJzdGF0dXMiOiI0MDEifQ==\r\n")
+                    self.lines.append(next(lines).strip())
+                conn.sendall(tag + b" NO invalid credentials\r\n")
+
+    def close(self):
+        self.listener.close()
+
+
+def connect(server):
+    return IMAP4Connection(
+        "127.0.0.1",
+        server.port,
+        timeout=10,
+        capability_cache=CapabilityCache(),
+    )
+
+
+@pytest.fixture
+def server(request):
+    server = AuthServer(*request.param)
+    yield server
+    server.close()
+
+
+PLAIN_CREDENTIALS = plain_response("user", "pässword")
+
+
+@pytest.mark.parametrize(
+    "server",
+    [(b"IMAP4rev1 SASL-IR AUTH=PLAIN", [PLAIN_CREDENTIALS])],
+    indirect=True,
+)
+def test_login_sends_initial_response(server):
+    imap4 = connect(server)
+    try:
+        assert login(imap4, "user", "pässword")[0] == "OK"
+        assert imap4.state == "AUTH"
+        assert len(server.lines) == 1
+        assert server.lines[0].split()[1:] == [
+            b"AUTHENTICATE",
+            b"PLAIN",
+            base64.b64encode(PLAIN_CREDENTIALS),
+        ]
+    finally:
+        imap4.shutdown()
+
+
+@pytest.mark.parametrize(
+    "server", [(b"IMAP4rev1 AUTH=PLAIN", [b"\0user\0secret"])], indirect=True
+)
+def test_login_without_sasl_ir(server):
+    imap4 = connect(server)
+    try:
+        assert login(imap4, "user", "secret")[0] == "OK"
+        assert server.lines[0].split()[1] == b"LOGIN"
+    finally:
+        imap4.shutdown()
+
+
+@pytest.mark.parametrize(
+    "server", [(b"IMAP4rev1 AUTH=PLAIN", [PLAIN_CREDENTIALS])], indirect=True
+)
+def test_authenticate_waits_for_challenge_without_sasl_ir(server):
+    imap4 = connect(server)
+    try:
+        assert authenticate(imap4, "plain", PLAIN_CREDENTIALS)[0] == "OK"
+        assert server.lines[0].split()[1:] == [b"AUTHENTICATE", b"PLAIN"]
+        assert len(server.lines) == 2
+    finally:
+        imap4.shutdown()
+
+
+@pytest.mark.parametrize(
+    "server",
+    [(b"IMAP4rev1 SASL-IR AUTH=XOAUTH2", [xoauth2_response("u", "new")])],
+    indirect=True,
+)
+def test_login_oauth2_refreshes_rejected_token(server):
+    refreshed = []
+
+    def refresh():
+        refreshed.append(True)
+        return "new", 3600
+
+    token = OAuth2Token("old", refresh=refresh)
+    imap4 = connect(server)
+    try:
+        assert login_oauth2(imap4, "u", token)[0] == "OK"
+        assert refreshed == [True]
+        # The rejected attempt is answered with an empty line.
+        assert server.lines[1] == b""
+    finally:
+        imap4.shutdown()
+
+
+@pytest.mark.parametrize(
+    "server", [(b"IMAP4rev1 SASL-IR AUTH=XOAUTH2", [])], indirect=True
+)
+def test_login_oauth2_rejected(server):
+    imap4 = connect(server)
+    try:
+        with pytest.raises(IMAP4Connection.error):
+            login_oauth2(imap4, "u", OAuth2Token("token"))
+        assert imap4.state == "NONAUTH"
+    finally:
+        imap4.shutdown()
+
+
+@pytest.mark.parametrize(
+    "server",
+    [(b"IMAP4rev1 SASL-IR AUTH=PLAIN", [plain_response("a", "b")])],
+    indirect=True,
+)
+def test_client_login_reuses_capabilities(server):
+    client = Client.__new__(Client)
+    client.imap4 = connect(server)
+    client.capability_cache = CapabilityCache()
+    try:
+        client.login("a", "b")
+        assert len(server.lines) == 1
+        assert client.imap4.capabilities == ("IMAP4REV1", "IDLE")
+    finally:
+        client.imap4.shutdown()
+
+
+def test_oauth2_token_refreshes_before_expiry():
+    tokens = iter([("first", 30), ("second", 3600)])
+    token = OAuth2Token(refresh=lambda: next(tokens))
+    # The first token expires within the refresh margin.
+    assert token.get() == "first"
+    assert token.get() == "second"
+    assert token.get() == "second"
+
+    token.invalidate()
+    with pytest.raises(StopIteration):
+        token.get()
+
+
+def test_oauth2_token_without_refresh():
+    token = OAuth2Token("static")
+    token.invalidate()
+    assert token.get() == "static"
+
+    with pytest.raises(ValueError):
+        OAuth2Token("expired", expires_in=0).get()
+    with pytest.raises(ValueError):
+        OAuth2Token()
@@ -0,0 +1,68 @@
+import json
+import time
+
+from pragmail.capabilities import (COMPRESS, ESEARCH, SORT, Capabilities,
+                                   CapabilityCache)
+
+CAPABILITIES = ("IMAP4REV1", "SORT", "AUTH=PLAIN", "AUTH=XOAUTH2",
+                "COMPRESS=DEFLATE")
+
+
+class TestCapabilities:
+    caps = Capabilities(CAPABILITIES)
+
+    def test_has(self):
+        assert self.caps.has("sort")
+        assert "SORT" in self.caps
+        assert self.caps.has(COMPRESS)
+        assert self.caps.has("AUTH=PLAIN")
+        assert not self.caps.has("AUTH=LOGIN")
+        assert not self.caps.has(ESEARCH)
+
+    def test_choose(self):
+        assert self.caps.choose(ESEARCH, SORT) == SORT
+        assert self.caps.choose(ESEARCH) is None
+
+    def test_values(self):
+        assert self.caps.values("auth") == {"PLAIN", "XOAUTH2"}
+        assert self.caps.values("IDLE") == set()
+
+
+class TestCapabilityCache:
+    def test_get_and_set(self):
+        cache = CapabilityCache()
+        assert cache.get("imap.example.com", 993) is None
+        cache.set("imap.example.com", 993, CAPABILITIES)
+        assert cache.get("imap.example.com", 993) == CAPABILITIES
+        assert cache.get("imap.example.com", 993, authenticated=True) is None
+        assert cache.get("imap.example.com", 143) is None
+
+    def test_entries_expire(self):
+        cache = CapabilityCache(ttl=-1)
+        cache.set("imap.example.com", 993, CAPABILITIES)
+        assert cache.get("imap.example.com", 993) is None
+
+    def test_disk_persistence(self, tmp_path):
+        path = tmp_path / "cache" / "capabilities.json"
+        CapabilityCache(path).set("imap.example.com", 993, CAPABILITIES)
+        assert CapabilityCache(path).get("imap.example.com", 993) == (
+            CAPABILITIES
+        )
+
+        cache = CapabilityCache(path)
+        cache.clear()
+        assert json.loads(path.read_text()) == {}
+
+    def test_disk_entries_expire(self, tmp_path):
+        path = tmp_path / "capabilities.json"
+        path.write_text(
+            json.dumps(
+                {"imap.example.com:993:NONAUTH": [time.time() - 1, ["SORT"]]}
+            )
+        )
+        assert CapabilityCache(path).get("imap.example.com", 993) is None
+
+    def test_corrupt_file_is_ignored(self, tmp_path):
+        path = tmp_path / "capabilities.json"
+        path.write_text("{")
+        assert CapabilityCache(path).get("imap.example.com", 993) is None
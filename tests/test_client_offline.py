@@ -0,0 +1,371 @@
+import re
+import time
+from imaplib import IMAP4
+
+import pytest
+
+import pragmail
+from pragmail.capabilities import CapabilityCache
+from pragmail.clients import TEXT_MESSSAGE, Client, FetchCheckpoint
+from pragmail.exceptions import DeadlineExceeded, IMAP4Error
+
+
+class FakeIMAP4:
+    """Offline stand-in for `imaplib.IMAP4` serving messages by UID.
+
+    Each item of `failures` decides whether the matching UID command drops
+    the connection, or is an exception for it to raise.
+    """
+
+    state = "SELECTED"
+    host = "imap.example.com"
+    port = 993
+
+    def __init__(self, messages, failures=(), capabilities=(), statuses=()):
+        self.messages = messages
+        self.failures = list(failures)
+        self.capabilities = capabilities
+        self.statuses = dict(statuses)
+        self.commands = []
+        self.untagged_responses = {}
+        self.closed = False
+        # Mailboxes whose STATUS command gets a BAD response.
+        self.bad = set()
+        self.pending = []
+
+    def login(self, username, password):
+        self.commands.append(("LOGIN", username))
+        return "OK", [b"authenticated"]
+
+    def capability(self):
+        self.commands.append(("CAPABILITY",))
+        return "OK", [b"IMAP4rev1 SORT"]
+
+    def select(self, mailbox, readonly=False):
+        self.commands.append(("SELECT", mailbox))
+        return "OK", [str(len(self.messages)).encode()]
+
+    def shutdown(self):
+        self.closed = True
+
+    def _command(self, name, *args):
+        self.commands.append((name, *args))
+        status = self.statuses.get(args[0].strip('"'))
+        if status is not None:
+            items = " ".join(f"{key} {value}" for key, value in status.items())
+            self.untagged_responses.setdefault(name, []).append(
+                f"{args[0]} ({items})".encode()
+            )
+        self.pending.append(args[0])
+        return args[0]
+
+    def _command_complete(self, name, tag):
+        self.pending.remove(tag)
+        if tag.strip('"') in self.bad:
+            raise IMAP4.error(f"{name} command error: BAD")
+        return "OK", [b"completed"]
+
+    def uid(self, command, *args):
+        self.commands.append((command, *args))
+        failure = self.failures.pop(0) if self.failures else None
+        if isinstance(failure, BaseException):
+            raise failure
+        if isinstance(failure, str):
+            return failure, [b"failed"]
+        if failure:
+            raise IMAP4.abort("connection lost")
+
+        if command in ("SEARCH", "SORT"):
+            found = sorted(self.messages, reverse=command == "SORT")
+            if args[0].startswith("RETURN"):
+                result = pragmail.utils.sequence_set(found)
+                if "MAX" in args[0]:
+                    result = str(found[-1])
+                self.untagged_responses["ESEARCH"] = [
+                    f'(TAG "A1") UID {args[0][8:11]} {result}'.encode()
+                ]
+                return "OK", [None]
+            return "OK", [" ".join(map(str, found)).encode()]
+
+        uids = []
+        for part in args[0].split(","):
+            start, _, end = part.partition(":")
+            uids.extend(range(int(start), int(end or start) + 1))
+
+        partial = re.search(r"<(\d+)\.(\d+)>", args[1])
+        data = []
+        for uid in uids:
+            if uid in self.messages:
+                body = self.messages[uid]
+                if "HEADER.FIELDS (FROM)" in args[1]:
+                    body = re.search(rb"From:.*\n", body).group()
+                if partial:
+                    offset, length = map(int, partial.groups())
+                    body = body[offset:offset + length]
+                meta = b"%d (UID %d BODY[] {%d}" % (uid, uid, len(body))
+                data.extend([(meta, body), b")"])
+        return "OK", data
+
+
+def make_client(imap4):
+    client = Client.__new__(Client)
+    client.imap4 = imap4
+    client.connect = lambda: None
+    client.capability_cache = CapabilityCache()
+    return client
+
+
+def test_bulk_fetch_resumes_after_reconnect():
+    imap4 = FakeIMAP4({1: b"one", 2: b"two", 5: b"five"}, [0, 1, 1])
+    client = make_client(imap4)
+    client._credentials = ("user", "password")
+    client._mailbox = "INBOX"
+    checkpoint = FetchCheckpoint()
+
+    messages = list(
+        client.bulk_fetch(
+            [5, 2, 1], checkpoint=checkpoint, batch_size=1, backoff=0
+        )
+    )
+
+    assert messages == [(1, b"one"), (2, b"two"), (5, b"five")]
+    assert checkpoint.last_uid == 5
+    assert imap4.commands.count(("LOGIN", "user")) == 2
+    assert imap4.commands.count(("SELECT", '"INBOX"')) == 2
+
+
+def test_bulk_fetch_skips_checkpointed_uids():
+    client = make_client(FakeIMAP4({1: b"one", 2: b"two"}))
+    checkpoint = FetchCheckpoint.from_dict({"last_uid": 1})
+    assert list(client.bulk_fetch([1, 2], checkpoint=checkpoint)) == [
+        (2, b"two")
+    ]
+    assert checkpoint.as_dict() == {"last_uid": 2}
+
+
+def test_bulk_fetch_resumes_partial_fetch_from_offset():
+    imap4 = FakeIMAP4({3: b"x" * 25}, [0, 1])
+    client = make_client(imap4)
+
+    messages = list(client.bulk_fetch([3], chunk_size=10, backoff=0))
+
+    assert messages == [(3, b"x" * 25)]
+    assert [cmd[2] for cmd in imap4.commands] == [
+        "(BODY.PEEK[]<0.10>)",
+        "(BODY.PEEK[]<10.10>)",
+        "(BODY.PEEK[]<10.10>)",
+        "(BODY.PEEK[]<20.10>)",
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", [None, 2])
+def test_bulk_fetch_skips_missing_uids(chunk_size):
+    client = make_client(FakeIMAP4({1: b"one", 3: b"three", 4: b""}))
+    checkpoint = FetchCheckpoint()
+
+    messages = list(
+        client.bulk_fetch(
+            [1, 2, 3, 4], checkpoint=checkpoint, chunk_size=chunk_size
+        )
+    )
+
+    assert messages == [(1, b"one"), (3, b"three"), (4, b"")]
+    assert checkpoint.last_uid == 4
+
+
+def test_bulk_fetch_raises_after_retries():
+    client = make_client(FakeIMAP4({1: b"one"}, [1, 1, 1]))
+    with pytest.raises(IMAP4Error, match="connection lost"):
+        list(client.bulk_fetch([1], retries=2, backoff=0))
+
+
+def test_bulk_fetch_deadline_reports_checkpoint():
+    imap4 = FakeIMAP4({1: b"one", 2: b"two"}, [0, DeadlineExceeded("late")])
+    client = make_client(imap4)
+    messages = client.bulk_fetch([1, 2], batch_size=1)
+
+    assert next(messages) == (1, b"one")
+    with pytest.raises(DeadlineExceeded) as err:
+        next(messages)
+    assert err.value.partial.last_uid == 1
+    assert imap4.closed
+
+
+def test_bulk_fetch_deadline_cuts_backoff():
+    client = make_client(FakeIMAP4({1: b"one"}, [1]))
+    start = time.monotonic()
+    with client.deadline(0.5):
+        with pytest.raises(DeadlineExceeded):
+            list(client.bulk_fetch([1], backoff=10))
+    assert time.monotonic() - start < 1
+
+
+def test_iter_messages_prefetches_in_batches():
+    imap4 = FakeIMAP4({uid: b"message %d" % uid for uid in range(1, 8)})
+    client = make_client(imap4)
+    checkpoint = FetchCheckpoint()
+    messages = client.iter_messages(
+        range(1, 8), prefetch=3, max_bytes=None, checkpoint=checkpoint
+    )
+
+    assert next(messages) == (1, b"message 1")
+    assert checkpoint.last_uid == 1
+    assert [uid for uid, _ in messages] == [2, 3, 4, 5, 6, 7]
+    assert [cmd[1] for cmd in imap4.commands] == ["1:3", "4:6", "7"]
+
+
+def test_iter_messages_fetches_one_message_within_byte_budget():
+    imap4 = FakeIMAP4({uid: b"message %d" % uid for uid in range(1, 4)})
+    client = make_client(imap4)
+    messages = client.iter_messages(range(1, 4), prefetch=3, max_bytes=20)
+
+    assert [uid for uid, _ in messages] == [1, 2, 3]
+    assert [cmd[1] for cmd in imap4.commands] == ["1", "2", "3"]
+
+
+def test_iter_messages_deadline_reports_handed_out_uid():
+    imap4 = FakeIMAP4(
+        {1: b"one", 2: b"two", 3: b"three"}, [0, DeadlineExceeded("late")]
+    )
+    client = make_client(imap4)
+    messages = client.iter_messages([1, 2, 3], prefetch=2, batch_size=1)
+
+    assert next(messages) == (1, b"one")
+    with pytest.raises(DeadlineExceeded) as err:
+        next(messages)
+    assert err.value.partial.last_uid == 1
+
+
+def test_operation_timeout():
+    imap4 = FakeIMAP4({1: b"one"}, [DeadlineExceeded("late")])
+    client = make_client(imap4)
+    client.operation_timeout = 5
+
+    with pytest.raises(DeadlineExceeded):
+        client.newest_uids()
+    assert imap4.closed
+    assert imap4.deadline is None
+
+    with client.deadline(1) as outer:
+        with client.deadline(10) as inner:
+            assert inner is outer
+            assert imap4.deadline is outer
+
+
+def test_status_pipelines_commands():
+    statuses = {"INBOX": {"MESSAGES": 2}, "Sent Mail": {"MESSAGES": 1}}
+    imap4 = FakeIMAP4({}, capabilities=("CONDSTORE",), statuses=statuses)
+    client = make_client(imap4)
+
+    assert client.status(["INBOX", "Sent Mail", "Missing"]) == statuses
+    assert imap4.commands[0] == (
+        "STATUS",
+        '"INBOX"',
+        "(MESSAGES UIDNEXT UIDVALIDITY HIGHESTMODSEQ)",
+    )
+
+
+def test_status_reads_every_response_on_error():
+    statuses = {"INBOX": {"MESSAGES": 2}, "Sent": {"MESSAGES": 1}}
+    imap4 = FakeIMAP4({}, statuses=statuses)
+    imap4.bad = {"Bad Name"}
+    client = make_client(imap4)
+
+    with pytest.raises(IMAP4Error, match="BAD"):
+        client.status(["INBOX", "Bad Name", "Sent"])
+    assert imap4.pending == []
+    assert "STATUS" not in imap4.untagged_responses
+
+
+def test_poll_selects_changed_mailboxes_only():
+    statuses = {"INBOX": {"UIDNEXT": 5}, "Work": {"UIDNEXT": 9}}
+    imap4 = FakeIMAP4({}, statuses=statuses)
+    client = make_client(imap4)
+    known = {"INBOX": {"UIDNEXT": 5}, "Work": {"UIDNEXT": 8}}
+
+    assert list(client.poll(known)) == ["Work"]
+    assert known == statuses
+    assert ("SELECT", '"INBOX"') not in imap4.commands
+    assert ("SELECT", '"Work"') in imap4.commands
+    assert client._mailbox == "Work"
+    assert client.changed_mailboxes(known) == []
+
+
+@pytest.mark.parametrize(
+    "capabilities,command",
+    [(("SORT",), "SORT"), (("ESEARCH",), "SEARCH"), ((), "SEARCH")],
+)
+def test_newest(capabilities, command):
+    messages = {uid: f"message {uid}".encode() for uid in (1, 2, 3, 7, 8)}
+    imap4 = FakeIMAP4(messages, capabilities=capabilities)
+    client = make_client(imap4)
+
+    assert client.newest('(FROM "John")', 3) == [
+        (8, b"message 8"),
+        (7, b"message 7"),
+        (3, b"message 3"),
+    ]
+    assert imap4.commands[0][0] == command
+    assert imap4.commands[-1] == ("FETCH", "3,7:8", TEXT_MESSSAGE)
+    assert client.newest_uids(n=1) == [8]
+
+
+def test_newest_no_match():
+    client = make_client(FakeIMAP4({}))
+    assert client.newest("ALL", 5) == []
+
+
+def test_latest_messages():
+    messages = {
+        3: b"From: John Smith <john@example.com>\n\nold",
+        4: b"From: =?utf-8?q?J=C3=BCrgen?= <jurgen@example.com>\n\nhi",
+        6: b"From: john@example.com\n\nnew",
+        9: b"From: Jane <jane@example.com>\n\nhello",
+    }
+    imap4 = FakeIMAP4(messages)
+    client = make_client(imap4)
+
+    latest = client.latest_messages(["JOHN", "Jürgen", "nobody"], -2)
+
+    assert latest == {
+        "JOHN": (6, messages[6]),
+        "Jürgen": (4, messages[4]),
+        "nobody": None,
+    }
+    assert [cmd[0] for cmd in imap4.commands] == ["SEARCH", "FETCH", "FETCH"]
+    assert imap4.commands[-1] == ("FETCH", "4,6", TEXT_MESSSAGE)
+
+
+def test_latest_messages_raises_on_failed_fetch():
+    imap4 = FakeIMAP4({3: b"From: john@example.com\n\nhi"}, [0, "NO"])
+    client = make_client(imap4)
+
+    with pytest.raises(IMAP4Error, match="FETCH failed"):
+        client.latest_messages(["john"], -2)
+
+
+def test_latest_messages_raises_invalid_date_range():
+    with pytest.raises(Exception):
+        make_client(FakeIMAP4({})).latest_messages(["John Smith"], 0)
+
+
+def test_login_refreshes_capabilities():
+    imap4 = FakeIMAP4({}, capabilities=("IMAP4REV1",))
+    client = make_client(imap4)
+
+    client.login("user", "password")
+    assert client.capabilities.has("SORT")
+    assert ("CAPABILITY",) in imap4.commands
+
+    imap4 = FakeIMAP4({}, capabilities=("IMAP4REV1",))
+    imap4.untagged_responses["CAPABILITY"] = [b"IMAP4rev1 ESEARCH"]
+    client.imap4 = imap4
+    client.login("user", "password")
+    assert client.capabilities.has("ESEARCH")
+    assert ("CAPABILITY",) not in imap4.commands
+
+    imap4 = FakeIMAP4({}, capabilities=("IMAP4REV1",))
+    client.imap4 = imap4
+    client.login("user", "password")
+    assert client.capabilities.has("ESEARCH")
+    assert ("CAPABILITY",) not in imap4.commands
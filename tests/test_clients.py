@@ -1,6 +1,7 @@
 import os
 import re
 from imaplib import IMAP4, IMAP4_SSL
+from ssl import create_default_context
 
 import pytest
 from dotenv import load_dotenv
@@ -103,6 +104,22 @@ def test_client_context_manger_has_imap_ssl():
     client.logout()
 
 
+def test_client_honors_ssl_context():
+    ssl_context = create_default_context()
+    client = Client(IMAP_SERVER, ssl_context=ssl_context)
+    assert client.ssl_context is ssl_context
+    assert client.imap4.ssl_context is ssl_context
+    client.logout()
+
+
+def test_client_shares_default_ssl_context():
+    client = Client(IMAP_SERVER)
+    other_client = Client(IMAP_SERVER)
+    assert client.ssl_context is other_client.ssl_context
+    client.logout()
+    other_client.logout()
+
+
 def test_client_context_manager_prints_exec_info(capsys):
     client = Client(IMAP_SERVER)
     client.__exit__(Exception, 1, "Error traceback")
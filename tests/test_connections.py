@@ -0,0 +1,261 @@
+import socket
+import time
+from imaplib import IMAP4
+from ssl import SSLContext
+
+import pytest
+
+from pragmail import connections
+from pragmail.capabilities import CapabilityCache
+from pragmail.connections import IMAP4Connection, IMAP4SSLConnection
+
+
+class FakeSSLContext:
+    def __init__(self):
+        self.wrap_kwargs = {}
+
+    def wrap_socket(self, sock, **kwargs):
+        self.wrap_kwargs = kwargs
+        return sock
+
+
+class FakeSocket:
+    def __init__(self, session=None):
+        self.session = session
+
+
+@pytest.fixture(autouse=True)
+def clear_sessions():
+    connections.clear_tls_sessions()
+    yield
+    connections.clear_tls_sessions()
+
+
+def make_connection(ssl_context, sock=None):
+    conn = IMAP4SSLConnection.__new__(IMAP4SSLConnection)
+    conn.host = "imap.example.com"
+    conn.port = 993
+    conn.ssl_context = ssl_context
+    conn.sock = sock
+    return conn
+
+
+def test_default_ssl_context_is_shared():
+    ctx = connections.default_ssl_context()
+    assert isinstance(ctx, SSLContext)
+    assert connections.default_ssl_context() is ctx
+
+
+def test_tls_session_is_stored_per_context():
+    ctx, other_ctx = FakeSSLContext(), FakeSSLContext()
+    connections.store_tls_session("imap.example.com", 993, ctx, "session")
+    assert connections.get_tls_session("imap.example.com", 993, ctx) == (
+        "session"
+    )
+    assert connections.get_tls_session("imap.example.com", 993, other_ctx) is (
+        None
+    )
+    assert connections.get_tls_session("imap.example.com", 143, ctx) is None
+
+
+def test_connection_offers_stored_session(monkeypatch):
+    ctx = FakeSSLContext()
+    monkeypatch.setattr(connections, "connect", lambda *args: None)
+    connections.store_tls_session("imap.example.com", 993, ctx, "session")
+
+    make_connection(ctx)._create_socket(3.0)
+
+    assert ctx.wrap_kwargs == {
+        "server_hostname": "imap.example.com",
+        "session": "session",
+    }
+
+
+def test_connection_without_stored_session(monkeypatch):
+    ctx = FakeSSLContext()
+    monkeypatch.setattr(connections, "connect", lambda *args: None)
+
+    make_connection(ctx)._create_socket(3.0)
+
+    assert ctx.wrap_kwargs["session"] is None
+
+
+def test_save_tls_session():
+    ctx = FakeSSLContext()
+    make_connection(ctx, FakeSocket("session")).save_tls_session()
+    make_connection(ctx, FakeSocket(None)).save_tls_session()
+    assert connections.get_tls_session("imap.example.com", 993, ctx) == (
+        "session"
+    )
+
+
+@pytest.fixture
+def listener():
+    server = socket.create_server(("127.0.0.1", 0))
+    yield server
+    server.close()
+
+
+def fake_getaddrinfo(*addresses):
+    calls = []
+
+    def getaddrinfo(host, port, family, type_):
+        calls.append(host)
+        return [
+            (fam, socket.SOCK_STREAM, 6, "", (addr, port))
+            for fam, addr in addresses
+        ]
+
+    return getaddrinfo, calls
+
+
+def test_resolve_caches_and_interleaves(monkeypatch):
+    connections.clear_resolver_cache()
+    getaddrinfo, calls = fake_getaddrinfo(
+        (socket.AF_INET6, "::2"),
+        (socket.AF_INET6, "::3"),
+        (socket.AF_INET, "10.0.0.2"),
+    )
+    monkeypatch.setattr(connections, "getaddrinfo", getaddrinfo)
+
+    addresses = connections.resolve("imap.example.com", 993)
+    assert [info[4][0] for info in addresses] == ["::2", "10.0.0.2", "::3"]
+    assert connections.resolve("imap.example.com", 993) is addresses
+    assert calls == ["imap.example.com"]
+
+    connections.clear_resolver_cache()
+    connections.resolve("imap.example.com", 993, ttl=0)
+    connections.resolve("imap.example.com", 993, ttl=0)
+    assert len(calls) == 3
+    connections.clear_resolver_cache()
+
+
+def test_connect_falls_back_to_next_address(monkeypatch, listener):
+    connections.clear_resolver_cache()
+    port = listener.getsockname()[1]
+    # Nothing listens on 127.0.0.2 for that port, or it isn't routable.
+    getaddrinfo, _ = fake_getaddrinfo(
+        (socket.AF_INET, "127.0.0.2"), (socket.AF_INET, "127.0.0.1")
+    )
+    monkeypatch.setattr(connections, "getaddrinfo", getaddrinfo)
+
+    start = time.monotonic()
+    sock = connections.connect("imap.example.com", port, timeout=5)
+    try:
+        assert sock.getpeername() == ("127.0.0.1", port)
+        assert sock.gettimeout() == 5
+        assert time.monotonic() - start < 1
+    finally:
+        sock.close()
+        connections.clear_resolver_cache()
+
+
+def test_connect_raises_when_every_attempt_fails(monkeypatch, listener):
+    connections.clear_resolver_cache()
+    port = listener.getsockname()[1]
+    listener.close()
+    getaddrinfo, calls = fake_getaddrinfo((socket.AF_INET, "127.0.0.1"))
+    monkeypatch.setattr(connections, "getaddrinfo", getaddrinfo)
+
+    with pytest.raises(OSError):
+        connections.connect("imap.example.com", port, timeout=5)
+    with pytest.raises(OSError):
+        connections.connect("imap.example.com", port, timeout=5)
+    # Failed hosts are resolved again.
+    assert len(calls) == 2
+
+
+class FakePipelineIMAP4:
+    def __init__(self, bad=()):
+        self.events = []
+        self.untagged_responses = {}
+        self.bad = set(bad)
+
+    def _command(self, name, *args):
+        self.events.append(("send", args[0]))
+        self.untagged_responses.setdefault(name, []).append(args[0].encode())
+        return args[0]
+
+    def _command_complete(self, name, tag):
+        self.events.append(("complete", tag))
+        if tag in self.bad:
+            raise IMAP4.error(f"{name} command error: BAD")
+        return "OK", [b"completed"]
+
+
+def test_pipeline_sends_before_reading():
+    imap4 = FakePipelineIMAP4()
+    types, data = connections.pipeline(imap4, "STATUS", [("A",), ("B",)])
+    assert types == ["OK", "OK"]
+    assert data == [b"A", b"B"]
+    assert imap4.events == [
+        ("send", "A"),
+        ("send", "B"),
+        ("complete", "A"),
+        ("complete", "B"),
+    ]
+    assert "STATUS" not in imap4.untagged_responses
+
+
+def test_pipeline_reads_every_response_before_raising():
+    imap4 = FakePipelineIMAP4(bad={"B", "C"})
+    with pytest.raises(IMAP4.error, match="BAD"):
+        connections.pipeline(imap4, "STATUS", [("A",), ("B",), ("C",), ("D",)])
+    assert [tag for event, tag in imap4.events if event == "complete"] == [
+        "A",
+        "B",
+        "C",
+        "D",
+    ]
+    assert "STATUS" not in imap4.untagged_responses
+
+
+def make_plain_connection(cache, untagged=None):
+    conn = IMAP4Connection.__new__(IMAP4Connection)
+    conn.host = "imap.example.com"
+    conn.port = 143
+    conn.capability_cache = cache
+    conn.untagged_responses = untagged or {}
+    conn._encoding = "ascii"
+    return conn
+
+
+@pytest.fixture
+def capability_command(monkeypatch):
+    calls = []
+
+    def get_capabilities(self):
+        calls.append(self)
+        self.capabilities = ("IMAP4REV1", "IDLE")
+
+    monkeypatch.setattr(IMAP4, "_get_capabilities", get_capabilities)
+    return calls
+
+
+def test_capabilities_from_greeting(capability_command):
+    cache = CapabilityCache()
+    conn = make_plain_connection(
+        cache, {"CAPABILITY": [b"IMAP4rev1 SASL-IR"]}
+    )
+    conn._get_capabilities()
+    assert conn.capabilities == ("IMAP4REV1", "SASL-IR")
+    assert cache.get("imap.example.com", 143) == ("IMAP4REV1", "SASL-IR")
+    assert not capability_command
+
+
+def test_capabilities_from_cache(capability_command):
+    cache = CapabilityCache()
+    cache.set("imap.example.com", 143, ("IMAP4REV1", "SORT"))
+    conn = make_plain_connection(cache)
+    conn._get_capabilities()
+    assert conn.capabilities == ("IMAP4REV1", "SORT")
+    assert not capability_command
+
+
+def test_capabilities_from_command(capability_command):
+    cache = CapabilityCache()
+    conn = make_plain_connection(cache)
+    conn._get_capabilities()
+    assert conn.capabilities == ("IMAP4REV1", "IDLE")
+    assert cache.get("imap.example.com", 143) == ("IMAP4REV1", "IDLE")
+    assert capability_command == [conn]
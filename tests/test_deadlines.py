@@ -0,0 +1,96 @@
+import math
+import socket
+import threading
+import time
+
+import pytest
+
+from pragmail.capabilities import CapabilityCache
+from pragmail.connections import IMAP4Connection
+from pragmail.deadlines import Deadline
+from pragmail.exceptions import DeadlineExceeded, IMAP4Error, catch_exception
+
+
+class SlowServer:
+    """Greets, answers NOOP, and never answers anything else."""
+
+    def __init__(self):
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        conn, _ = self.listener.accept()
+        with conn:
+            conn.sendall(b"* OK [CAPABILITY IMAP4rev1] ready\r\n")
+            for line in conn.makefile("rb"):
+                tag, command = line.split()[:2]
+                if command.upper() == b"NOOP":
+                    conn.sendall(tag + b" OK done\r\n")
+
+    def close(self):
+        self.listener.close()
+
+
+@pytest.fixture
+def connection():
+    server = SlowServer()
+    imap4 = IMAP4Connection(
+        "127.0.0.1",
+        server.port,
+        timeout=10,
+        capability_cache=CapabilityCache(),
+    )
+    yield imap4
+    imap4.shutdown()
+    server.close()
+
+
+def test_deadline():
+    assert Deadline().remaining() == math.inf
+    assert Deadline().timeout(5.0) == 5.0
+    assert Deadline(1.0).timeout(5.0) <= 1.0
+    assert Deadline(10.0).timeout(5.0) == 5.0
+    assert not Deadline(1.0).expired()
+    with pytest.raises(DeadlineExceeded):
+        Deadline(0).timeout()
+
+
+def test_earliest():
+    soon, later = Deadline(1.0), Deadline(10.0)
+    assert later.earliest(soon) is soon
+    assert soon.earliest(later) is soon
+    assert Deadline().earliest(soon) is soon
+    assert soon.earliest(None) is soon
+
+
+def test_catch_exception_keeps_pragmail_errors():
+    @catch_exception
+    def expire():
+        raise DeadlineExceeded("late", partial=[1, 2])
+
+    with pytest.raises(DeadlineExceeded) as err:
+        expire()
+    assert err.value.partial == [1, 2]
+    assert isinstance(err.value, IMAP4Error)
+
+
+def test_connection_deadline(connection):
+    connection.deadline = Deadline(0.2)
+    assert connection.noop()[0] == "OK"
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        connection.capability()
+    assert time.monotonic() - start < 2
+
+
+def test_connection_restores_timeout(connection):
+    connection.deadline = Deadline(5.0)
+    connection.noop()
+    assert connection.sock.gettimeout() <= 5.0
+
+    connection.deadline = None
+    connection.noop()
+    assert connection.sock.gettimeout() == 10
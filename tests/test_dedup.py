@@ -0,0 +1,120 @@
+import pytest
+
+from pragmail.dedup import BloomFilter, Deduplicator, message_key
+from pragmail.utils import parse_sequence_set
+
+# uid -> (Message-ID, size)
+MAILBOXES = {
+    "INBOX": {1: ("<a@example.com>", 100), 2: ("<b@example.com>", 200)},
+    "All Mail": {
+        5: ("<a@example.com>", 100),
+        6: ("<b@example.com>", 999),
+        7: ("<c@example.com>", 300),
+        8: ("<c@example.com>", 300),
+        9: (None, 50),
+    },
+}
+
+
+class FakeIMAP4:
+    def __init__(self, messages):
+        self.messages = messages
+
+    def uid(self, command, *args):
+        if command == "SEARCH":
+            return "OK", [" ".join(map(str, self.messages)).encode()]
+
+        data = []
+        uids = [
+            uid
+            for start, end in parse_sequence_set(args[0])
+            for uid in range(start, end + 1)
+        ]
+        for uid in uids:
+            message_id, size = self.messages[uid]
+            block = b"\r\n"
+            if message_id:
+                block = f"Message-ID: {message_id}\r\n\r\n".encode()
+            meta = f"{uid} (UID {uid} RFC822.SIZE {size} BODY[...] {{1}}"
+            data.extend([(meta.encode(), block), b")"])
+        return "OK", data
+
+
+class FakeClient:
+    _mailbox = None
+
+    def __init__(self):
+        self.downloaded = []
+
+    def select(self, mailbox):
+        self.imap4 = FakeIMAP4(MAILBOXES[mailbox])
+
+    def bulk_fetch(self, uids, **kwargs):
+        for uid in sorted(uids):
+            self.downloaded.append(uid)
+            yield uid, b"message %d" % uid
+
+
+def test_message_key():
+    assert message_key(" <a@b> ", 10) == "<a@b> 10"
+    assert message_key(None, 10) is None
+    assert message_key("", 10) is None
+
+
+def test_bloom_filter(tmp_path):
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for num in range(1000):
+        bloom.add(f"key-{num}")
+    # Items whose bits were all set already aren't counted.
+    assert 990 <= len(bloom) <= 1000
+    assert all(f"key-{num}" in bloom for num in range(1000))
+    false_positives = sum(f"other-{num}" in bloom for num in range(10000))
+    assert false_positives < 300
+
+    path = tmp_path / "seen.bloom"
+    bloom.save(path)
+    loaded = BloomFilter(capacity=5, path=path)
+    assert loaded.capacity == 1000 and len(loaded) == len(bloom)
+    assert "key-1" in loaded and loaded.bits == bloom.bits
+
+
+def test_bloom_filter_rejects_other_files(tmp_path):
+    path = tmp_path / "seen.bloom"
+    path.write_bytes(b"not a filter")
+    with pytest.raises(ValueError):
+        BloomFilter(path=path)
+    with pytest.raises(ValueError):
+        BloomFilter().save()
+
+
+@pytest.mark.parametrize("seen", [None, set()])
+def test_fetch_skips_copies(seen):
+    client = FakeClient()
+    dedup = Deduplicator(seen)
+
+    client.select("INBOX")
+    assert [uid for uid, _ in dedup.fetch(client)] == [1, 2]
+
+    client.select("All Mail")
+    # 5 is a copy of 1, 8 a copy of 7; 6 has a different size and 9 has no
+    # Message-ID.
+    assert [uid for uid, _ in dedup.fetch(client)] == [6, 7, 9]
+    assert client.downloaded == [1, 2, 6, 7, 9]
+    assert dedup.skipped == 2
+
+
+def test_fetch_marks_only_downloaded_messages(tmp_path):
+    client = FakeClient()
+    dedup = Deduplicator(BloomFilter(path=tmp_path / "seen.bloom"))
+    client.select("INBOX")
+
+    # A message is only marked once the next one is requested, i.e. after
+    # the caller stored it.
+    messages = dedup.fetch(client)
+    next(messages)
+    next(messages)
+    messages.close()
+    dedup.save()
+
+    dedup = Deduplicator(BloomFilter(path=tmp_path / "seen.bloom"))
+    assert list(dedup.new_uids(client)) == [2]
@@ -0,0 +1,145 @@
+import csv
+import io
+import json
+import sqlite3
+
+import pytest
+
+from pragmail.exports import (column_name, export_headers, guess_format,
+                              iter_headers, parse_header_fields)
+
+HEADERS = {
+    3: (
+        b"From: John Smith <john@example.com>\r\n"
+        b"To: team@example.com\r\n"
+        b"Subject: =?utf-8?q?Caf=C3=A9?= menu\r\n"
+        b"Message-ID: <3@example.com>\r\n\r\n"
+    ),
+    7: (
+        b"From: jane@example.com\r\n"
+        b"Subject: A long\r\n subject\r\n"
+        b"Date: Mon, 3 Jan 2022 10:00:00 +0000\r\n\r\n"
+    ),
+}
+
+
+class FakeIMAP4:
+    def __init__(self):
+        self.commands = []
+
+    def uid(self, command, *args):
+        self.commands.append((command, *args))
+        if command == "SEARCH":
+            return "OK", [b"3 7"]
+
+        uids = [int(uid) for uid in args[0].replace(":", ",").split(",")]
+        data = []
+        for uid in uids:
+            block = HEADERS[uid]
+            meta = (
+                f"{uid} (UID {uid} RFC822.SIZE {len(block) * 10} "
+                f"BODY[HEADER.FIELDS (FROM)] {{{len(block)}}}"
+            ).encode()
+            data.extend([(meta, block), b")"])
+        return "OK", data
+
+
+class FakeClient:
+    _mailbox = "INBOX"
+
+    def __init__(self):
+        self.imap4 = FakeIMAP4()
+
+
+def test_parse_header_fields():
+    fields = parse_header_fields(HEADERS[3] + b"From: other@example.com\r\n")
+    assert fields["from"] == "John Smith <john@example.com>"
+    assert fields["subject"] == "Café menu"
+    assert parse_header_fields(HEADERS[7])["subject"] == "A long subject"
+
+
+def test_column_name():
+    assert column_name("Message-ID") == "message_id"
+
+
+def test_iter_headers():
+    client = FakeClient()
+    rows = list(iter_headers(client, batch_size=1))
+    assert [row["uid"] for row in rows] == [3, 7]
+    assert rows[0]["mailbox"] == "INBOX"
+    assert rows[0]["subject"] == "Café menu"
+    assert rows[0]["date"] is None
+    assert rows[1]["size"] == len(HEADERS[7]) * 10
+    assert client.imap4.commands[1] == (
+        "FETCH",
+        "3",
+        "(RFC822.SIZE BODY.PEEK[HEADER.FIELDS "
+        "(FROM TO DATE SUBJECT MESSAGE-ID)])",
+    )
+
+
+def test_export_csv():
+    output = io.StringIO()
+    assert export_headers(FakeClient(), output, "csv") == 2
+    rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+    assert rows[0]["message_id"] == "<3@example.com>"
+    assert rows[1]["from"] == "jane@example.com"
+
+
+def test_export_jsonl(tmp_path):
+    path = tmp_path / "headers.jsonl"
+    assert export_headers(FakeClient(), path, fields=["Subject"]) == 2
+    rows = [json.loads(line) for line in path.read_text("utf-8").splitlines()]
+    assert rows[1] == {
+        "mailbox": "INBOX", "uid": 7, "size": len(HEADERS[7]) * 10,
+        "subject": "A long subject",
+    }
+
+
+def test_export_sqlite(tmp_path):
+    path = tmp_path / "headers.sqlite"
+    assert export_headers(FakeClient(), path, batch_size=1) == 2
+    # Exporting again replaces the rows.
+    assert export_headers(FakeClient(), path) == 2
+
+    connection = sqlite3.connect(path)
+    try:
+        mode = connection.execute("PRAGMA journal_mode").fetchone()[0]
+        rows = connection.execute(
+            "SELECT uid, subject FROM headers ORDER BY uid"
+        ).fetchall()
+    finally:
+        connection.close()
+    assert mode == "wal"
+    assert rows == [(3, "Café menu"), (7, "A long subject")]
+
+
+def test_export_sqlite_without_mailbox(tmp_path):
+    path = tmp_path / "headers.sqlite"
+    client = FakeClient()
+    client._mailbox = None
+    assert export_headers(client, path) == 2
+    assert export_headers(client, path) == 2
+
+    client._mailbox = '"Sent Mail"'
+    assert export_headers(client, path) == 2
+    assert export_headers(client, path, mailbox="Sent Mail") == 2
+
+    connection = sqlite3.connect(path)
+    try:
+        rows = connection.execute(
+            "SELECT mailbox, COUNT(*) FROM headers GROUP BY mailbox"
+        ).fetchall()
+    finally:
+        connection.close()
+    assert rows == [("", 2), ("Sent Mail", 2)]
+
+
+def test_guess_format():
+    assert guess_format("out.CSV") == "csv"
+    assert guess_format("out.ndjson") == "jsonl"
+    assert guess_format("out.db") == "sqlite"
+    with pytest.raises(ValueError):
+        guess_format("out.txt")
+    with pytest.raises(ValueError):
+        export_headers(FakeClient(), io.StringIO(), "xml")
@@ -0,0 +1,201 @@
+from datetime import datetime, timezone
+
+from pragmail.flags import FLAGGED, SEEN, FlagIndex
+
+
+def fetch_line(uid, flags, day=None, modseq=None):
+    line = f"{uid} (UID {uid} FLAGS ({flags})"
+    if day is not None:
+        line += f' INTERNALDATE "{day:02d}-Jan-2022 10:00:00 +0000"'
+    if modseq is not None:
+        line += f" MODSEQ ({modseq})"
+    return (line + ")").encode()
+
+
+def timestamp(day):
+    return datetime(2022, 1, day, 10, tzinfo=timezone.utc).timestamp()
+
+
+class FakeIMAP4:
+    def __init__(self, messages, capabilities=("IMAP4REV1",)):
+        # uid -> (flags, day, modseq)
+        self.messages = messages
+        self.capabilities = capabilities
+        self.uidvalidity = 1
+        self.commands = []
+
+    def select(self, mailbox, readonly=False):
+        return "OK", [str(len(self.messages)).encode()]
+
+    def response(self, code):
+        return code, [str(self.uidvalidity).encode()]
+
+    def uid(self, command, *args):
+        self.commands.append((command, *args))
+        uids = sorted(self.messages)
+        if command == "SEARCH":
+            return "OK", [" ".join(map(str, uids)).encode()]
+
+        start, _, end = args[0].partition(":")
+        end = uids[-1] if end == "*" else int(end)
+        selected = [uid for uid in uids if int(start) <= uid <= end]
+        if not selected and end == uids[-1]:
+            selected = uids[-1:]
+
+        changedsince = 0
+        if len(args) > 2:
+            changedsince = int(args[2].strip("()").split()[1])
+
+        data = []
+        for uid in selected:
+            flags, day, modseq = self.messages[uid]
+            if modseq <= changedsince:
+                continue
+            data.append(
+                fetch_line(
+                    uid,
+                    flags,
+                    day if "INTERNALDATE" in args[1] else None,
+                    modseq if "MODSEQ" in args[1] else None,
+                )
+            )
+        return "OK", data or [None]
+
+
+class FakeClient:
+    def __init__(self, imap4):
+        self.imap4 = imap4
+
+    def select(self, mailbox):
+        return self.imap4.select(mailbox, readonly=True)
+
+
+def make_index():
+    index = FlagIndex()
+    index.update(1, ["\\Seen"], timestamp(1))
+    index.update(2, [], timestamp(2))
+    index.update(3, ["\\Seen", "\\Flagged"], timestamp(3))
+    index.update(4, ["$Work"], timestamp(4))
+    return index
+
+
+def test_query():
+    index = make_index()
+    assert len(index) == 4
+    assert index.query(with_flags=[SEEN]) == [1, 3]
+    assert index.query(without_flags=[SEEN]) == [2, 4]
+    assert index.query(with_flags=["\\seen"], without_flags=[FLAGGED]) == [1]
+    assert index.query(with_flags=["$work"]) == [4]
+    assert index.query(with_flags=["\\Draft"]) == []
+    assert index.count(without_flags=[SEEN]) == 2
+
+
+def test_query_dates():
+    index = make_index()
+    since = datetime(2022, 1, 2, tzinfo=timezone.utc)
+    assert index.query(since=since) == [2, 3, 4]
+    assert index.query(without_flags=[SEEN], since=since) == [2, 4]
+    assert index.query(since=timestamp(2), before=timestamp(4)) == [2, 3]
+
+    # Out-of-order dates fall back to a scan.
+    index.update(5, [], timestamp(1))
+    assert index.query(before=timestamp(2)) == [1, 5]
+
+
+def test_update_replaces_flags():
+    index = make_index()
+    index.update(2, ["\\Seen"])
+    index.update(3, [])
+    assert index.query(with_flags=[SEEN]) == [1, 2]
+    assert index.query(with_flags=[FLAGGED]) == []
+    assert index.query(since=timestamp(2), before=timestamp(3)) == [2]
+
+
+def test_insert_and_remove():
+    index = make_index()
+    index.update(20, ["\\Seen"], timestamp(5))
+    index.update(10, ["\\Flagged"], timestamp(5))
+    assert list(index.uids) == [1, 2, 3, 4, 10, 20]
+    assert index.query(with_flags=[FLAGGED]) == [3, 10]
+    assert index.query(with_flags=[SEEN]) == [1, 3, 20]
+
+    index.remove([1, 10, 99])
+    assert list(index.uids) == [2, 3, 4, 20]
+    assert index.query(with_flags=[SEEN]) == [3, 20]
+    assert index.query(with_flags=[FLAGGED]) == [3]
+    assert 10 not in index and 20 in index
+
+
+def test_many_messages():
+    index = FlagIndex()
+    for uid in range(1, 10_001):
+        index.update(uid, ["\\Seen"] if uid % 3 else [], float(uid))
+    assert index.count(without_flags=[SEEN]) == 3333
+    assert index.query(without_flags=[SEEN], since=9990.0) == [
+        9990,
+        9993,
+        9996,
+        9999,
+    ]
+
+
+def test_update_date_out_of_order():
+    index = FlagIndex()
+    for uid, date in ((1, 100.0), (2, 200.0), (3, 300.0)):
+        index.update(uid, [], date)
+    index.update(1, [], 400.0)
+    assert index.query(since=350.0) == [1]
+    assert index.query(before=250.0) == [2]
+
+
+def test_sync():
+    messages = {
+        1: ("\\Seen", 1, 1),
+        2: ("", 2, 2),
+        3: ("\\Flagged", 3, 3),
+    }
+    imap4 = FakeIMAP4(messages)
+    index = FlagIndex()
+    index.sync(FakeClient(imap4))
+    assert list(index.uids) == [1, 2, 3]
+    assert index.query(without_flags=[SEEN], since=timestamp(2)) == [2, 3]
+
+    messages[2] = ("\\Seen", 2, 4)
+    messages[4] = ("", 4, 5)
+    del messages[1]
+    imap4.commands.clear()
+    index.sync(FakeClient(imap4))
+    assert list(index.uids) == [2, 3, 4]
+    assert index.query(with_flags=[SEEN]) == [2]
+    assert index.dates[-1] == timestamp(4)
+    assert imap4.commands[0] == ("FETCH", "1:3", "(FLAGS)")
+    assert imap4.commands[-1] == ("SEARCH", "ALL")
+
+
+def test_sync_condstore():
+    messages = {1: ("\\Seen", 1, 7), 2: ("", 2, 8)}
+    imap4 = FakeIMAP4(messages, ("IMAP4REV1", "CONDSTORE"))
+    index = FlagIndex()
+    index.sync(FakeClient(imap4))
+    assert index.highestmodseq == 8
+
+    messages[1] = ("", 1, 9)
+    imap4.commands.clear()
+    index.sync(FakeClient(imap4))
+    assert imap4.commands[0] == (
+        "FETCH", "1:2", "(FLAGS MODSEQ)", "(CHANGEDSINCE 8)"
+    )
+    assert index.query(without_flags=[SEEN]) == [1, 2]
+    assert index.highestmodseq == 9
+
+
+def test_sync_uidvalidity_change():
+    imap4 = FakeIMAP4({1: ("\\Seen", 1, 1), 2: ("", 2, 2)})
+    index = FlagIndex()
+    index.sync(FakeClient(imap4))
+
+    imap4.uidvalidity = 2
+    imap4.messages = {7: ("", 3, 1)}
+    index.sync(FakeClient(imap4))
+    assert index.uidvalidity == 2
+    assert list(index.uids) == [7]
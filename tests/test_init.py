@@ -0,0 +1,60 @@
+import subprocess
+import sys
+
+import pytest
+
+import pragmail
+
+# Modules that must not be loaded by a bare `import pragmail`.
+HEAVY_MODULES = (
+    "email.parser",
+    "email.policy",
+    "imaplib",
+    "pragmail.clients",
+    "pragmail.transports",
+    "pragmail.utils",
+    "ssl",
+    "subprocess",
+    "urllib.request",
+)
+
+
+def run_python(code: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stderr
+
+
+def test_import_does_not_load_heavy_modules():
+    trace = run_python("import pragmail")
+    imported = {line.split("|")[-1].strip() for line in trace.splitlines()}
+    assert not imported.intersection(HEAVY_MODULES)
+
+
+def test_import_utils_does_not_load_heavy_modules():
+    trace = run_python("import pragmail.utils")
+    imported = {line.split("|")[-1].strip() for line in trace.splitlines()}
+    assert not imported.intersection(set(HEAVY_MODULES) - {"pragmail.utils"})
+
+
+def test_lazy_attributes_resolve():
+    from pragmail import clients, exceptions, transports, utils
+
+    assert pragmail.Client is clients.Client
+    assert pragmail.IMAP4Error is exceptions.IMAP4Error
+    assert pragmail.CommandError is exceptions.CommandError
+    assert pragmail.TransportUtils is transports.TransportUtils
+    assert pragmail.save_to_disk is transports.save_to_disk
+    assert pragmail.utils is utils
+
+
+def test_lazy_attributes_listed_in_dir():
+    assert set(pragmail.__all__) <= set(dir(pragmail))
+
+
+def test_unknown_attribute_raises():
+    with pytest.raises(AttributeError, match="has no attribute 'foo'"):
+        pragmail.foo
@@ -0,0 +1,91 @@
+import threading
+import time
+
+import pytest
+
+from pragmail.pipeline import Pipeline
+
+
+def double(item):
+    return item * 2
+
+
+def test_stages_run_in_order():
+    pipeline = Pipeline(range(10))
+    pipeline.stage(double).stage(str)
+    assert list(pipeline) == [str(i * 2) for i in range(10)]
+
+
+def test_without_stages():
+    assert list(Pipeline(iter("abc"))) == ["a", "b", "c"]
+
+
+def test_workers_process_every_item():
+    threads = set()
+
+    def work(item):
+        threads.add(threading.current_thread().name)
+        time.sleep(0.01)
+        return item
+
+    pipeline = Pipeline(range(40), maxsize=4).stage(work, workers=4)
+    assert sorted(pipeline) == list(range(40))
+    assert len(threads) > 1
+
+
+def test_processes():
+    pipeline = Pipeline(range(20)).stage(double, workers=2, processes=True)
+    assert sorted(pipeline) == [i * 2 for i in range(20)]
+
+
+def test_backpressure():
+    produced = []
+
+    def source():
+        for item in range(100):
+            produced.append(item)
+            yield item
+
+    def slow(item):
+        time.sleep(0.05)
+        return item
+
+    pipeline = Pipeline(source(), maxsize=2).stage(slow)
+    results = iter(pipeline)
+    next(results)
+    time.sleep(0.2)
+    # The source may only run ahead by the capacity of the queues.
+    assert len(produced) <= 8
+    results.close()
+
+
+@pytest.mark.parametrize("where", ["source", "stage"])
+def test_errors_are_raised(where):
+    def source():
+        yield 1
+        if where == "source":
+            raise OSError("connection lost")
+        yield 2
+
+    def check(item):
+        if where == "stage" and item == 2:
+            raise ValueError("bad message")
+        return item
+
+    pipeline = Pipeline(source()).stage(check, workers=2)
+    with pytest.raises((OSError, ValueError)):
+        pipeline.run()
+
+
+def test_run_once():
+    pipeline = Pipeline(range(3))
+    assert pipeline.run() == 3
+    with pytest.raises(RuntimeError):
+        pipeline.run()
+    with pytest.raises(RuntimeError):
+        pipeline.stage(double)
+
+
+def test_invalid_workers():
+    with pytest.raises(ValueError):
+        Pipeline(range(3)).stage(double, workers=0)
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from pragmail.prefetch import readahead
+
+
+def test_yields_items_in_order():
+    assert list(readahead(iter(range(100)), depth=3)) == list(range(100))
+
+
+def test_stays_depth_items_ahead():
+    produced = []
+
+    def source():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    items = readahead(source(), depth=2)
+    assert next(items) == 0
+    time.sleep(0.05)
+    # One item was handed out, two are waiting and one is blocked.
+    assert len(produced) == 4
+    items.close()
+
+
+def test_respects_byte_budget():
+    produced = []
+
+    def source():
+        for size in (4, 4, 4, 10, 1):
+            produced.append(size)
+            yield b"x" * size
+
+    items = readahead(source(), depth=10, max_bytes=8)
+    assert next(items) == b"xxxx"
+    time.sleep(0.05)
+    assert len(produced) == 4
+    # Items larger than the budget still go through.
+    assert [len(item) for item in items] == [4, 4, 10, 1]
+
+
+def test_overlaps_production_and_consumption():
+    def source():
+        for i in range(5):
+            time.sleep(0.05)
+            yield i
+
+    start = time.monotonic()
+    for _ in readahead(source(), depth=5):
+        time.sleep(0.05)
+    # Sequentially it would take 0.5 seconds.
+    assert time.monotonic() - start < 0.45
+
+
+def test_reraises_errors_after_previous_items():
+    def source():
+        yield 1
+        yield 2
+        raise RuntimeError("boom")
+
+    items = readahead(source())
+    assert next(items) == 1
+    assert next(items) == 2
+    with pytest.raises(RuntimeError, match="boom"):
+        next(items)
+
+
+def test_close_stops_the_thread():
+    def source():
+        i = 0
+        while True:
+            yield i
+            i += 1
+
+    before = threading.active_count()
+    items = readahead(source(), depth=1)
+    next(items)
+    items.close()
+    assert threading.active_count() == before
+
+
+def test_invalid_depth():
+    with pytest.raises(ValueError):
+        next(readahead([1], depth=0))
@@ -0,0 +1,103 @@
+import io
+from imaplib import IMAP4
+
+import pytest
+
+import pragmail
+from pragmail import transports
+from pragmail.profiling import ProfileReport, profile
+
+MESSAGE = (
+    "From: Some One <someone@example.com>\n"
+    "Content-Type: text/plain\n"
+    "\n"
+    "this is the body text\n"
+)
+
+
+@pytest.fixture
+def fake_commands(monkeypatch):
+    tags = iter(range(100))
+    monkeypatch.setattr(
+        IMAP4, "_command", lambda self, name, *args: next(tags)
+    )
+    monkeypatch.setattr(
+        IMAP4, "_command_complete", lambda self, name, tag: ("OK", [b""])
+    )
+    return IMAP4.__new__(IMAP4)
+
+
+def test_disabled_profile_does_not_instrument(monkeypatch):
+    monkeypatch.delenv("PRAGMAIL_PROFILE", raising=False)
+    read_message = transports.TransportUtils.__dict__["read_message"]
+    with profile() as report:
+        assert transports.TransportUtils.__dict__["read_message"] is (
+            read_message
+        )
+    assert not report.enabled
+    assert report.format() == "Profiling was disabled.\n"
+
+
+def test_profile_enabled_by_environment(monkeypatch):
+    monkeypatch.setenv("PRAGMAIL_PROFILE", "1")
+    with pragmail.profile() as report:
+        pass
+    assert report.enabled
+
+
+def test_profile_collects_measurements(tmp_path, fake_commands):
+    imap4 = fake_commands
+    output = io.StringIO()
+    read_message = transports.TransportUtils.__dict__["read_message"]
+    save_to_disk = transports.save_to_disk
+
+    with profile(enabled=True, output=output) as report:
+        imap4._simple_command("NOOP")
+        imap4._simple_command("UID", "FETCH", "1", "(RFC822)")
+        transports.save_to_disk(MESSAGE, str(tmp_path / "message.txt"))
+        transports.TransportUtils.read_message(MESSAGE)
+
+    assert set(report.commands) == {"NOOP", "UID FETCH"}
+    assert len(report.functions["read_message"]) == 2
+    assert len(report.functions["save_to_disk"]) == 1
+    assert len(report.allocations["read_message"]) == 1
+    assert len(report.allocations["save_to_disk"]) == 1
+    assert report.stats is not None
+    assert "UID FETCH" in output.getvalue()
+    assert "Peak allocations per message" in output.getvalue()
+
+    assert transports.TransportUtils.__dict__["read_message"] is read_message
+    assert transports.save_to_disk is save_to_disk
+
+
+def test_nested_profiles_raise():
+    with profile(enabled=True):
+        with pytest.raises(RuntimeError):
+            with profile(enabled=True):
+                pass
+
+
+def test_report_write(tmp_path):
+    report = ProfileReport()
+    report.add_command("NOOP", 0.5)
+    report.write(tmp_path / "report.txt")
+    assert "NOOP" in (tmp_path / "report.txt").read_text()
+
+
+def test_profile_does_not_leak_through_package_attributes(
+    tmp_path, monkeypatch
+):
+    monkeypatch.delitem(pragmail.__dict__, "save_to_disk", raising=False)
+    save_to_disk = transports.save_to_disk
+
+    with profile(enabled=True) as report:
+        lazy_save_to_disk = pragmail.save_to_disk
+        save_to_disk(MESSAGE, str(tmp_path / "before.txt"))
+
+    assert pragmail.save_to_disk is transports.save_to_disk
+    assert lazy_save_to_disk is save_to_disk
+    # References resolved before the block were profiled too.
+    assert len(report.functions["save_to_disk"]) == 1
+
+    lazy_save_to_disk(MESSAGE, str(tmp_path / "after.txt"))
+    assert len(report.functions["save_to_disk"]) == 1
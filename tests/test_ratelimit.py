@@ -0,0 +1,135 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from pragmail.capabilities import CapabilityCache
+from pragmail.connections import IMAP4Connection
+from pragmail.deadlines import Deadline
+from pragmail.exceptions import DeadlineExceeded
+from pragmail.ratelimit import (TokenBucket, clear_rate_limits, get_rate_limit,
+                                set_rate_limit)
+
+
+class NoopServer:
+    """Greets, answers every command with OK and serves a literal on FETCH."""
+
+    def __init__(self, literal=b""):
+        self.literal = literal
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.port = self.listener.getsockname()[1]
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        conn, _ = self.listener.accept()
+        with conn:
+            conn.sendall(b"* OK [CAPABILITY IMAP4rev1] ready\r\n")
+            for line in conn.makefile("rb"):
+                tag, command = line.split()[:2]
+                if command.upper() == b"FETCH":
+                    conn.sendall(
+                        b"* 1 FETCH (BODY[] {%d}\r\n" % len(self.literal)
+                        + self.literal
+                        + b")\r\n"
+                    )
+                conn.sendall(tag + b" OK done\r\n")
+
+    def close(self):
+        self.listener.close()
+
+
+@pytest.fixture(autouse=True)
+def no_limits():
+    clear_rate_limits()
+    yield
+    clear_rate_limits()
+
+
+def connect(server):
+    return IMAP4Connection(
+        "127.0.0.1",
+        server.port,
+        timeout=10,
+        capability_cache=CapabilityCache(),
+    )
+
+
+def test_bucket_allows_bursts_then_paces():
+    bucket = TokenBucket(rate=10, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0, 0, 0]
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+def test_bucket_goes_into_debt():
+    bucket = TokenBucket(rate=100, burst=10)
+    assert bucket.reserve(50) == pytest.approx(0.4, abs=0.01)
+    assert bucket.reserve(1) == pytest.approx(0.41, abs=0.01)
+
+
+def test_bucket_max_wait():
+    bucket = TokenBucket(rate=1)
+    assert bucket.reserve() == 0
+    assert bucket.reserve(max_wait=0.5) is None
+    # Nothing was taken by the refused reservation.
+    assert bucket.reserve(max_wait=1.5) == pytest.approx(1, abs=0.01)
+
+
+def test_bucket_acquire_honors_deadline():
+    bucket = TokenBucket(rate=1)
+    bucket.acquire()
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        bucket.acquire(deadline=Deadline(0.1))
+    assert time.monotonic() - start < 0.1
+
+
+def test_bucket_invalid_rate():
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+    with pytest.raises(ValueError):
+        TokenBucket(1, burst=0)
+
+
+def test_set_rate_limit():
+    limit = set_rate_limit("IMAP.example.com", commands=5)
+    assert get_rate_limit("imap.example.com") is limit
+    assert limit.commands.rate == 5
+    assert limit.bandwidth is None
+    assert set_rate_limit("imap.example.com") is None
+    assert get_rate_limit("imap.example.com") is None
+    assert get_rate_limit(None) is None
+
+
+def test_connection_paces_commands():
+    server = NoopServer()
+    imap4 = connect(server)
+    try:
+        set_rate_limit("127.0.0.1", commands=20, command_burst=1)
+        start = time.monotonic()
+        for _ in range(5):
+            assert imap4.noop()[0] == "OK"
+        assert time.monotonic() - start >= 0.19
+    finally:
+        imap4.shutdown()
+        server.close()
+
+
+def test_connection_shapes_bandwidth():
+    server = NoopServer(literal=b"x" * 20_000)
+    imap4 = connect(server)
+    try:
+        set_rate_limit("127.0.0.1", bandwidth=100_000, bandwidth_burst=5_000)
+        imap4.state = "SELECTED"
+        start = time.monotonic()
+        typ, data = imap4.fetch("1", "(BODY[])")
+        elapsed = time.monotonic() - start
+        assert typ == "OK"
+        assert data[0][1] == b"x" * 20_000
+        # 15,000 bytes over the burst, at 100,000 bytes per second.
+        assert 0.14 <= elapsed < 1
+    finally:
+        imap4.shutdown()
+        server.close()
@@ -0,0 +1,110 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from pragmail import IMAP4Error
+from pragmail.shared import SharedClient
+
+
+class FakeClient:
+    def __init__(self):
+        self.threads = set()
+        self.logged_out = False
+        self.host = "imap.example.com"
+
+    def select(self, mailbox):
+        self.threads.add(threading.get_ident())
+        return "OK", [mailbox.encode()]
+
+    def bulk_fetch(self, uids):
+        self.threads.add(threading.get_ident())
+        for uid in uids:
+            yield uid, b"data"
+
+    def fail(self):
+        raise ValueError("bad command")
+
+    def logout(self):
+        self.logged_out = True
+        return True
+
+
+def test_commands_run_in_io_thread():
+    client = FakeClient()
+    with SharedClient(client) as shared:
+        futures = [shared.select(f"box{idx}") for idx in range(10)]
+        assert [f.result() for f in futures] == [
+            ("OK", [f"box{idx}".encode()]) for idx in range(10)
+        ]
+        messages = shared.call("bulk_fetch", [1, 2])
+        assert messages == [(1, b"data"), (2, b"data")]
+
+    assert client.threads and threading.get_ident() not in client.threads
+    assert len(client.threads) == 1
+    assert client.logged_out
+
+
+def test_commands_from_many_threads():
+    client = FakeClient()
+    shared = SharedClient(client)
+    results = []
+
+    def worker(idx):
+        results.append(shared.select(str(idx)).result())
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    shared.close(logout=False)
+
+    assert len(results) == 8
+    assert len(client.threads) == 1
+    assert not client.logged_out
+
+
+def test_submit_callable():
+    shared = SharedClient(FakeClient())
+    future = shared.submit(lambda client, suffix: client.host + suffix, "!")
+    assert isinstance(future, Future)
+    assert future.result() == "imap.example.com!"
+    shared.close()
+
+
+def test_exceptions_are_set_on_future():
+    shared = SharedClient(FakeClient())
+    with pytest.raises(ValueError, match="bad command"):
+        shared.fail().result()
+    shared.close()
+
+
+def test_closed_client_rejects_commands():
+    shared = SharedClient(FakeClient())
+    shared.close()
+    with pytest.raises(IMAP4Error):
+        shared.select("INBOX")
+
+
+def test_close_raises_logout_errors():
+    client = FakeClient()
+
+    def logout():
+        raise IMAP4Error("connection lost")
+
+    client.logout = logout
+    shared = SharedClient(client)
+    with pytest.raises(IMAP4Error, match="connection lost"):
+        shared.close()
+    # Closing again doesn't log out again.
+    shared.close()
+
+
+def test_private_and_unknown_attributes():
+    shared = SharedClient(FakeClient())
+    with pytest.raises(AttributeError):
+        shared.host
+    with pytest.raises(AttributeError):
+        shared._private
+    shared.close()
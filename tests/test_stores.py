@@ -0,0 +1,76 @@
+import sqlite3
+
+from pragmail.stores import SQLiteStore
+
+MESSAGE = (
+    b"From: Some One <someone@example.com>\r\n"
+    b"To: team@example.com\r\n"
+    b"Subject: =?utf-8?q?Caf=C3=A9?=\r\n"
+    b"Message-ID: <1@example.com>\r\n"
+    b"MIME-Version: 1.0\r\n"
+    b'Content-Type: multipart/mixed; boundary="XX"\r\n'
+    b"\r\n"
+    b"--XX\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"\r\n"
+    + b"this is the body text\r\n" * 40
+    + b"--XX\r\n"
+    b"Content-Type: application/octet-stream\r\n"
+    b"Content-Disposition: attachment; filename=data.bin\r\n"
+    b"Content-Transfer-Encoding: base64\r\n"
+    b"\r\n"
+    b"AAEC/w==\r\n"
+    b"--XX--\r\n"
+)
+
+
+def test_add_and_get(tmp_path):
+    with SQLiteStore(tmp_path / "store.sqlite", batch_size=10) as store:
+        store.add(1, MESSAGE)
+        store.add(2, [(b"2 (UID 2 RFC822 {4}", b"Hi\r\n"), b")"], "Sent")
+        assert len(store) == 2
+
+        stored = store.get(1)
+        assert stored.raw == MESSAGE
+        assert stored.subject == "Café"
+        assert stored.sender == "Some One <someone@example.com>"
+        assert stored.size == len(MESSAGE)
+        assert store.get(2, "Sent").raw == b"Hi\r\n"
+        assert store.get(2) is None
+
+        assert store.get_attachments(1) == [
+            ("data.bin", "application/octet-stream", b"\x00\x01\x02\xff")
+        ]
+        assert [m.uid for m in store.get_by_message_id("<1@example.com>")] \
+            == [1]
+
+
+def test_batches_and_compression(tmp_path):
+    path = tmp_path / "store.sqlite"
+    store = SQLiteStore(path, batch_size=2)
+    store.add(1, MESSAGE)
+
+    reader = sqlite3.connect(path)
+    try:
+        assert reader.execute("SELECT COUNT(*) FROM messages").fetchone() \
+            == (0,)
+        store.add(2, MESSAGE)
+        compressed, raw = reader.execute(
+            "SELECT compressed, raw FROM messages WHERE uid = 1"
+        ).fetchone()
+        mode = reader.execute("PRAGMA journal_mode").fetchone()[0]
+    finally:
+        reader.close()
+        store.close()
+
+    assert compressed == 1 and len(raw) < len(MESSAGE)
+    assert mode == "wal"
+
+
+def test_replace_message(tmp_path):
+    with SQLiteStore(tmp_path / "s.sqlite", compress=False) as store:
+        store.add(1, MESSAGE)
+        store.add(1, b"Subject: other\r\n\r\nbody\r\n")
+        assert len(store) == 1
+        assert store.get(1).subject == "other"
+        assert store.get_attachments(1) == []
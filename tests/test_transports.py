@@ -1,11 +1,16 @@
+import io
 import os
 import shutil
+import tarfile
+import zipfile
 from email.message import EmailMessage, Message, MIMEPart
 from pathlib import Path
 
 import pytest
 
-from pragmail import TransportUtils, save_to_disk
+from pragmail import TransportUtils, save_to_archive, save_to_disk
+from pragmail.transports import (TRIAGE_POLICY, ArchiveSink, CacheInfo,
+                                 FileWriter, ParseCache)
 
 # fmt: off
 MIME_MESSAGE_ATTM = (
@@ -65,6 +70,61 @@ MIME_MESSAGE = (
                 '\n'
                 '--XXXXboundary text--'
                 )
+
+MIME_MESSAGE_LINKS = (
+                    b'From: Some One <someone@example.com>\n'
+                    b'MIME-Version: 1.0\n'
+                    b'Content-Type: multipart/alternative; boundary="XXXX"\n'
+                    b'\n'
+                    b'--XXXX\n'
+                    b'Content-Type: text/plain; charset=utf-8\n'
+                    b'Content-Transfer-Encoding: base64\n'
+                    b'\n'
+                    b'U2VlIGh0dHBzOi8vZXhhbXBsZS5jb20vcGxhaW4u\n'
+                    b'--XXXX\n'
+                    b'Content-Type: text/html; charset=utf-8\n'
+                    b'Content-Transfer-Encoding: quoted-printable\n'
+                    b'\n'
+                    b'<a href=3D"https://example.com/@user/a-long-articl=\n'
+                    b'e-title?a=3D1&amp;b=3D2">article</a>\n'
+                    b"<A HREF=3D'/relative'>relative</A>\n"
+                    b'--XXXX\n'
+                    b'Content-Type: text/html; charset=utf-16\n'
+                    b'Content-Transfer-Encoding: base64\n'
+                    b'\n'
+                    b'//48AGEAIABoAHIAZQBmAD0AIgAvAHUAdABmADEANgAiAD4A\n'
+                    b'--XXXX\n'
+                    b'Content-Type: text/html\n'
+                    b'Content-Disposition: attachment; filename="a.html"\n'
+                    b'\n'
+                    b'<a href="/attachment">attachment</a>\n'
+                    b'--XXXX--\n'
+                    )
+
+MIME_MESSAGE_MIXED_ATTM = (
+                    'From: Some One <someone@example.com>\n'
+                    'MIME-Version: 1.0\n'
+                    'Content-Type: multipart/mixed; boundary="XXXX"\n'
+                    '\n'
+                    '--XXXX\n'
+                    'Content-Type: application/pdf\n'
+                    'Content-Disposition: attachment; filename="report.PDF"\n'
+                    'Content-Transfer-Encoding: base64\n'
+                    '\n'
+                    'JVBERi0xLjQgcmVwb3J0\n'
+                    '--XXXX\n'
+                    'Content-Type: image/png\n'
+                    'Content-Disposition: inline; filename="logo.png"\n'
+                    'Content-Transfer-Encoding: base64\n'
+                    '\n'
+                    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlE\n'
+                    '--XXXX\n'
+                    'Content-Type: text/csv\n'
+                    'Content-Disposition: attachment; filename="data.csv"\n'
+                    '\n'
+                    'a,b\n'
+                    '--XXXX--\n'
+                    )
 # fmt: on
 
 
@@ -123,6 +183,61 @@ class TestTransportUtils(TransportUtils):
             with pytest.raises(TypeError):
                 self.read_message(typ, _class=Message)
 
+    def test_read_message_triage_policy(self):
+        msg = self.read_message(
+            b"Subject: =?utf-8?q?Caf=C3=A9?=\r\n\r\nbody",
+            headersonly=True,
+            _class=Message,
+            policy=TRIAGE_POLICY,
+        )
+        assert msg["Subject"] == "=?utf-8?q?Caf=C3=A9?="
+
+    def test_read_headers(self):
+        message = (
+            b"From: =?utf-8?q?Andr=C3=A9?= <andre@example.com>\r\n"
+            b"Subject: A long\r\n =?utf-8?q?Caf=C3=A9?=\r\n"
+            b"Received: first\r\n"
+            b"Received: second\r\n\r\nbody"
+        )
+        assert self.read_headers(message) == {
+            "from": "André <andre@example.com>",
+            "subject": "A long Café",
+            "received": "first",
+        }
+        assert self.read_headers(
+            [(b"1 (BODY[HEADER] {20}", message)], ["SUBJECT"]
+        ) == {"subject": "A long Café"}
+
+    def test_read_headers_raw_utf8(self):
+        message = "Subject: Café raw\r\nTo: Zoë <z@example.com>\r\n\r\n"
+        assert self.read_headers(message.encode("utf-8")) == {
+            "subject": "Café raw",
+            "to": "Zoë <z@example.com>",
+        }
+
+    def test_read_message_uses_cache(self):
+        cache = ParseCache()
+        msg = self.read_message(MIME_MESSAGE.encode(), cache=cache)
+        assert self.read_message(MIME_MESSAGE.encode(), cache=cache) is msg
+        assert self.read_message(MIME_MESSAGE, cache=cache) is not msg
+        assert self.read_message(
+            MIME_MESSAGE.encode(), headersonly=True, cache=cache
+        ) is not msg
+        assert cache.info() == CacheInfo(1, 3, 3, 3 * len(MIME_MESSAGE))
+
+    def test_parse_cache_evicts_least_recently_used(self):
+        raw = [f"Subject: {idx}\n\nbody".encode() for idx in range(3)]
+        cache = ParseCache(maxsize=2 * len(raw[0]))
+        first = self.read_message(raw[0], cache=cache)
+        second = self.read_message(raw[1], cache=cache)
+        assert self.read_message(raw[0], cache=cache) is first
+        self.read_message(raw[2], cache=cache)
+        assert len(cache) == 2
+        assert self.read_message(raw[0], cache=cache) is first
+        assert self.read_message(raw[1], cache=cache) is not second
+        cache.clear()
+        assert cache.info() == CacheInfo(0, 0, 0, 0)
+
     def test_xtract_attachments_returns_dict(self):
         attm = self.xtract_attachments(self.read_message(MIME_MESSAGE))
         expected_info = {
@@ -134,6 +249,61 @@ class TestTransportUtils(TransportUtils):
         }
         assert attm == expected_info
 
+    def test_xtract_attachments_filters_ctypes(self):
+        msg = self.read_message(MIME_MESSAGE_MIXED_ATTM)
+        attm = self.xtract_attachments(
+            msg, decode=True, ctypes=("application/pdf", "text/*")
+        )
+        assert [item["filename"] for item in attm.values()] == [
+            "report.PDF",
+            "data.csv",
+        ]
+        assert attm["attachment_0"]["buffer"] == b"%PDF-1.4 report"
+
+    def test_xtract_attachments_filters_filename(self):
+        msg = self.read_message(MIME_MESSAGE_MIXED_ATTM)
+        attm = self.xtract_attachments(msg, filename_pattern="*.pdf")
+        assert list(attm) == ["attachment_0"]
+
+    def test_xtract_attachments_filters_size(self):
+        msg = self.read_message(MIME_MESSAGE_MIXED_ATTM)
+        attm = self.xtract_attachments(msg, max_size=20)
+        assert list(attm) == ["attachment_0", "attachment_2"]
+
+    def test_xtract_attachments_ignores_declared_size(self):
+        lying = MIME_MESSAGE_MIXED_ATTM.replace(
+            'filename="report.PDF"', 'filename="report.PDF"; size=1'
+        )
+        msg = self.read_message(lying)
+        assert "attachment_0" not in self.xtract_attachments(msg, max_size=10)
+
+        bragging = MIME_MESSAGE_MIXED_ATTM.replace(
+            'filename="data.csv"', 'filename="data.csv"; size=99999'
+        )
+        msg = self.read_message(bragging)
+        assert list(self.xtract_attachments(msg, max_size=20)) == [
+            "attachment_0"
+        ]
+
+    def test_xtract_attachments_skips_decoding(self, monkeypatch):
+        decoded = []
+        get_payload = MIMEPart.get_payload
+
+        def spy(part, *args, **kwargs):
+            if kwargs.get("decode"):
+                decoded.append(part.get_content_type())
+            return get_payload(part, *args, **kwargs)
+
+        monkeypatch.setattr(MIMEPart, "get_payload", spy)
+        msg = self.read_message(MIME_MESSAGE_MIXED_ATTM)
+        self.xtract_attachments(msg, decode=True, ctypes=("text/csv",))
+        assert decoded == ["text/csv"]
+
+    def test_attachment_size(self):
+        msg = self.read_message(MIME_MESSAGE_MIXED_ATTM)
+        sizes = [self.attachment_size(p) for p in msg.iter_attachments()]
+        assert sizes == [15, 39, 3]
+
     def test_xtract_headers_returns_list(self):
         msg = self.read_message(MIME_MESSAGE.encode())
         hed = self.xtract_headers(msg)
@@ -155,6 +325,20 @@ class TestTransportUtils(TransportUtils):
         cont = self.xtract_payload(msg)
         assert cont is None
 
+    def test_xtract_links(self):
+        msg = self.read_message(MIME_MESSAGE_LINKS)
+        assert list(self.xtract_links(msg)) == [
+            "https://example.com/plain",
+            "https://example.com/@user/a-long-article-title?a=1&b=2",
+            "/relative",
+            "/utf16",
+        ]
+
+    def test_xtract_links_filters_content_types(self):
+        msg = self.read_message(MIME_MESSAGE_LINKS)
+        links = self.xtract_links(msg, ("text/plain",))
+        assert list(links) == ["https://example.com/plain"]
+
     def test_save_attachments_text_IO(self):
         try:
             msg = self.read_message(MIME_MESSAGE)
@@ -247,3 +431,144 @@ def test_save_to_disk():
 
         if os.path.isdir(dirpath):
             shutil.rmtree(dirpath)
+
+
+def test_save_to_archive_zip(tmp_path):
+    archive = tmp_path / "inbox.zip"
+    save_to_archive([("1.txt", MIME_MESSAGE), ("2", MIME_MESSAGE)], archive)
+    with zipfile.ZipFile(archive) as zfile:
+        assert zfile.namelist() == [
+            "1.txt",
+            "1/test.txt",
+            "2.txt",
+            "2/test.txt",
+        ]
+        assert zfile.read("1.txt") == (
+            b"Content-Type: text/plain\n\nthis is the body text\n"
+        )
+        assert zfile.read("2/test.txt") == b"this is the attachment text"
+
+
+@pytest.mark.parametrize("suffix", [".tar", ".tar.gz", ".tgz", ".tar.xz"])
+def test_save_to_archive_tar(tmp_path, suffix):
+    archive = tmp_path / f"inbox{suffix}"
+    save_to_archive([("1.txt", MIME_MESSAGE)], archive)
+    with tarfile.open(archive) as tfile:
+        assert tfile.getnames() == ["1.txt", "1/test.txt"]
+        member = tfile.extractfile("1/test.txt")
+        assert member.read() == b"this is the attachment text"
+
+
+def test_archive_sink_writes_to_stream():
+    stream = io.BytesIO()
+    with ArchiveSink(stream, "gz") as sink:
+        sink.add(MIME_MESSAGE_MIXED_ATTM, "mixed", ctypes=("application/pdf",))
+    stream.seek(0)
+    with tarfile.open(fileobj=stream) as tfile:
+        assert tfile.getnames() == ["mixed/report.PDF"]
+        member = tfile.extractfile("mixed/report.PDF")
+        assert member.read() == b"%PDF-1.4 report"
+
+
+def test_archive_sink_unknown_format():
+    with pytest.raises(ValueError):
+        ArchiveSink(io.BytesIO())
+    with pytest.raises(ValueError):
+        ArchiveSink(io.BytesIO(), "rar")
+
+
+class TestFileWriter:
+    def test_files_appear_on_flush(self, tmp_path):
+        writer = FileWriter(batch_size=10)
+        writer.write(tmp_path / "a" / "one.txt", "text")
+        writer.write(tmp_path / "a" / "two.bin", b"\x00\xff")
+        assert not (tmp_path / "a" / "one.txt").exists()
+
+        writer.flush()
+        assert (tmp_path / "a" / "one.txt").read_text() == "text"
+        assert (tmp_path / "a" / "two.bin").read_bytes() == b"\x00\xff"
+        assert sorted(os.listdir(tmp_path / "a")) == ["one.txt", "two.bin"]
+
+    def test_batch_size(self, tmp_path):
+        writer = FileWriter(batch_size=2, fsync=False)
+        for num in range(3):
+            writer.write(tmp_path / f"{num}.txt", str(num))
+        names = [name for name in os.listdir(tmp_path) if name[0] != "."]
+        assert sorted(names) == ["0.txt", "1.txt"]
+        writer.flush()
+        assert (tmp_path / "2.txt").read_text() == "2"
+
+    def test_discard_on_error(self, tmp_path):
+        with pytest.raises(RuntimeError):
+            with FileWriter() as writer:
+                writer.write(tmp_path / "one.txt", "text")
+                raise RuntimeError
+        assert os.listdir(tmp_path) == []
+
+    def test_recreates_removed_directory(self, tmp_path):
+        with FileWriter() as writer:
+            writer.write(tmp_path / "dir" / "one.txt", "1")
+        shutil.rmtree(tmp_path / "dir")
+        writer.write(tmp_path / "dir" / "two.txt", "2")
+        writer.flush()
+        assert (tmp_path / "dir" / "two.txt").read_text() == "2"
+
+    @pytest.mark.skipif(os.name != "posix", reason="POSIX file modes")
+    def test_file_mode_follows_umask(self, tmp_path):
+        umask = os.umask(0o022)
+        try:
+            with FileWriter() as writer:
+                writer.write(tmp_path / "one.txt", "1")
+        finally:
+            os.umask(umask)
+        assert (tmp_path / "one.txt").stat().st_mode & 0o777 == 0o644
+
+    def test_failed_write_keeps_other_files(self, tmp_path, monkeypatch):
+        writer = FileWriter()
+        writer.write(tmp_path / "one.txt", "1")
+
+        def failing_write(fd, data):
+            raise OSError("disk full")
+
+        with monkeypatch.context() as patch:
+            patch.setattr(os, "write", failing_write)
+            with pytest.raises(OSError):
+                writer.write(tmp_path / "two.txt", "2")
+        writer.flush()
+        assert os.listdir(tmp_path) == ["one.txt"]
+
+    def test_failed_flush_closes_once(self, tmp_path, monkeypatch):
+        writer = FileWriter(fsync=False)
+        for num in range(3):
+            writer.write(tmp_path / f"{num}.txt", str(num))
+        closed = []
+        close, replace = os.close, os.replace
+
+        def failing_replace(src, dst):
+            if dst.endswith("1.txt"):
+                raise OSError("read-only")
+            replace(src, dst)
+
+        def recording_close(fd):
+            closed.append(fd)
+            close(fd)
+
+        with monkeypatch.context() as patch:
+            patch.setattr(os, "close", recording_close)
+            patch.setattr(os, "replace", failing_replace)
+            with pytest.raises(OSError):
+                writer.flush()
+        assert len(closed) == len(set(closed)) == 3
+        assert os.listdir(tmp_path) == ["0.txt"]
+
+    def test_save_to_disk_with_shared_writer(self, tmp_path):
+        fpath = tmp_path / "msg.txt"
+        with FileWriter() as writer:
+            save_to_disk(MIME_MESSAGE, str(fpath), writer=writer)
+            assert not fpath.exists()
+        assert fpath.read_text() == (
+            "Content-Type: text/plain\n\nthis is the body text\n"
+        )
+        assert (tmp_path / "msg" / "test.txt").read_text() == (
+            "this is the attachment text"
+        )
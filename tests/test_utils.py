@@ -136,3 +136,97 @@ def test_sanitize_extensions():
     assert utils.sanitize(fn_400_with_ext).endswith(".txt")
     assert utils.sanitize("Z" * 1000).endswith("Z")
     assert utils.sanitize("Z" * 100 + "." + "Z" * 400).endswith("Z")
+
+
+def test_sequence_set():
+    assert utils.sequence_set([]) == ""
+    assert utils.sequence_set([7]) == "7"
+    assert utils.sequence_set([9, 1, 2, 3, 7, 10, 3]) == "1:3,7,9:10"
+
+
+def test_parse_sequence_set():
+    assert utils.parse_sequence_set(b"1:3,7,10:9") == [(1, 3), (7, 7), (9, 10)]
+    assert utils.parse_sequence_set("") == []
+
+
+def test_iter_fetch():
+    data = [
+        (b"1 (UID 10 BODY[] {5}", b"hello"),
+        b")",
+        (b"2 (BODY[] {5}", b"world"),
+        b" UID 12)",
+        b"3 (UID 13 FLAGS (\\Seen))",
+    ]
+    assert list(utils.iter_fetch(data)) == [
+        (10, b"1 (UID 10 BODY[] {5}", b"hello"),
+        (12, b"2 (BODY[] {5} UID 12)", b"world"),
+        (13, b"3 (UID 13 FLAGS (\\Seen))", None),
+    ]
+
+
+def test_quote_mailbox():
+    assert utils.quote_mailbox("INBOX") == '"INBOX"'
+    assert utils.quote_mailbox('My "Mail"') == '"My \\"Mail\\""'
+
+
+def test_unquote_mailbox():
+    assert utils.unquote_mailbox('"INBOX"') == "INBOX"
+    assert utils.unquote_mailbox("INBOX") == "INBOX"
+    name = 'C:\\My "Mail"'
+    assert utils.unquote_mailbox(utils.quote_mailbox(name)) == name
+
+
+def test_parse_status():
+    assert utils.parse_status(
+        b"INBOX (MESSAGES 3 UIDNEXT 5 UIDVALIDITY 1 HIGHESTMODSEQ 7)"
+    ) == (
+        "INBOX",
+        {"MESSAGES": 3, "UIDNEXT": 5, "UIDVALIDITY": 1, "HIGHESTMODSEQ": 7},
+    )
+    assert utils.parse_status(b'"Sent \\"Mail\\"" (MESSAGES 0)') == (
+        'Sent "Mail"',
+        {"MESSAGES": 0},
+    )
+
+
+def test_parse_status_raises_value_error():
+    with pytest.raises(ValueError):
+        utils.parse_status(b"INBOX")
+
+
+def test_unfold():
+    assert utils.unfold("long\r\n subject") == "long subject"
+    assert utils.unfold("a: 1\nb:\n\t2\n") == "a: 1\nb:\t2\n"
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ("plain subject", "plain subject"),
+        ("long\r\n subject", "long subject"),
+        ("=?utf-8?q?Caf=C3=A9?= menu", "Café menu"),
+        ("Hello =?ISO-8859-1?Q?Andr=E9?= Pirard", "Hello André Pirard"),
+        ("=?utf-8?b?w6k=?=\r\n =?utf-8?b?w6k=?=", "éé"),
+        ("=?x-unknown?q?a=E9?=", "aé"),
+        ("=?utf-8?q?broken", "=?utf-8?q?broken"),
+        ("=?utf-8?q?x?= C:\\users\\name", "x C:\\users\\name"),
+        ("=?utf-8?q?Caf?= =?utf-8?q?=C3=A9?= menu", "Café menu"),
+        ("Zoë =?utf-8*en?q?=E2=82=AC?=", "Zoë €"),
+    ],
+)
+def test_decode_header_value(value, expected):
+    assert utils.decode_header_value(value) == expected
+
+
+def test_decode_header_value_is_memoized():
+    utils.decode_header_value.cache_clear()
+    utils.decode_header_value("=?utf-8?q?Caf=C3=A9?=")
+    utils.decode_header_value("=?utf-8?q?Caf=C3=A9?=")
+    assert utils.decode_header_value.cache_info().hits == 1
+
+
+def test_codec_name():
+    assert utils.codec_name("UTF-8") == "utf-8"
+    assert utils.codec_name("latin_1") == "iso8859-1"
+    assert utils.codec_name("x-unknown") == "latin-1"
+    assert utils.codec_name(None) == "utf-8"